@@ -0,0 +1,80 @@
+"""Benchmark per-call latency of ExpensesSQLite with a fresh default connection per call against the tuned per-thread connection.
+
+Usage: python connection_benchmark.py [calls] [rows]
+
+The "fresh" variant reproduces the connection layer before per-thread connections: every method opens
+sqlite3.connect(db_path) with default pragmas (rollback journal, synchronous=FULL) and closes it again.
+Prints the mean microseconds per call of each method for both variants.
+"""
+import os
+import sys
+import time
+import sqlite3
+import logging
+import tempfile
+from contextlib import contextmanager
+
+from expenses_sqlite import ExpensesSQLite
+
+class FreshConnectionSQLite(ExpensesSQLite):
+    """ExpensesSQLite opening and closing an untuned connection in every method"""
+
+    def _open_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        # Needed by the schema migrations, not part of the tuning being measured
+        conn.create_function("normalize_category", 1, self._normalize_category, deterministic=True)
+        return conn
+
+    def _get_connection(self) -> sqlite3.Connection:
+        return self._open_connection()
+
+    @contextmanager
+    def _connection(self):
+        conn = self._open_connection()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+def seed(db, rows):
+    """Add rows expenses for alice so get_expenses has something to read"""
+    db.create_user('alice')
+    db.add_expenses_bulk([
+        {'amount': index % 500 + 1, 'category': 'Groceries', 'description': f'item {index}',
+         'kakeibo_category': 'survival', 'user_id': 'alice'}
+        for index in range(rows)
+    ])
+
+def mean_microseconds(func, calls):
+    started = time.perf_counter()
+    for index in range(calls):
+        func(index)
+    return (time.perf_counter() - started) / calls * 1e6
+
+CALLS = {
+    'get_user': lambda db, index: db.get_user('alice'),
+    'get_setting': lambda db, index: db.get_setting('backup_counter', '0'),
+    'set_setting': lambda db, index: db.set_setting('benchmark', str(index)),
+    'add_expense': lambda db, index: db.add_expense(10, 'Groceries', f'tea {index}', 'survival', 'alice'),
+    'get_expenses': lambda db, index: db.get_expenses(user_id='alice'),
+}
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 800
+
+    with tempfile.TemporaryDirectory() as directory:
+        fresh = FreshConnectionSQLite(os.path.join(directory, 'fresh.db'))
+        tuned = ExpensesSQLite(os.path.join(directory, 'tuned.db'))
+        for db in (fresh, tuned):
+            seed(db, rows)
+
+        print(f"{calls} calls per method, {rows} seeded rows\n")
+        print(f"{'method':>13} {'fresh us':>9} {'tuned us':>9} {'speedup':>8}")
+        for name, call in CALLS.items():
+            before = mean_microseconds(lambda index: call(fresh, index), calls)
+            after = mean_microseconds(lambda index: call(tuned, index), calls)
+            print(f"{name:>13} {before:>9.0f} {after:>9.0f} {before / after:>7.1f}x")
+        tuned.close()
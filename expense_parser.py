@@ -0,0 +1,184 @@
+import re
+
+# Keywords for the categories in prompts.get_system_prompt(), with each category's default kakeibo category.
+# Keep these unambiguous: a word that could reasonably belong to two categories, or to none (engine oil,
+# a "prime" membership, a tablet that is not medicine, groceries ordered on amazon), should not be listed,
+# so the message falls through to the LLM instead.
+CATEGORY_KEYWORDS = {
+    'Groceries': ('survival', {
+        'grocery', 'groceries', 'rice', 'atta', 'flour', 'dal', 'milk', 'curd', 'paneer', 'butter', 'ghee',
+        'sugar', 'salt', 'tea', 'coffee', 'bread', 'detergent', 'soap', 'shampoo', 'toothpaste',
+        'toiletries', 'chocolate', 'chocolates', 'spices', 'masala', 'cereal', 'oats', 'sanitizer'
+    }),
+    'Vegetables': ('survival', {
+        'vegetable', 'vegetables', 'veggies', 'onion', 'onions', 'tomato', 'tomatoes', 'potato', 'potatoes',
+        'carrot', 'carrots', 'cabbage', 'cauliflower', 'spinach', 'palak', 'brinjal', 'beans', 'capsicum',
+        'cucumber', 'ginger', 'garlic', 'coriander', 'okra', 'bhindi', 'methi', 'peas', 'sabzi'
+    }),
+    'Non-veg': ('survival', {
+        'egg', 'eggs', 'chicken', 'mutton', 'fish', 'prawn', 'prawns', 'meat', 'pork', 'beef'
+    }),
+    'Fruits': ('survival', {
+        'fruit', 'fruits', 'apple', 'apples', 'banana', 'bananas', 'mango', 'mangoes', 'orange', 'oranges',
+        'grapes', 'papaya', 'watermelon', 'pomegranate', 'guava', 'pineapple', 'kiwi', 'berries', 'melon'
+    }),
+    'Snacking': ('optional', {
+        'snack', 'snacks', 'chips', 'biscuit', 'biscuits', 'cookies', 'namkeen', 'chakna', 'popcorn',
+        'nachos', 'wafers', 'icecream', 'samosa', 'cake'
+    }),
+    'Dining': ('optional', {
+        'restaurant', 'dinner', 'lunch', 'breakfast', 'brunch', 'takeout', 'takeaway', 'swiggy', 'zomato',
+        'pizza', 'burger', 'biryani', 'cafe', 'dining', 'dosa', 'thali'
+    }),
+    'Transportation': ('survival', {
+        'auto', 'taxi', 'cab', 'uber', 'ola', 'rapido', 'bus', 'train', 'metro', 'fuel', 'petrol', 'diesel',
+        'parking', 'toll', 'transport', 'rickshaw'
+    }),
+    'Home-utilities': ('survival', {
+        'electricity', 'water', 'cylinder', 'wifi', 'broadband', 'internet', 'maid', 'cook',
+        'plumber', 'electrician', 'repair', 'repairs', 'laundry', 'recharge', 'dth', 'maintenance'
+    }),
+    'Entertainment': ('optional', {
+        'movie', 'movies', 'cinema', 'netflix', 'hotstar', 'spotify', 'concert', 'subscription',
+        'subscriptions'
+    }),
+    'Healthcare': ('survival', {
+        'medicine', 'medicines', 'doctor', 'hospital', 'pharmacy', 'medical', 'clinic',
+        'checkup', 'dentist', 'consultation'
+    }),
+    'Education': ('culture', {
+        'course', 'courses', 'book', 'books', 'tuition', 'udemy', 'coursera', 'class', 'classes', 'tutorial'
+    }),
+    'Shopping': ('optional', {
+        'clothes', 'shirt', 'shirts', 'tshirt', 'jeans', 'shoes', 'dress', 'kurta', 'electronics', 'gift',
+        'gifts', 'headphones', 'earphones', 'charger', 'myntra', 'shopping'
+    }),
+    'Travel': ('optional', {
+        'trip', 'vacation', 'hotel', 'flight', 'flights', 'holiday', 'resort', 'airbnb'
+    }),
+}
+
+# Keywords whose kakeibo category differs from their general category's default (see prompts.py)
+KAKEIBO_OVERRIDES = {
+    'repair': 'extra', 'repairs': 'extra', 'plumber': 'extra', 'electrician': 'extra',
+    'netflix': 'culture', 'hotstar': 'culture', 'spotify': 'culture',
+    'subscription': 'culture', 'subscriptions': 'culture',
+}
+
+KEYWORD_CATEGORIES = {
+    keyword: category
+    for category, (_, keywords) in CATEGORY_KEYWORDS.items()
+    for keyword in keywords
+}
+
+# Filler words allowed around the item without affecting the category
+FILLER_WORDS = {'a', 'an', 'the', 'some', 'of', 'my', 'today', 'bill', 'bills', 'fresh', 'ticket', 'tickets', 'fare'}
+
+_CURRENCY = r'(?:₹|rs\.?|inr|rupees?)'
+_AMOUNT = r'(\d{1,3}(?:,\d{2,3})+|\d+)(?:\.(\d{1,2}))?'
+_ITEM = r"([a-z][a-z' -]*?)"
+_VERB = r'(?:(?:i\s+)?(?:spent|paid|bought|add|added)\s+)?'
+
+# "spent ₹500 on groceries", "500rs for milk", "rs. 40 eggs", "1,200/- for petrol"
+_AMOUNT_FIRST = re.compile(
+    rf'^{_VERB}(?:{_CURRENCY}\s*)?{_AMOUNT}\s*(?:{_CURRENCY}|/-)?\s*(on|for)?\s+{_ITEM}$'
+)
+# "milk 40", "groceries - ₹500", "bought eggs for 60 rs"
+_ITEM_FIRST = re.compile(
+    rf'^{_VERB}{_ITEM}\s*(?:for|:|-|=)?\s*(?:{_CURRENCY}\s*)?{_AMOUNT}\s*(?:{_CURRENCY}|/-)?$'
+)
+# A bare 19xx/20xx is more likely a year ("auto 2025") than an amount unless a currency marker is present
+_YEAR = re.compile(r'(?:19|20)\d{2}')
+_HAS_CURRENCY = re.compile(rf'(?<![a-z]){_CURRENCY}(?![a-z])|/-')
+# Words that make a bare number read as a count ("2 kg rice", "3 packets") rather than a price
+COUNT_WORDS = {
+    'kg', 'kgs', 'g', 'gm', 'gms', 'gram', 'grams', 'l', 'ltr', 'litre', 'litres', 'liter', 'liters',
+    'dozen', 'pc', 'pcs', 'piece', 'pieces', 'pack', 'packs', 'packet', 'packets', 'box', 'boxes',
+    'bottle', 'bottles', 'plate', 'plates', 'cup', 'cups', 'unit', 'units', 'nos', 'x'
+}
+_SEPARATORS = re.compile(r'\s*(?:,(?!\d)|;|\n|\+|&|\band\b)\s*')
+_MAX_ITEM_WORDS = 4
+
+def _categorize(item: str):
+    """Return (category, kakeibo_category) when every word of the item agrees on one category, else None"""
+    words = item.replace("'", '').replace('-', ' ').split()
+    if not words or len(words) > _MAX_ITEM_WORDS:
+        return None
+
+    categories = set()
+    kakeibo_override = None
+    for word in words:
+        if word in FILLER_WORDS:
+            continue
+        category = KEYWORD_CATEGORIES.get(word)
+        if category is None:
+            # Unknown words make the item ambiguous; leave it to the LLM
+            return None
+        categories.add(category)
+        kakeibo_override = KAKEIBO_OVERRIDES.get(word, kakeibo_override)
+
+    if len(categories) != 1:
+        return None
+    category = categories.pop()
+    return category, kakeibo_override or CATEGORY_KEYWORDS[category][0]
+
+def _is_quantity_word(item: str) -> bool:
+    """Check whether an item starts with a count word or a plural noun ("books", "eggs")"""
+    words = [word for word in item.split() if word not in FILLER_WORDS]
+    if not words:
+        return False
+    word = words[0]
+    return word in COUNT_WORDS or (word.endswith('s') and not word.endswith(('ss', 'us')))
+
+def _parse_segment(segment: str):
+    match = _AMOUNT_FIRST.match(segment)
+    if match:
+        whole, fraction, preposition, item = match.groups()
+        # "bought 2 books", "add 3 eggs": a bare number before a plural or count word is a quantity,
+        # so it only counts as a price with a currency marker or the "500 on/for ..." shape
+        if not preposition and not _HAS_CURRENCY.search(segment) and _is_quantity_word(item):
+            return None
+    else:
+        match = _ITEM_FIRST.match(segment)
+        if not match:
+            return None
+        item, whole, fraction = match.groups()
+
+    if not fraction and _YEAR.fullmatch(whole) and not _HAS_CURRENCY.search(segment):
+        return None
+
+    amount = float(whole.replace(',', '') + ('.' + fraction if fraction else ''))
+    item = item.strip()
+    categorized = _categorize(item)
+    if amount <= 0 or categorized is None:
+        return None
+
+    category, kakeibo_category = categorized
+    return {
+        'amount': int(amount) if amount.is_integer() else amount,
+        'category': category,
+        'kakeibo_category': kakeibo_category,
+        'description': item[0].upper() + item[1:]
+    }
+
+def parse_expenses(text: str):
+    """Parse simple expense messages into add_expense arguments.
+
+    Returns a list of argument dicts (one per item) only when every part of the message is a confident
+    amount + item match, otherwise None so the caller falls through to the LLM.
+    """
+    text = text.strip().lower().rstrip('.!')
+    if not text or len(text) > 200 or '?' in text:
+        return None
+
+    segments = [segment for segment in _SEPARATORS.split(text) if segment]
+    if not segments:
+        return None
+
+    expenses = []
+    for segment in segments:
+        expense = _parse_segment(segment.strip())
+        if expense is None:
+            return None
+        expenses.append(expense)
+    return expenses
@@ -0,0 +1,74 @@
+"""Benchmark the DataFrame expense methods against the Expense row API for a small bot reply.
+
+Usage: python expense_rows_benchmark.py [rows] [reply_rows] [repeats]
+
+Each path renders reply_rows expense lines the way the webhook does: the DataFrame path calls
+get_expenses / get_top_expenses and walks iterrows(), the row path reads iter_expenses /
+iter_top_expenses. Prints mean latency (timeit) and peak Python allocation (tracemalloc) per reply.
+"""
+import os
+import sys
+import timeit
+import logging
+import tempfile
+import tracemalloc
+
+from expenses_sqlite import ExpensesSQLite
+
+def seed(db, rows):
+    """Add rows expenses for alice across a few categories"""
+    categories = ['Groceries', 'Transport', 'Dining', 'Utilities', 'Shopping']
+    db.add_expenses_bulk([
+        {'amount': index % 997 + 1, 'category': categories[index % len(categories)],
+         'description': f'item {index}', 'kakeibo_category': 'survival', 'user_id': 'alice'}
+        for index in range(rows)
+    ])
+
+def render(rows):
+    return "\n".join(f"{date:%d %b} {category}: ₹{amount:.2f} {description}"
+                     for date, category, amount, description in rows)
+
+def recent_dataframe(db, reply_rows):
+    df = db.get_expenses(user_id='alice').head(reply_rows)
+    return render((row['date'], row['category'], row['amount'], row['description']) for _, row in df.iterrows())
+
+def recent_rows(db, reply_rows):
+    return render((expense.date, expense.category, expense.amount, expense.description)
+                  for expense in db.iter_expenses(user_id='alice', limit=reply_rows))
+
+def top_dataframe(db, reply_rows):
+    df = db.get_top_expenses(reply_rows, user_id='alice')
+    return render((row['date'], row['category'], row['amount'], row['description']) for _, row in df.iterrows())
+
+def top_rows(db, reply_rows):
+    return render((expense.date, expense.category, expense.amount, expense.description)
+                  for expense in db.iter_top_expenses(reply_rows, user_id='alice'))
+
+def measure(func, repeats):
+    """Return (mean microseconds, peak KiB allocated) for one call of func"""
+    func()  # Warm up statement caches and imports
+    seconds = timeit.timeit(func, number=repeats) / repeats
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds * 1e6, peak / 1024
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 800
+    reply_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = ExpensesSQLite(os.path.join(directory, 'expenses.db'))
+        seed(db, rows)
+        print(f"{rows} seeded rows, {reply_rows}-row replies, {repeats} repeats\n")
+
+        print(f"{'reply':>8} {'path':>10} {'us':>8} {'peak KiB':>9}")
+        for reply, dataframe_path, row_path in (('recent', recent_dataframe, recent_rows),
+                                                ('top', top_dataframe, top_rows)):
+            for path, func in (('DataFrame', dataframe_path), ('Expense', row_path)):
+                micros, peak = measure(lambda: func(db, reply_rows), repeats)
+                print(f"{reply:>8} {path:>10} {micros:>8.0f} {peak:>9.1f}")
+        db.close()
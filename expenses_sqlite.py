@@ -1,16 +1,280 @@
 import sqlite3
 import pandas as pd
 from datetime import datetime, timezone, timedelta,time
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, NamedTuple, Optional
 import os
+import io
 import tempfile
 import logging
+import threading
+import asyncio
+import copy
+import functools
+import inspect
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from time import monotonic, sleep
 
 logger = logging.getLogger(__name__)
 
 # Define IST timezone (GMT+5:30)
 IST = timezone(timedelta(hours=5, minutes=30))
 
+# Connection tuning (overridable through the environment)
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 8192))  # 8 MB page cache per connection
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 64 * 1024 * 1024))  # 64 MB memory-mapped I/O
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_STATEMENT_CACHE = int(os.environ.get("SQLITE_STATEMENT_CACHE", 128))
+SQLITE_WAL_AUTOCHECKPOINT = int(os.environ.get("SQLITE_WAL_AUTOCHECKPOINT", 1000))  # pages; 0 disables (WAL shipping checkpoints itself)
+
+# Online snapshots through the SQLite backup API
+SQLITE_BACKUP_PAGES_PER_STEP = int(os.environ.get("SQLITE_BACKUP_PAGES_PER_STEP", 256))  # pages copied per step
+SQLITE_BACKUP_STEP_PAUSE_MS = float(os.environ.get("SQLITE_BACKUP_STEP_PAUSE_MS", 1))  # pause between steps so writers get the lock
+SNAPSHOT_MEMORY_LIMIT_BYTES = int(os.environ.get("SNAPSHOT_MEMORY_LIMIT_BYTES", 64 * 1024 * 1024))  # larger snapshots spill to the temp dir
+
+# Query result cache settings
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", 256))
+QUERY_CACHE_TTL_SECONDS = int(os.environ.get("QUERY_CACHE_TTL_SECONDS", 300))
+
+# Thread pool size for AsyncExpensesSQLite reads
+DB_READER_THREADS = int(os.environ.get("DB_READER_THREADS", 4))
+
+# Group commit: expense inserts arriving within this window are written in one transaction
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get("GROUP_COMMIT_WINDOW_MS", 5))
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("GROUP_COMMIT_MAX_BATCH", 100))
+
+# Rollup month bucket for a date column; legacy rows with non-ISO dates fall back to the raw prefix
+# instead of NULL, which would violate monthly_rollups.month NOT NULL and abort the write
+ROLLUP_MONTH_SQL = "IFNULL(strftime('%Y-%m', {date}), substr({date}, 1, 7))"
+
+# Recompute every monthly_rollups bucket from the raw expenses
+ROLLUP_REBUILD_SQL = f'''
+    INSERT INTO monthly_rollups (user_id, month, category, kakeibo_category, total, count)
+    SELECT user_id, {ROLLUP_MONTH_SQL.format(date='date')}, category, IFNULL(kakeibo_category, ''), SUM(amount), COUNT(*)
+    FROM expenses
+    GROUP BY 1, 2, 3, 4
+'''
+
+# Rewrite only the categories that are not already normalized (normalize_category is registered per connection)
+NORMALIZE_CATEGORIES_SQL = "UPDATE expenses SET category = normalize_category(category) WHERE category IS NOT normalize_category(category)"
+
+# Bump system_settings.data_change_counter on every write to user data (drives skip-if-unchanged backups)
+DATA_CHANGE_TRIGGER_SQL = '''
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_change_{event} AFTER {event} ON {table}
+    BEGIN
+        INSERT INTO system_settings (key, value, updated_at) VALUES ('data_change_counter', '1', CURRENT_TIMESTAMP)
+        ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1, updated_at = CURRENT_TIMESTAMP;
+    END
+'''
+
+# Keep monthly_rollups in step with every insert, delete and update on expenses
+ROLLUP_TRIGGERS_SQL = [
+    statement.format(new_month=ROLLUP_MONTH_SQL.format(date='NEW.date'),
+                     old_month=ROLLUP_MONTH_SQL.format(date='OLD.date'))
+    for statement in (
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_insert AFTER INSERT ON expenses
+        BEGIN
+            INSERT INTO monthly_rollups (user_id, month, category, kakeibo_category, total, count)
+            VALUES (NEW.user_id, {new_month}, NEW.category, IFNULL(NEW.kakeibo_category, ''), NEW.amount, 1)
+            ON CONFLICT (user_id, month, category, kakeibo_category)
+            DO UPDATE SET total = total + excluded.total, count = count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_delete AFTER DELETE ON expenses
+        BEGIN
+            UPDATE monthly_rollups SET total = total - OLD.amount, count = count - 1
+            WHERE user_id = OLD.user_id AND month = {old_month}
+              AND category = OLD.category AND kakeibo_category = IFNULL(OLD.kakeibo_category, '');
+            DELETE FROM monthly_rollups
+            WHERE user_id = OLD.user_id AND month = {old_month}
+              AND category = OLD.category AND kakeibo_category = IFNULL(OLD.kakeibo_category, '')
+              AND count <= 0;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_update
+        AFTER UPDATE OF date, amount, category, kakeibo_category, user_id ON expenses
+        BEGIN
+            UPDATE monthly_rollups SET total = total - OLD.amount, count = count - 1
+            WHERE user_id = OLD.user_id AND month = {old_month}
+              AND category = OLD.category AND kakeibo_category = IFNULL(OLD.kakeibo_category, '');
+            DELETE FROM monthly_rollups
+            WHERE user_id = OLD.user_id AND month = {old_month}
+              AND category = OLD.category AND kakeibo_category = IFNULL(OLD.kakeibo_category, '')
+              AND count <= 0;
+            INSERT INTO monthly_rollups (user_id, month, category, kakeibo_category, total, count)
+            VALUES (NEW.user_id, {new_month}, NEW.category, IFNULL(NEW.kakeibo_category, ''), NEW.amount, 1)
+            ON CONFLICT (user_id, month, category, kakeibo_category)
+            DO UPDATE SET total = total + excluded.total, count = count + 1;
+        END
+        ''',
+    )
+]
+
+# Versioned schema migrations, applied in order on startup and tracked in PRAGMA user_version.
+# Append new entries with the next version number; never edit a migration that has shipped.
+SCHEMA_MIGRATIONS = [
+    (1, "Add user/date and user/category/date indexes on expenses", [
+        "CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses (user_id, date)",
+        "CREATE INDEX IF NOT EXISTS idx_expenses_user_category_date ON expenses (user_id, category, date)",
+    ]),
+    (2, "Add monthly_rollups table maintained by triggers on expenses", [
+        '''
+        CREATE TABLE IF NOT EXISTS monthly_rollups (
+            user_id TEXT NOT NULL,
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            kakeibo_category TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month, category, kakeibo_category)
+        ) WITHOUT ROWID
+        ''',
+        *ROLLUP_TRIGGERS_SQL,
+        "DELETE FROM monthly_rollups",
+        ROLLUP_REBUILD_SQL,
+    ]),
+    (3, "Normalize legacy category names (set-based, only rows that need it)", [
+        NORMALIZE_CATEGORIES_SQL,
+    ]),
+    (4, "Count writes to users and expenses for backup change detection", [
+        DATA_CHANGE_TRIGGER_SQL.format(table=table, event=event)
+        for table in ('users', 'expenses')
+        for event in ('insert', 'update', 'delete')
+    ]),
+    (5, "Rebuild rollup triggers so non-ISO expense dates no longer abort writes", [
+        "DROP TRIGGER IF EXISTS trg_expenses_rollup_insert",
+        "DROP TRIGGER IF EXISTS trg_expenses_rollup_delete",
+        "DROP TRIGGER IF EXISTS trg_expenses_rollup_update",
+        *ROLLUP_TRIGGERS_SQL,
+        "DELETE FROM monthly_rollups",
+        ROLLUP_REBUILD_SQL,
+    ]),
+]
+
+class Expense(NamedTuple):
+    """Lightweight expense row for small result sets that do not need a DataFrame"""
+    id: int
+    date: datetime
+    amount: float
+    category: str
+    kakeibo_category: str
+    description: str
+    user_id: str
+
+class QueryCache:
+    """Thread-safe LRU cache of query results, invalidated by per-user write generations"""
+    
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl_seconds: int = QUERY_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._generations = {}
+        # Bumped on every write; used for queries that span all users
+        self._global_generation = 0
+        # Bumped by clear() so every previously captured generation becomes stale
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def _generation(self, user_id: str = None) -> tuple:
+        """Get the write generation a cached result for this user depends on"""
+        if user_id is None:
+            return (self._epoch, self._global_generation)
+        return (self._epoch, self._generations.get(user_id, 0))
+    
+    def get(self, key: tuple, user_id: str = None):
+        """Return (True, value) for a fresh entry, or (False, None) on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                generation, expires_at, value = entry
+                if generation == self._generation(user_id) and expires_at > monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, copy.deepcopy(value)
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+    
+    def put(self, key: tuple, value, user_id: str = None, generation: tuple = None):
+        """Store a result computed at the given write generation"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation(user_id):
+                # A write landed while the query was running; the result may already be stale
+                return
+            self._entries[key] = (self._generation(user_id), monotonic() + self.ttl_seconds, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def current_generation(self, user_id: str = None) -> tuple:
+        """Get the current write generation for a user (or all users)"""
+        with self._lock:
+            return self._generation(user_id)
+    
+    def invalidate_user(self, user_id: str = None):
+        """Invalidate cached results for a user and for all-user queries"""
+        with self._lock:
+            self._global_generation += 1
+            if user_id is not None:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self.invalidations += 1
+    
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+            self._epoch += 1
+            self.invalidations += 1
+    
+    def stats(self) -> Dict:
+        """Get cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups * 100) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+def cached_query(method):
+    """Cache an ExpensesSQLite read method by (method, args, user_id) until the user's data changes"""
+    signature = inspect.signature(method)
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = tuple(item for item in bound.arguments.items() if item[0] != 'self')
+        user_id = bound.arguments.get('user_id')
+        key = (method.__name__, arguments)
+        
+        found, value = self.query_cache.get(key, user_id)
+        if found:
+            return value
+        
+        generation = self.query_cache.current_generation(user_id)
+        value = method(self, *args, **kwargs)
+        self.query_cache.put(key, value, user_id, generation)
+        return value
+    
+    return wrapper
+
 class ExpensesSQLite:
     def __init__(self, db_path: str = "expenses.db"):
         """Initialize the expenses database with an optional custom path"""
@@ -24,12 +288,80 @@ class ExpensesSQLite:
             # Default path
             self.db_path = 'expenses.db'
         
+        # One connection per thread (asyncio handlers, backup scheduler, ...)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.wal_autocheckpoint = SQLITE_WAL_AUTOCHECKPOINT
+        
+        # In-process cache for analytic queries, invalidated on writes
+        self.query_cache = QueryCache()
+        
         logger.info("🔷🔷🔷 Initializing database at: %s", self.db_path)
         self._init_database()
     
+    # Connection Management
+    def _open_connection(self) -> sqlite3.Connection:
+        """Open a new tuned connection to the database"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+            cached_statements=SQLITE_STATEMENT_CACHE,
+            # Each connection is only used by the thread that opened it,
+            # but close() may be called from another thread
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA wal_autocheckpoint={self.wal_autocheckpoint}")
+        # Expose the Python normalization rule to SQL for set-based updates
+        conn.create_function("normalize_category", 1, self._normalize_category, deterministic=True)
+        return conn
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """Get the calling thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    @contextmanager
+    def _connection(self):
+        """Yield the thread's connection inside a transaction (commit on success, rollback on error)"""
+        conn = self._get_connection()
+        with conn:
+            yield conn
+    
+    def close(self):
+        """Close every connection opened by this instance"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            # Drop the reference of any thread still holding a closed connection
+            self._local = threading.local()
+        
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning("⚠️⚠️⚠️ Error closing database connection: %s", str(e))
+    
+    def set_wal_autocheckpoint(self, pages: int):
+        """Set the automatic checkpoint threshold for current and future connections (0 disables it)"""
+        self.wal_autocheckpoint = pages
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.execute(f"PRAGMA wal_autocheckpoint={pages}")
+    
     def _init_database(self):
         """Initialize the SQLite database with required tables"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             
             # Create users table
@@ -65,8 +397,37 @@ class ExpensesSQLite:
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
+
+        
+        self._apply_migrations()
+    
+    def get_schema_version(self) -> int:
+        """Get the schema version recorded in the database"""
+        with self._connection() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+    
+    def _apply_migrations(self):
+        """Apply any schema migrations newer than the database's user_version"""
+        conn = self._get_connection()
+        for version, description, statements in SCHEMA_MIGRATIONS:
+            if version <= self.get_schema_version():
+                continue
             
-            conn.commit()
+            try:
+                # Take the write lock up front so concurrent processes cannot apply the same migration twice
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                    conn.rollback()
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+                logger.info("🔷🔷🔷 Applied schema migration %d: %s", version, description)
+            except Exception as e:
+                conn.rollback()
+                logger.error("❌❌❌ Schema migration %d failed: %s", version, str(e))
+                raise
     
     def _normalize_category(self, category: str) -> str:
         """Normalize category name to title case"""
@@ -74,6 +435,17 @@ class ExpensesSQLite:
             return "Miscellaneous"
         return category.strip().title()
     
+    def _normalize_date(self, value: str) -> str:
+        """Normalize a user or LLM supplied date such as "2026-10-5" to YYYY-MM-DD[ HH:MM:SS]"""
+        text = str(value).strip().replace('T', ' ')
+        for fmt, output in (('%Y-%m-%d', '%Y-%m-%d'), ('%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S'),
+                            ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S')):
+            try:
+                return datetime.strptime(text, fmt).strftime(output)
+            except ValueError:
+                continue
+        raise ValueError(f"Invalid date {value!r}: expected YYYY-MM-DD")
+    
     def _get_current_time_ist(self) -> datetime:
         """Get current time in IST (GMT+5:30)"""
         return datetime.now(IST)
@@ -91,7 +463,7 @@ class ExpensesSQLite:
     def create_user(self, username: str, email: str = None) -> bool:
         """Create a new user"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     "INSERT INTO users (username, email) VALUES (?, ?)",
@@ -104,7 +476,7 @@ class ExpensesSQLite:
     
     def get_user(self, username: str) -> Optional[Dict]:
         """Get user by username"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "SELECT username, email, created_at FROM users WHERE username = ?",
@@ -121,7 +493,7 @@ class ExpensesSQLite:
     
     def list_users(self) -> List[Dict]:
         """Get all users"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT username, email, created_at FROM users")
             return [
@@ -144,7 +516,7 @@ class ExpensesSQLite:
             'user_id': user_id or 'unknown'
         }
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO expenses (date, amount, category, kakeibo_category, description, user_id)
@@ -159,12 +531,50 @@ class ExpensesSQLite:
             ))
             conn.commit()
         
+        self.query_cache.invalidate_user(new_expense['user_id'])
         return new_expense
     
-    def get_expenses(self, start_date: str = None, end_date: str = None, 
-                    category: str = None, user_id: str = None) -> pd.DataFrame:
-        """Get expenses with optional filters"""
-        query = "SELECT date, amount, category, kakeibo_category, description, user_id FROM expenses WHERE 1=1"
+    def add_expenses_bulk(self, expenses: List[Dict], update_id: int = None) -> List[Dict]:
+        """Add several expenses in a single transaction and return the added records in order.
+        
+        update_id, when given, is recorded as the last applied Telegram update in the same transaction.
+        """
+        current_time_ist = self._get_current_time_ist()
+        
+        new_expenses = [
+            {
+                'date': self._format_ist_time(current_time_ist),
+                'amount': expense.get('amount'),
+                'category': self._normalize_category(expense.get('category')),
+                'kakeibo_category': expense.get('kakeibo_category') or 'survival',
+                'description': expense.get('description'),
+                'user_id': expense.get('user_id') or 'unknown'
+            }
+            for expense in expenses
+        ]
+        if not new_expenses:
+            return []
+        
+        with self._connection() as conn:
+            conn.executemany('''
+                INSERT INTO expenses (date, amount, category, kakeibo_category, description, user_id)
+                VALUES (:date, :amount, :category, :kakeibo_category, :description, :user_id)
+            ''', new_expenses)
+            if update_id is not None:
+                conn.execute('''
+                    INSERT OR REPLACE INTO system_settings (key, value, updated_at)
+                    VALUES ('last_applied_update_id', ?, CURRENT_TIMESTAMP)
+                ''', (str(update_id),))
+        
+        for user_id in {expense['user_id'] for expense in new_expenses}:
+            self.query_cache.invalidate_user(user_id)
+        logger.info("🔷🔷🔷 Added %d expenses in one transaction", len(new_expenses))
+        return new_expenses
+    
+    def _build_expense_filters(self, start_date: str = None, end_date: str = None, 
+                               category: str = None, user_id: str = None) -> tuple:
+        """Build the WHERE clause and parameters shared by expense queries"""
+        query = " WHERE 1=1"
         params = []
         
         if start_date:
@@ -177,7 +587,7 @@ class ExpensesSQLite:
             end_date =  datetime.combine(pd.to_datetime(end_date).date(), current_time)
             # end_date_plus = pd.to_datetime(end_date) #+ pd.Timedelta(days=1)
             query += " AND date <= ?"
-            params.append(end_date)
+            params.append(end_date.strftime('%Y-%m-%d %H:%M:%S'))
         
         if category:
             normalized_category = self._normalize_category(category)
@@ -188,9 +598,16 @@ class ExpensesSQLite:
             query += " AND user_id = ?"
             params.append(user_id)
         
+        return query, params
+    
+    def get_expenses(self, start_date: str = None, end_date: str = None, 
+                    category: str = None, user_id: str = None) -> pd.DataFrame:
+        """Get expenses with optional filters"""
+        where, params = self._build_expense_filters(start_date, end_date, category, user_id)
+        query = "SELECT date, amount, category, kakeibo_category, description, user_id FROM expenses" + where
         query += " ORDER BY date DESC"
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             logger.info("Executing query: %s with params: %s", query, params)
             df = pd.read_sql_query(query, conn, params=params)
             if not df.empty:
@@ -203,44 +620,97 @@ class ExpensesSQLite:
         """Get expenses for a specific user"""
         return self.get_expenses(start_date, end_date, category, user_id)
     
-    def get_monthly_expenses(self, year: int = None, month: int = None, 
-                           user_id: str = None) -> pd.DataFrame:
-        """Get expenses for a specific month in IST"""
+    def _get_month_range(self, year: int = None, month: int = None) -> tuple:
+        """Get the first and last day (YYYY-MM-DD) of a month in IST"""
         current_time_ist = self._get_current_time_ist()
         year = year or current_time_ist.year
         month = month or current_time_ist.month
         
         start_date = f"{year}-{month:02d}-01"
-        if month == 12:
-            end_date = f"{year + 1}-01-01"
+        end_date = pd.Period(start_date, freq='M').end_time.strftime('%Y-%m-%d')
+        return start_date, end_date
+    
+    def get_monthly_expenses(self, year: int = None, month: int = None, 
+                           user_id: str = None) -> pd.DataFrame:
+        """Get expenses for a specific month in IST"""
+        start_date, end_date = self._get_month_range(year, month)
+        return self.get_expenses(start_date, end_date, user_id=user_id)
+    
+    @cached_query
+    def get_monthly_category_summary(self, year: int = None, month: int = None, 
+                                     user_id: str = None) -> Dict:
+        """Get spending summary by category for a specific month in IST"""
+        start_date, end_date = self._get_month_range(year, month)
+        return self.get_category_summary(start_date, end_date, user_id)
+    
+    def _get_rollup_months(self, start_date: str = None, end_date: str = None) -> Optional[tuple]:
+        """Map a date range onto whole rollup months, or None if it does not align with month boundaries"""
+        start_month = end_month = None
+        try:
+            if start_date:
+                start = datetime.strptime(start_date, '%Y-%m-%d')
+                if start.day != 1:
+                    return None
+                start_month = start.strftime('%Y-%m')
+            if end_date:
+                end = datetime.strptime(end_date, '%Y-%m-%d')
+                if (end + timedelta(days=1)).day != 1:
+                    return None
+                end_month = end.strftime('%Y-%m')
+        except (TypeError, ValueError):
+            return None
+        return start_month, end_month
+    
+    def _aggregate_by(self, column: str, start_date: str = None, end_date: str = None, 
+                      user_id: str = None) -> List[tuple]:
+        """Sum and count expenses grouped by a column, computed in SQL"""
+        rollup_months = self._get_rollup_months(start_date, end_date)
+        if rollup_months is not None:
+            # Whole months: answer from the monthly_rollups buckets instead of raw expenses
+            # Rollups store a NULL kakeibo_category as '' so it can be part of the primary key;
+            # NULL groups are skipped, as pandas groupby did before
+            query = f"SELECT {column}, SUM(total), SUM(count) FROM monthly_rollups WHERE {column} != ''"
+            params = []
+            start_month, end_month = rollup_months
+            if start_month:
+                query += " AND month >= ?"
+                params.append(start_month)
+            if end_month:
+                query += " AND month <= ?"
+                params.append(end_month)
+            if user_id:
+                query += " AND user_id = ?"
+                params.append(user_id)
+            query += f" GROUP BY {column}"
         else:
-            end_date = f"{year}-{month + 1:02d}-01"
-            ## minus one day to include the last day of the month
-            end_date = (pd.to_datetime(end_date) - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+            where, params = self._build_expense_filters(start_date, end_date, user_id=user_id)
+            query = f"SELECT {column}, SUM(amount), COUNT(*) FROM expenses{where} AND {column} IS NOT NULL GROUP BY {column}"
         
-        return self.get_expenses(start_date, end_date, user_id=user_id)
+        with self._connection() as conn:
+            return conn.execute(query, params).fetchall()
     
+    @cached_query
     def get_category_summary(self, start_date: str = None, end_date: str = None, 
                            user_id: str = None) -> Dict:
         """Get spending summary by category"""
-        df = self.get_expenses(start_date, end_date, user_id=user_id)
-        if df.empty:
-            return {}
-        
-        df['category'] = df['category'].apply(self._normalize_category)
-        summary = df.groupby('category')['amount'].agg(['sum', 'count']).to_dict('index')
-        return {cat: {'total': data['sum'], 'count': data['count']} for cat, data in summary.items()}
+        summary = {}
+        for category, total, count in self._aggregate_by('category', start_date, end_date, user_id):
+            # Merge any groups that only differ by case/whitespace
+            data = summary.setdefault(self._normalize_category(category), {'total': 0.0, 'count': 0})
+            data['total'] += total
+            data['count'] += count
+        return summary
     
+    @cached_query
     def get_kakeibo_summary(self, start_date: str = None, end_date: str = None, 
                           user_id: str = None) -> Dict:
         """Get spending summary by kakeibo category"""
-        df = self.get_expenses(start_date, end_date, user_id=user_id)
-        if df.empty:
-            return {}
-        
-        summary = df.groupby('kakeibo_category')['amount'].agg(['sum', 'count']).to_dict('index')
-        return {cat: {'total': data['sum'], 'count': data['count']} for cat, data in summary.items()}
+        return {
+            kakeibo_category: {'total': total, 'count': count}
+            for kakeibo_category, total, count in self._aggregate_by('kakeibo_category', start_date, end_date, user_id)
+        }
     
+    @cached_query
     def get_kakeibo_balance_analysis(self, start_date: str = None, end_date: str = None, 
                                    user_id: str = None) -> Dict:
         """Analyze kakeibo balance and provide recommendations"""
@@ -284,47 +754,177 @@ class ExpensesSQLite:
         df['category'] = df['category'].apply(self._normalize_category)
         return df.nlargest(limit, 'amount')
     
+    # Lean row API (no pandas) for small result sets
+    def _parse_date(self, value: str) -> datetime:
+        """Parse a stored date, falling back to pandas for non-ISO formats"""
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return pd.to_datetime(value).to_pydatetime()
+    
+    def _iter_rows(self, query: str, params: list) -> Iterator[Expense]:
+        """Run an expense query and yield Expense rows"""
+        cursor = self._get_connection().execute(query, params)
+        for row in cursor:
+            yield Expense(
+                row[0],
+                self._parse_date(row[1]),
+                row[2],
+                self._normalize_category(row[3]),
+                row[4],
+                row[5],
+                row[6]
+            )
+    
+    def iter_expenses(self, start_date: str = None, end_date: str = None, 
+                      category: str = None, user_id: str = None, 
+                      limit: int = None) -> Iterator[Expense]:
+        """Get expenses with optional filters as Expense rows, newest first"""
+        where, params = self._build_expense_filters(start_date, end_date, category, user_id)
+        query = "SELECT id, date, amount, category, kakeibo_category, description, user_id FROM expenses" + where
+        query += " ORDER BY date DESC, id DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        return self._iter_rows(query, params)
+    
+    def iter_top_expenses(self, limit: int = 10, start_date: str = None, 
+                          end_date: str = None, user_id: str = None) -> Iterator[Expense]:
+        """Get top expenses by amount as Expense rows"""
+        where, params = self._build_expense_filters(start_date, end_date, user_id=user_id)
+        query = "SELECT id, date, amount, category, kakeibo_category, description, user_id FROM expenses" + where
+        query += " ORDER BY amount DESC, date DESC LIMIT ?"
+        params.append(int(limit))
+        return self._iter_rows(query, params)
+    
+    @cached_query
     def get_spending_trends(self, months: int = 6, user_id: str = None) -> Dict:
         """Get monthly spending trends in IST"""
         current_time_ist = self._get_current_time_ist()
-        trends = {}
         
-        for i in range(months):
-            if current_time_ist.month > i:
-                month_date = datetime(current_time_ist.year, current_time_ist.month - i, 1, tzinfo=IST)
-            else:
-                month_date = datetime(current_time_ist.year - 1, 12 - (i - current_time_ist.month), 1, tzinfo=IST)
-            
-            df = self.get_monthly_expenses(month_date.year, month_date.month, user_id)
-            
-            month_key = month_date.strftime('%Y-%m')
+        # Month keys from the current month backwards (newest first)
+        current_index = current_time_ist.year * 12 + current_time_ist.month - 1
+        month_keys = [
+            f"{index // 12}-{index % 12 + 1:02d}"
+            for index in range(current_index, current_index - max(months, 0), -1)
+        ]
+        if not month_keys:
+            return {}
+        
+        # One grouped lookup over the monthly_rollups buckets instead of one query per month
+        query = "SELECT month, SUM(total), SUM(count) FROM monthly_rollups WHERE month >= ? AND month <= ?"
+        params = [month_keys[-1], month_keys[0]]
+        if user_id:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        query += " GROUP BY month"
+        
+        with self._connection() as conn:
+            totals = {month: (total, count) for month, total, count in conn.execute(query, params)}
+        
+        # Zero-fill months without expenses
+        trends = {}
+        for month_key in month_keys:
+            total, count = totals.get(month_key, (0, 0))
             trends[month_key] = {
-                'total': df['amount'].sum() if not df.empty else 0,
-                'transactions': len(df)
+                'total': total,
+                'transactions': count
             }
         
         return trends
     
+    @cached_query
     def get_user_stats(self, user_id: str) -> Dict:
         """Get comprehensive statistics for a user"""
-        df = self.get_user_expenses(user_id)
-        if df.empty:
-            return {}
+        with self._connection() as conn:
+            total, count, months = conn.execute(
+                "SELECT SUM(total), SUM(count), COUNT(DISTINCT month) FROM monthly_rollups WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+            if not count:
+                return {}
+            
+            top_category = conn.execute('''
+                SELECT category FROM monthly_rollups WHERE user_id = ?
+                GROUP BY category ORDER BY SUM(total) DESC, category LIMIT 1
+            ''', (user_id,)).fetchone()[0]
+            
+            # Separate subqueries so each MIN/MAX is a single (user_id, date) index probe
+            first_date, last_date = conn.execute('''
+                SELECT (SELECT MIN(date) FROM expenses WHERE user_id = ?),
+                       (SELECT MAX(date) FROM expenses WHERE user_id = ?)
+            ''', (user_id, user_id)).fetchone()
+        
+        return {
+            'total_expenses': total,
+            'total_transactions': count,
+            'average_expense': total / count,
+            'first_expense_date': str(first_date)[:10],
+            'last_expense_date': str(last_date)[:10],
+            'top_category': self._normalize_category(top_category),
+            'monthly_average': total / max(1, months)
+        }
+    
+    def verify_monthly_rollups(self) -> List[Dict]:
+        """Compare monthly_rollups with aggregates recomputed from expenses and return mismatched buckets"""
+        with self._connection() as conn:
+            rows = conn.execute(f'''
+                WITH actual AS (
+                    SELECT user_id, {ROLLUP_MONTH_SQL.format(date='date')} AS month, category,
+                           IFNULL(kakeibo_category, '') AS kakeibo_category,
+                           SUM(amount) AS total, COUNT(*) AS count
+                    FROM expenses GROUP BY 1, 2, 3, 4
+                ),
+                buckets AS (
+                    SELECT user_id, month, category, kakeibo_category FROM actual
+                    UNION
+                    SELECT user_id, month, category, kakeibo_category FROM monthly_rollups
+                )
+                SELECT b.user_id, b.month, b.category, b.kakeibo_category,
+                       IFNULL(a.total, 0), IFNULL(a.count, 0), IFNULL(r.total, 0), IFNULL(r.count, 0)
+                FROM buckets b
+                LEFT JOIN actual a USING (user_id, month, category, kakeibo_category)
+                LEFT JOIN monthly_rollups r USING (user_id, month, category, kakeibo_category)
+                WHERE IFNULL(a.count, 0) != IFNULL(r.count, 0)
+                   OR ABS(IFNULL(a.total, 0) - IFNULL(r.total, 0)) >= 0.01
+            ''').fetchall()
+        
+        return [
+            {
+                'user_id': row[0], 'month': row[1], 'category': row[2], 'kakeibo_category': row[3],
+                'expected_total': row[4], 'expected_count': row[5],
+                'rollup_total': row[6], 'rollup_count': row[7]
+            }
+            for row in rows
+        ]
+    
+    def rebuild_monthly_rollups(self) -> Dict:
+        """Recompute monthly_rollups from expenses and verify the result"""
+        mismatches_before = self.verify_monthly_rollups()
+        
+        with self._connection() as conn:
+            conn.execute("DELETE FROM monthly_rollups")
+            conn.execute(ROLLUP_REBUILD_SQL)
+            buckets = conn.execute("SELECT COUNT(*) FROM monthly_rollups").fetchone()[0]
+        self.query_cache.clear()
         
+        mismatches_after = self.verify_monthly_rollups()
+        logger.info("🔷🔷🔷 Rebuilt monthly rollups: %d buckets, %d mismatches fixed, %d remaining", 
+                   buckets, len(mismatches_before), len(mismatches_after))
         return {
-            'total_expenses': df['amount'].sum(),
-            'total_transactions': len(df),
-            'average_expense': df['amount'].mean(),
-            'first_expense_date': df['date'].min().strftime('%Y-%m-%d'),
-            'last_expense_date': df['date'].max().strftime('%Y-%m-%d'),
-            'top_category': df.groupby('category')['amount'].sum().idxmax(),
-            'monthly_average': df['amount'].sum() / max(1, df['date'].dt.to_period('M').nunique())
+            'buckets': buckets,
+            'mismatches_fixed': len(mismatches_before),
+            'mismatches_remaining': len(mismatches_after)
         }
     
+    def get_query_cache_stats(self) -> Dict:
+        """Get hit/miss counters of the query result cache"""
+        return self.query_cache.stats()
+    
     # System Settings Management
     def get_setting(self, key: str, default_value: str = None) -> str:
         """Get a system setting value"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT value FROM system_settings WHERE key = ?", (key,))
             row = cursor.fetchone()
@@ -332,7 +932,7 @@ class ExpensesSQLite:
     
     def set_setting(self, key: str, value: str):
         """Set a system setting value"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO system_settings (key, value, updated_at)
@@ -351,6 +951,33 @@ class ExpensesSQLite:
         """Reset the backup counter to 0"""
         self.set_setting('backup_counter', '0')
     
+    def get_data_fingerprint(self) -> str:
+        """Get a cheap fingerprint of user data that changes whenever users or expenses are written"""
+        with self._connection() as conn:
+            schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+        return f"{schema_version}:{self.get_setting('data_change_counter', '0')}"
+    
+    def get_last_backup_fingerprint(self) -> str:
+        """Get the data fingerprint recorded with the last backup"""
+        return self.get_setting('last_backup_fingerprint')
+    
+    def set_last_backup_fingerprint(self, fingerprint: str):
+        """Record the data fingerprint of a backup"""
+        self.set_setting('last_backup_fingerprint', fingerprint)
+    
+    def has_changes_since_backup(self) -> bool:
+        """Check whether user data changed since the last backup"""
+        return self.get_data_fingerprint() != self.get_last_backup_fingerprint()
+    
+    def get_last_applied_update_id(self) -> Optional[int]:
+        """Get the Telegram update_id whose writes were last applied from the update journal"""
+        value = self.get_setting('last_applied_update_id')
+        return int(value) if value else None
+    
+    def set_last_applied_update_id(self, update_id: Optional[int]):
+        """Record (or with None, clear) the last Telegram update_id applied from the update journal"""
+        self.set_setting('last_applied_update_id', '' if update_id is None else str(update_id))
+    
     def get_last_backup_time(self) -> datetime:
         """Get the last backup timestamp in IST"""
         timestamp_str = self.get_setting('last_backup_time')
@@ -373,6 +1000,77 @@ class ExpensesSQLite:
         self.set_setting('last_backup_time', timestamp.isoformat())
     
     # Additional methods for S3 backup/restore
+    def _backup_into(self, target: sqlite3.Connection, pages_per_step: int = None, source: sqlite3.Connection = None):
+        """Copy a consistent snapshot into another connection with the SQLite backup API.
+        
+        A source connection holding an open read transaction is copied at that transaction's snapshot.
+        """
+        pages_per_step = pages_per_step or SQLITE_BACKUP_PAGES_PER_STEP
+        
+        def progress(status, remaining, total):
+            # Release the source between steps so writers are not starved
+            if remaining and SQLITE_BACKUP_STEP_PAUSE_MS > 0:
+                sleep(SQLITE_BACKUP_STEP_PAUSE_MS / 1000)
+        
+        if source is not None:
+            source.backup(target, pages=pages_per_step, progress=progress)
+            return
+        
+        # Dedicated source connection so the calling thread's connection state is untouched
+        source = self._open_connection()
+        try:
+            source.backup(target, pages=pages_per_step, progress=progress)
+        finally:
+            source.close()
+    
+    def _check_integrity(self, conn: sqlite3.Connection):
+        """Raise if a snapshot connection fails PRAGMA integrity_check"""
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != 'ok':
+            raise sqlite3.DatabaseError(f"Snapshot integrity check failed: {result}")
+    
+    @contextmanager
+    def open_snapshot(self, pages_per_step: int = None, source: sqlite3.Connection = None):
+        """Yield a readable binary file object holding a consistent, integrity-checked snapshot"""
+        db_size = sum(
+            os.path.getsize(path) for path in (self.db_path, self.db_path + '-wal') if os.path.exists(path)
+        )
+        
+        if db_size <= SNAPSHOT_MEMORY_LIMIT_BYTES and hasattr(sqlite3.Connection, 'serialize'):
+            # Small database: snapshot entirely in memory
+            target = sqlite3.connect(':memory:')
+            try:
+                self._backup_into(target, pages_per_step, source)
+                self._check_integrity(target)
+                snapshot = io.BytesIO(target.serialize())
+            finally:
+                target.close()
+            
+            logger.info("🔷🔷🔷 Created in-memory database snapshot (%d bytes)", len(snapshot.getbuffer()))
+            yield snapshot
+            return
+        
+        # Large database: snapshot into the system temp directory, never the working directory
+        fd, snapshot_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        try:
+            target = sqlite3.connect(snapshot_path)
+            try:
+                self._backup_into(target, pages_per_step, source)
+                self._check_integrity(target)
+                # Make the snapshot a single self-contained file
+                target.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                target.close()
+            
+            logger.info("🔷🔷🔷 Created database snapshot at: %s", snapshot_path)
+            with open(snapshot_path, 'rb') as snapshot:
+                yield snapshot
+        finally:
+            for path in (snapshot_path, snapshot_path + '-wal', snapshot_path + '-shm'):
+                if os.path.exists(path):
+                    os.remove(path)
+    
     def backup_to_file(self, backup_path=None) -> str:
         """Backup database to a file and return the file path"""
         if not backup_path:
@@ -382,9 +1080,14 @@ class ExpensesSQLite:
             backup_path = f"expenses_backup_{timestamp}.db"
         
         try:
-            # Create a copy of the database file
-            import shutil
-            shutil.copy2(self.db_path, backup_path)
+            # Consistent online copy, even while other threads are writing
+            target = sqlite3.connect(backup_path)
+            try:
+                self._backup_into(target)
+                self._check_integrity(target)
+                target.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                target.close()
             logger.info("🔷🔷🔷 Database backed up to: %s", backup_path)
             return backup_path
         except Exception as e:
@@ -400,11 +1103,12 @@ class ExpensesSQLite:
                 return False
             
             # Close any open connections to current db
-            try:
-                conn = sqlite3.connect(self.db_path)
-                conn.close()
-            except:
-                pass
+            self.close()
+            
+            # Drop WAL/shared-memory files so stale frames are not replayed onto the backup
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(self.db_path + suffix):
+                    os.remove(self.db_path + suffix)
             
             # Replace current db with backup
             import shutil
@@ -412,36 +1116,28 @@ class ExpensesSQLite:
             
             # Re-initialize to ensure tables exist
             self._init_database()
+            self.query_cache.clear()
             logger.info("🔷🔷🔷 Database restored from: %s", backup_path)
             return True
         except Exception as e:
             logger.error("❌❌❌ Database restore failed: %s", str(e))
             return False
     
-    def normalize_existing_data(self):
-        """Normalize all existing category data in the database"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Get all expenses
-            cursor.execute("SELECT id, category FROM expenses")
-            expenses = cursor.fetchall()
-            
-            # Update each expense with normalized category
-            for expense_id, category in expenses:
-                normalized_category = self._normalize_category(category)
-                cursor.execute(
-                    "UPDATE expenses SET category = ? WHERE id = ?",
-                    (normalized_category, expense_id)
-                )
-            
-            conn.commit()
-            logger.info("🔷🔷🔷 Normalized existing category data")
+    def normalize_existing_data(self) -> int:
+        """Normalize existing category data in the database and return the number of rows changed"""
+        with self._connection() as conn:
+            # Single set-based UPDATE that skips rows which are already normalized
+            updated = conn.execute(NORMALIZE_CATEGORIES_SQL).rowcount
+        
+        if updated:
+            self.query_cache.clear()
+        logger.info("🔷🔷🔷 Normalized existing category data (%d rows updated)", updated)
+        return updated
     
-    def find_expenses_by_criteria(self, description: str = None, amount: float = None, 
-                                 category: str = None, date: str = None, 
-                                 user_id: str = None, limit: int = 10) -> pd.DataFrame:
-        """Find expenses matching specific criteria for editing"""
+    def _build_criteria_query(self, description: str = None, amount: float = None, 
+                              category: str = None, date: str = None, 
+                              user_id: str = None, limit: int = 10) -> tuple:
+        """Build the query and parameters used to find expenses for editing"""
         query = "SELECT id, date, amount, category, kakeibo_category, description, user_id FROM expenses WHERE 1=1"
         params = []
         
@@ -464,15 +1160,25 @@ class ExpensesSQLite:
             params.append(normalized_category)
         
         if date:
-            query += " AND DATE(date) = ?"
-            params.append(date)
+            # Range form of DATE(date) = ? so the (user_id, date) index can be used
+            query += " AND date >= DATE(?) AND date < DATE(?, '+1 day')"
+            params.extend([date, date])
         
         query += " ORDER BY date DESC, id DESC"
         
         if limit:
-            query += f" LIMIT {limit}"
+            query += " LIMIT ?"
+            params.append(int(limit))
         
-        with sqlite3.connect(self.db_path) as conn:
+        return query, params
+    
+    def find_expenses_by_criteria(self, description: str = None, amount: float = None, 
+                                 category: str = None, date: str = None, 
+                                 user_id: str = None, limit: int = 10) -> pd.DataFrame:
+        """Find expenses matching specific criteria for editing"""
+        query, params = self._build_criteria_query(description, amount, category, date, user_id, limit)
+        
+        with self._connection() as conn:
             logger.info("Finding expenses with query: %s, params: %s", query, params)
             df = pd.read_sql_query(query, conn, params=params)
             if not df.empty:
@@ -480,13 +1186,24 @@ class ExpensesSQLite:
                 df['category'] = df['category'].apply(self._normalize_category)
             return df
     
+    def iter_expenses_by_criteria(self, description: str = None, amount: float = None, 
+                                  category: str = None, date: str = None, 
+                                  user_id: str = None, limit: int = 10) -> Iterator[Expense]:
+        """Find expenses matching specific criteria for editing, as Expense rows"""
+        query, params = self._build_criteria_query(description, amount, category, date, user_id, limit)
+        logger.info("Finding expenses with query: %s, params: %s", query, params)
+        return self._iter_rows(query, params)
+    
     def update_expense(self, expense_id: int, amount: float = None, category: str = None, 
                       kakeibo_category: str = None, description: str = None, 
                       date: str = None) -> bool:
-        """Update an existing expense by ID"""
+        """Update an existing expense by ID; raises ValueError for a date that is not YYYY-MM-DD"""
+        if date is not None:
+            date = self._normalize_date(date)
+        
         try:
             # First, get the current expense to verify it exists
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     "SELECT id, date, amount, category, kakeibo_category, description, user_id FROM expenses WHERE id = ?",
@@ -535,6 +1252,7 @@ class ExpensesSQLite:
                 logger.info("Updating expense with query: %s, params: %s", update_query, update_params)
                 cursor.execute(update_query, update_params)
                 conn.commit()
+                self.query_cache.invalidate_user(current_expense[6])
                 
                 if cursor.rowcount > 0:
                     logger.info("✅ Successfully updated expense ID %s", expense_id)
@@ -547,6 +1265,116 @@ class ExpensesSQLite:
             logger.error("❌ Error updating expense ID %s: %s", expense_id, str(e))
             return False
 
+class AsyncExpensesSQLite:
+    """Awaitable facade over ExpensesSQLite for asyncio handlers.
+    
+    Reads run on a small thread pool (each thread has its own WAL connection) and
+    everything else runs on a single writer thread, so writes stay serialized and
+    a slow query or a lock held by the backup thread never blocks the event loop.
+    """
+    
+    # Methods that only read and can run concurrently; anything else goes to the writer
+    READ_METHODS = frozenset({
+        'get_user', 'list_users', 'get_expenses', 'get_user_expenses', 'get_monthly_expenses',
+        'get_monthly_category_summary', 'get_category_summary', 'get_kakeibo_summary',
+        'get_kakeibo_balance_analysis', 'get_top_expenses', 'get_spending_trends', 'get_user_stats',
+        'get_setting', 'get_last_backup_time', 'get_last_applied_update_id', 'find_expenses_by_criteria', 'get_query_cache_stats',
+        'get_schema_version', 'verify_monthly_rollups', 'get_data_fingerprint', 'has_changes_since_backup',
+        'iter_expenses', 'iter_top_expenses', 'iter_expenses_by_criteria'
+    })
+    
+    def __init__(self, db: ExpensesSQLite, reader_threads: int = DB_READER_THREADS,
+                 group_commit_window_ms: float = GROUP_COMMIT_WINDOW_MS,
+                 group_commit_max_batch: int = GROUP_COMMIT_MAX_BATCH):
+        self.db = db
+        self._readers = ThreadPoolExecutor(max_workers=reader_threads, thread_name_prefix='db-reader')
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        
+        # Group-commit queue for add_expense
+        self.group_commit_window = group_commit_window_ms / 1000
+        self.group_commit_max_batch = group_commit_max_batch
+        self._pending_expenses = []
+        self._flush_handle = None
+    
+    async def run(self, func, *args, write: bool = True, **kwargs):
+        """Run a callable against the database on the reader pool or the writer thread"""
+        executor = self._writer if write else self._readers
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+    
+    async def add_expense(self, amount: float, category: str, description: str, 
+                          kakeibo_category: str = None, user_id: str = None) -> Dict:
+        """Queue an expense insert; inserts arriving close together are committed in one transaction"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_expenses.append(({
+            'amount': amount,
+            'category': category,
+            'description': description,
+            'kakeibo_category': kakeibo_category,
+            'user_id': user_id
+        }, future))
+        
+        if len(self._pending_expenses) >= self.group_commit_max_batch:
+            self._flush_expenses()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.group_commit_window, self._flush_expenses)
+        
+        return await future
+    
+    def _flush_expenses(self):
+        """Hand the queued expense inserts to the writer thread as one batch"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        batch, self._pending_expenses = self._pending_expenses, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._commit_expenses(batch))
+    
+    async def _commit_expenses(self, batch: List[tuple]):
+        """Insert a batch of queued expenses and resolve each caller's future"""
+        try:
+            results = await self.run(self.db.add_expenses_bulk, [expense for expense, _ in batch])
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            # The whole transaction rolled back; retry one by one so only the bad item fails
+            logger.warning("⚠️⚠️⚠️ Group commit of %d expenses failed (%s), retrying individually", 
+                          len(batch), str(e))
+            for expense, future in batch:
+                try:
+                    result = await self.run(self.db.add_expense, **expense)
+                    if not future.done():
+                        future.set_result(result)
+                except Exception as item_error:
+                    if not future.done():
+                        future.set_exception(item_error)
+    
+    def __getattr__(self, name):
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+        
+        write = name not in self.READ_METHODS
+        if name.startswith('iter_'):
+            # Iterators must be consumed on the worker thread that owns the connection
+            func = lambda *args, **kwargs: list(attr(*args, **kwargs))
+        else:
+            func = attr
+        
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return await self.run(func, *args, write=write, **kwargs)
+        
+        return call
+    
+    def close(self):
+        """Stop the worker threads after pending calls finish"""
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+
 if __name__ == "__main__":
     db = ExpensesSQLite()
     
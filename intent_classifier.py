@@ -0,0 +1,132 @@
+import re
+import sys
+import json
+
+# Tools offered to the LLM for each intent; anything the classifier is unsure about gets every tool
+INTENT_TOOLS = {
+    'add': {'add_expense'},
+    'query': {
+        'get_monthly_expenses', 'get_category_summary', 'get_recent_expenses', 'get_expense_by_category',
+        'get_kakeibo_summary', 'get_kakeibo_balance_analysis', 'get_top_expenses', 'get_spending_trends'
+    },
+    'edit': {'edit_expense', 'normalize_categories'},
+}
+
+# Weighted keywords (single words or two-word phrases) voting for each intent
+INTENT_KEYWORDS = {
+    'add': {
+        'spent': 2, 'paid': 2, 'bought': 2, 'add': 2, 'added': 1, 'purchased': 2, 'cost': 1, 'costs': 1,
+        'gave': 1, 'for': 0.5, 'on': 0.5, 'rs': 1, 'inr': 1, 'rupees': 1, '₹': 1
+    },
+    'query': {
+        'show': 2, 'list': 2, 'how much': 3, 'summary': 2, 'summarize': 2, 'total': 1, 'recent': 2,
+        'top': 2, 'biggest': 2, 'highest': 2, 'largest': 2, 'trend': 2, 'trends': 2, 'analysis': 2,
+        'analyze': 2, 'analyse': 2, 'balance': 2, 'breakdown': 2, 'report': 2, 'compare': 2, 'what': 1,
+        'which': 1, 'where': 1, 'did i': 1, 'month': 1, "month's": 1, 'week': 1, 'spending': 1,
+        'expenses': 1, 'kakeibo': 1, 'last': 1, 'this': 0.5, 'so far': 2, 'overview': 2,
+        **{month: 1 for month in (
+            'january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september',
+            'october', 'november', 'december'
+        )}
+    },
+    'edit': {
+        'edit': 3, 'change': 3, 'update': 3, 'correct': 3, 'fix': 3, 'modify': 3, 'wrong': 2, 'instead': 2,
+        'should be': 3, 'rename': 3, 'normalize': 3, 'clean up': 2, 'move': 2, 'recategorize': 3,
+        'mistake': 2, 'typo': 2
+    },
+}
+
+# An amount in the message is a strong hint that an expense is being added
+AMOUNT_SCORE = 2
+_AMOUNT = re.compile(r'(?:₹\s*|rs\.?\s*)?\b\d+(?:[.,]\d+)?\b')
+_DATE = re.compile(r'\b\d{4}-\d{2}-\d{2}\b')
+_WORDS = re.compile(r"₹|[a-z']+")
+
+def score_intents(text: str) -> dict:
+    """Score each intent for a message by summing its keyword weights"""
+    text = text.lower()
+    words = _WORDS.findall(text)
+    terms = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+    scores = {intent: 0.0 for intent in INTENT_KEYWORDS}
+    for term in terms:
+        for intent, keywords in INTENT_KEYWORDS.items():
+            scores[intent] += keywords.get(term, 0)
+    if _AMOUNT.search(_DATE.sub(' ', text)):
+        scores['add'] += AMOUNT_SCORE
+    return scores
+
+def classify_intents(text: str, min_score: float = 2, margin: float = 1) -> set:
+    """Return the likely intents for a message, or an empty set when no intent is confident.
+
+    Every intent scoring within margin of the best is kept, so mixed messages get the union of tools.
+    """
+    scores = score_intents(text)
+    best = max(scores.values())
+    if best < min_score:
+        return set()
+    return {intent for intent, score in scores.items() if score >= best - margin}
+
+def select_tools(tools: list, text: str, min_score: float = 2, margin: float = 1) -> list:
+    """Return the subset of tool schemas for the message's intents, or all tools when unsure"""
+    intents = classify_intents(text, min_score, margin)
+    if not intents:
+        return tools
+    names = set().union(*(INTENT_TOOLS[intent] for intent in intents))
+    return [tool for tool in tools if tool['function']['name'] in names]
+
+def estimate_tokens(value) -> int:
+    """Rough token count for a prompt fragment (about 4 characters per token)"""
+    text = value if isinstance(value, str) else json.dumps(value)
+    return len(text) // 4
+
+def evaluate(labelled: list, tools: list, min_score: float = 2, margin: float = 1) -> dict:
+    """Replay labelled messages and measure tool coverage against prompt tokens saved.
+
+    A message counts as correct when every tool in its label is in the selected subset; a miss means
+    the LLM would not have been offered the tool it needed.
+    """
+    all_tokens = estimate_tokens(tools)
+    correct = 0
+    saved = 0
+    misses = []
+    for example in labelled:
+        selected = select_tools(tools, example['text'], min_score, margin)
+        names = {tool['function']['name'] for tool in selected}
+        if set(example['tools']) <= names:
+            correct += 1
+        else:
+            misses.append((example['text'], sorted(set(example['tools']) - names)))
+        saved += all_tokens - estimate_tokens(selected)
+
+    return {
+        'accuracy': correct / len(labelled) * 100,
+        'avg_tokens_saved': saved / len(labelled),
+        'avg_tokens_saved_pct': saved / len(labelled) / all_tokens * 100,
+        'misses': misses
+    }
+
+if __name__ == '__main__':
+    # Offline evaluation: python intent_classifier.py [labelled.jsonl]
+    # Each line is {"text": "...", "tools": ["tool_name", ...]} listing the tools the message needs
+    import prompts
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'intent_eval.jsonl'
+    with open(path, encoding='utf-8') as f:
+        labelled = [json.loads(line) for line in f if line.strip()]
+    tools = prompts.get_tools()
+    print(f"{len(labelled)} labelled messages, all tools ≈ {estimate_tokens(tools)} tokens, "
+          f"system prompt ≈ {estimate_tokens(prompts.get_system_prompt())} tokens\n")
+
+    print(f"{'min_score':>9} {'margin':>6} {'accuracy':>9} {'tokens saved':>13}")
+    for min_score in (1, 2, 3):
+        for margin in (0, 1, 2, 3):
+            result = evaluate(labelled, tools, min_score, margin)
+            print(f"{min_score:>9} {margin:>6} {result['accuracy']:>8.1f}% "
+                  f"{result['avg_tokens_saved']:>6.0f} ({result['avg_tokens_saved_pct']:.0f}%)")
+
+    result = evaluate(labelled, tools)
+    if result['misses']:
+        print("\nMisses at the default setting (min_score=2, margin=1):")
+        for text, missing in result['misses']:
+            print(f"  {text!r} missing {missing}")
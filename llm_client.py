@@ -0,0 +1,329 @@
+import os
+import re
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+from time import monotonic
+
+from groq import APIConnectionError, APIStatusError, RateLimitError
+
+from intent_classifier import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Client-side limits until Groq's x-ratelimit-* response headers report the account's own (defaults: developer tier)
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", 1000))
+LLM_TOKENS_PER_MINUTE = float(os.environ.get("LLM_TOKENS_PER_MINUTE", 300000))
+LLM_INITIAL_CONCURRENCY = int(os.environ.get("LLM_INITIAL_CONCURRENCY", 4))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 16))
+# Total time a caller may spend queued and retrying before giving up
+LLM_DEADLINE_SECONDS = float(os.environ.get("LLM_DEADLINE_SECONDS", 30))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 4))
+LLM_BACKOFF_BASE_SECONDS = float(os.environ.get("LLM_BACKOFF_BASE_SECONDS", 0.5))
+LLM_BACKOFF_MAX_SECONDS = float(os.environ.get("LLM_BACKOFF_MAX_SECONDS", 8))
+
+# Back off before hitting a 429 once less than this share of a server-side limit remains
+LOW_REMAINING_FRACTION = 0.1
+# Several requests failing together count as one congestion signal
+DECREASE_COOLDOWN_SECONDS = 1.0
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_SECONDS = {'ms': 0.001, 'h': 3600, 'm': 60, 's': 1}
+
+def parse_reset_duration(value: str):
+    """Parse a Groq reset header such as "7.66s", "2m59.56s" or "120ms" into seconds"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in parts)
+
+def _header_number(headers, name: str):
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+class LLMBusyError(RuntimeError):
+    """The LLM stayed rate limited or overloaded past the caller's deadline"""
+
+class TokenBucket:
+    """Refilling budget of requests or tokens per window; the level may go negative after an under-estimate"""
+
+    def __init__(self, limit: float, window_seconds: float = 60):
+        self.capacity = limit
+        self.window_seconds = window_seconds
+        self.rate = limit / window_seconds
+        self.level = limit
+        self._updated = monotonic()
+
+    def _refill(self):
+        now = monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken (amounts above capacity only need a full bucket)"""
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(missing / self.rate, 0.0) if self.rate > 0 else 0.0
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def sync(self, remaining: float, reset_seconds: float = None, limit: float = None):
+        """Adopt the server's limit for the window and lower the level to what it reports is left.
+
+        The level only rises to remaining when the limit itself changed; otherwise a response that
+        was sent before our latest requests could hand back budget they already used.
+        """
+        self._refill()
+        if limit and limit != self.capacity:
+            self.capacity = limit
+            self.rate = limit / self.window_seconds
+            self.level = min(self.level, limit) if remaining is None else remaining
+        if remaining is None or remaining >= self.level:
+            return
+        self.level = remaining
+        if remaining <= 0 and reset_seconds:
+            # Empty until the server's window resets, whatever our refill rate says
+            self.level = -reset_seconds * self.rate
+
+class LLMClient:
+    """Rate-limited, retrying wrapper around an AsyncGroq client's chat completions.
+
+    Requests wait for a concurrency slot and for request and token budget, highest priority
+    first. The concurrency limit grows by one per limit's worth of successes and halves on 429s
+    or when Groq's rate-limit headers run low (AIMD). Retryable failures are retried with full
+    jitter backoff, honouring Retry-After, until the caller's deadline.
+    """
+
+    def __init__(self, client, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+                 initial_concurrency: int = LLM_INITIAL_CONCURRENCY,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 deadline_seconds: float = LLM_DEADLINE_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.client = client
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.daily_requests = None  # Created from x-ratelimit-limit-requests, which Groq counts per day
+        self.max_concurrency = max_concurrency
+        self.limit = max(1, min(initial_concurrency, max_concurrency))
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._blocked_until = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._condition = None  # Created lazily so it binds to the running event loop
+
+        self.stats = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'throttled': 0, 'busy': 0,
+                      'priority': 0, 'queue_seconds': 0.0}
+
+    async def create(self, priority: bool = False, deadline_seconds: float = None, **kwargs):
+        """Call chat.completions.create with rate limiting and retries.
+
+        priority requests (such as adding an expense) are admitted before queued normal ones.
+        Raises LLMBusyError when the deadline passes while queued or rate limited.
+        """
+        deadline = monotonic() + (deadline_seconds or self.deadline_seconds)
+        estimated_tokens = estimate_tokens(kwargs.get('messages', [])) + estimate_tokens(kwargs.get('tools', []))
+        self.stats['requests'] += 1
+        if priority:
+            self.stats['priority'] += 1
+
+        attempt = 0
+        while True:
+            await self._acquire(priority, estimated_tokens, deadline)
+            retry_after = None
+            try:
+                raw = await self.client.chat.completions.with_raw_response.create(
+                    timeout=max(deadline - monotonic(), 1.0), **kwargs
+                )
+                response = await raw.parse()
+            except (APIStatusError, APIConnectionError) as e:
+                error = e
+                status = getattr(e, 'status_code', None)
+                headers = e.response.headers if isinstance(e, APIStatusError) else {}
+                if isinstance(e, RateLimitError):
+                    self.stats['rate_limited'] += 1
+                    retry_after = self._retry_after(headers)
+                    self._sync_limits(headers)
+                    self._decrease("429 from server")
+                    if retry_after:
+                        self._blocked_until = max(self._blocked_until, monotonic() + retry_after)
+                retryable = status is None or status in RETRYABLE_STATUS_CODES or status >= 500
+                if not retryable or attempt >= self.max_retries:
+                    if isinstance(e, RateLimitError):
+                        self.stats['busy'] += 1
+                        raise LLMBusyError(f"LLM rate limited after {attempt + 1} attempts") from e
+                    raise
+            else:
+                self._on_success(raw.headers, response, estimated_tokens)
+                return response
+            finally:
+                await self._release()
+
+            # Full jitter backoff, but never sooner than the server asked for
+            delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+            delay = max(delay, retry_after or 0)
+            if monotonic() + delay >= deadline:
+                self.stats['busy'] += 1
+                raise LLMBusyError(f"LLM unavailable, no time left to retry after {attempt + 1} attempts") from error
+            attempt += 1
+            self.stats['retries'] += 1
+            logger.warning("⚠️⚠️⚠️ LLM call failed (%s), retry %d in %.2fs", error, attempt, delay)
+            await asyncio.sleep(delay)
+
+    async def _acquire(self, priority: bool, estimated_tokens: int, deadline: float):
+        """Wait for a concurrency slot and request/token budget, in priority then arrival order"""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        ticket = (0 if priority else 1, next(self._sequence))
+        started = monotonic()
+        async with self._condition:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    wait = None
+                    if self._waiters[0] == ticket and self.in_flight < self.limit:
+                        wait = max(
+                            self._blocked_until - monotonic(),
+                            self.requests.wait_time(1),
+                            self.tokens.wait_time(estimated_tokens),
+                            self.daily_requests.wait_time(1) if self.daily_requests else 0.0
+                        )
+                        if wait <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(estimated_tokens)
+                            if self.daily_requests:
+                                self.daily_requests.take(1)
+                            self.in_flight += 1
+                            break
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        self.stats['busy'] += 1
+                        raise LLMBusyError("LLM request queue is full, gave up waiting")
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), min(wait, remaining) if wait else remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._condition.notify_all()
+        self.stats['queue_seconds'] += monotonic() - started
+
+    async def _release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _retry_after(self, headers):
+        retry_after = _header_number(headers, 'retry-after')
+        if retry_after is None:
+            retry_after = parse_reset_duration(headers.get('x-ratelimit-reset-tokens'))
+        return retry_after
+
+    def _on_success(self, headers, response, estimated_tokens: int):
+        """Charge actual token usage and adapt the concurrency limit to the rate-limit headers"""
+        usage = getattr(response, 'usage', None)
+        if usage is not None and getattr(usage, 'total_tokens', None):
+            self.tokens.take(usage.total_tokens - estimated_tokens)
+
+        if self._sync_limits(headers):
+            self.stats['throttled'] += 1
+            self._decrease("rate-limit headers running low")
+            return
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_concurrency:
+            self.limit += 1
+            self._successes = 0
+
+    def _sync_limits(self, headers) -> bool:
+        """Adopt the account's limits from Groq's x-ratelimit-* headers; True when one is running low"""
+        low = False
+        for kind in ('requests', 'tokens'):
+            limit = _header_number(headers, f'x-ratelimit-limit-{kind}')
+            remaining = _header_number(headers, f'x-ratelimit-remaining-{kind}')
+            reset_seconds = parse_reset_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+            if kind == 'tokens':
+                self.tokens.sync(remaining, reset_seconds, limit)
+            elif limit:
+                # Groq's request limit is per day; the per-minute request budget stays as configured
+                if self.daily_requests is None:
+                    self.daily_requests = TokenBucket(limit, window_seconds=24 * 3600)
+                self.daily_requests.sync(remaining, reset_seconds, limit)
+            if limit and remaining is not None and remaining < limit * LOW_REMAINING_FRACTION:
+                low = True
+        return low
+
+    def _decrease(self, reason: str):
+        now = monotonic()
+        if now - self._last_decrease < DECREASE_COOLDOWN_SECONDS:
+            return
+        self._last_decrease = now
+        self._successes = 0
+        previous, self.limit = self.limit, max(1, self.limit // 2)
+        if self.limit != previous:
+            logger.warning("⚠️⚠️⚠️ LLM concurrency limit %d -> %d (%s)", previous, self.limit, reason)
+
+    def get_stats(self) -> dict:
+        """Get limiter counters and current state"""
+        return {
+            **self.stats,
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'queued': len(self._waiters),
+            'requests_available': max(self.requests.level, 0),
+            'tokens_available': max(self.tokens.level, 0)
+        }
+
+if __name__ == '__main__':
+    # Load test against a rate-limited endpoint: GROQ_BASE_URL=http://127.0.0.1:8000 python llm_client.py [requests]
+    # (tests/test_llm_client.py covers 429s, 5xx, Retry-After, AIMD and priority against a scripted fake)
+    import sys
+    import httpx
+    from groq import AsyncGroq
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+
+    async def main(count: int):
+        llm = LLMClient(AsyncGroq(api_key=os.environ.get("GROQ_API_KEY", "test"), max_retries=0,
+                                  http_client=httpx.AsyncClient()))
+
+        async def one(index: int):
+            started = monotonic()
+            try:
+                await llm.create(priority=index % 5 == 0, model="fake",
+                                 messages=[{"role": "user", "content": f"Spent {index} on groceries"}], max_tokens=50)
+                return 'ok', monotonic() - started
+            except LLMBusyError:
+                return 'busy', monotonic() - started
+            except Exception as e:
+                return type(e).__name__, monotonic() - started
+
+        started = monotonic()
+        results = await asyncio.gather(*(one(index) for index in range(count)))
+        outcomes = {}
+        for outcome, _ in results:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        latencies = sorted(latency for outcome, latency in results if outcome == 'ok')
+        print(f"{count} requests in {monotonic() - started:.1f}s: {outcomes}")
+        if latencies:
+            print(f"latency p50 {latencies[len(latencies) // 2]:.2f}s, p95 {latencies[int(len(latencies) * 0.95)]:.2f}s")
+        print(llm.get_stats())
+
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
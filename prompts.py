@@ -41,4 +41,173 @@ For expense analysis:
 
 Always use the appropriate tool for user requests. Be helpful and provide clear responses.
 /no_think
-"""
\ No newline at end of file
+"""
+
+def get_tools() -> list:
+    """Get the tool schemas offered to the OpenAI API"""
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "add_expense",
+                "description": "Add a new expense to the database",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "amount": {"type": "number", "description": "The amount of the expense"},
+                        "category": {"type": "string", "description": "Category: Food, Transportation, Utilities, Entertainment, Healthcare, Education, Shopping, Travel, Dining, Groceries, Rent, Gifts, Donations, Subscriptions, Personal Care, Miscellaneous"},
+                        "kakeibo_category": {"type": "string", "description": "Kakeibo category: survival (needs), optional (wants), culture (self-improvement), extra (unexpected)"},
+                        "description": {"type": "string", "description": "Description of the expense"},
+                        "user_id": {"type": "string", "description": "User ID (optional)"}
+                    },
+                    "required": ["amount", "category", "description"]
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_monthly_expenses",
+                "description": "Get all expenses for a specific month",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "year": {"type": "integer", "description": "Year (optional, defaults to current)"},
+                        "month": {"type": "integer", "description": "Month (optional, defaults to current)"}
+                    }
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_category_summary",
+                "description": "Get spending summary by category",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "start_date": {"type": "string", "description": "Start date (YYYY-MM-DD, optional)"},
+                        "end_date": {"type": "string", "description": "End date (YYYY-MM-DD, optional)"}
+                    }
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_recent_expenses",
+                "description": "Get recent expenses",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "days": {"type": "integer", "description": "Number of days to look back (default: 7)"}
+                    }
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_expense_by_category",
+                "description": "Get expenses filtered by category",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "category": {"type": "string", "description": "Category name"},
+                        "start_date": {"type": "string", "description": "Start date (YYYY-MM-DD, optional)"},
+                        "end_date": {"type": "string", "description": "End date (YYYY-MM-DD, optional)"}
+                    }
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_kakeibo_summary",
+                "description": "Get spending summary by kakeibo categories",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "start_date": {"type": "string", "description": "Start date (YYYY-MM-DD, optional)"},
+                        "end_date": {"type": "string", "description": "End date (YYYY-MM-DD, optional)"}
+                    }
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_kakeibo_balance_analysis",
+                "description": "Analyze kakeibo balance and provide recommendations",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "start_date": {"type": "string", "description": "Start date (YYYY-MM-DD, optional)"},
+                        "end_date": {"type": "string", "description": "End date (YYYY-MM-DD, optional)"}
+                    }
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_top_expenses",
+                "description": "Get top expenses by amount",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "limit": {"type": "integer", "description": "Number of top expenses to return (default: 10)"},
+                        "start_date": {"type": "string", "description": "Start date (YYYY-MM-DD, optional)"},
+                        "end_date": {"type": "string", "description": "End date (YYYY-MM-DD, optional)"}
+                    }
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_spending_trends",
+                "description": "Get monthly spending trends",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "months": {"type": "integer", "description": "Number of months to analyze (default: 6)"}
+                    }
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "normalize_categories",
+                "description": "Normalize all existing categories to handle case sensitivity",
+                "parameters": {
+                    "type": "object",
+                    "properties": {}
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "edit_expense",
+                "description": "Find and edit an existing expense. Can search by description, amount, category, or date to find the exact expense to modify.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "search_description": {"type": "string", "description": "Part of the description to search for the expense to edit"},
+                        "search_amount": {"type": "number", "description": "Amount to search for the expense to edit"},
+                        "search_category": {"type": "string", "description": "Category to search for the expense to edit"},
+                        "search_date": {"type": "string", "description": "Date (YYYY-MM-DD) to search for the expense to edit"},
+                        "new_amount": {"type": "number", "description": "New amount for the expense (optional)"},
+                        "new_category": {"type": "string", "description": "New category for the expense (optional)"},
+                        "new_kakeibo_category": {"type": "string", "description": "New kakeibo category (optional): survival, optional, culture, extra"},
+                        "new_description": {"type": "string", "description": "New description for the expense (optional)"},
+                        "new_date": {"type": "string", "description": "New date (YYYY-MM-DD) for the expense (optional)"},
+                        "expense_index": {"type": "integer", "description": "If multiple expenses found, specify which one to edit (1-based index)"}
+                    },
+                    "required": []
+                }
+            }
+        }
+    ]
@@ -0,0 +1,143 @@
+"""Benchmark full-backup restores against a local S3 stand-in with per-connection latency and bandwidth limits.
+
+Usage: python restore_benchmark.py [object_mb] [latency_ms] [mbit_per_connection]
+
+The defaults (384 MB, 30 ms, 200 Mbit/s) match the parallel restore benchmark's 384 MB database at
+25 MB/s per connection; that database held 2M expense rows, so only its uncompressed timings compare.
+The buffer-cap figures for a 135 MB object come from `python restore_benchmark.py 135`.
+
+Prints restore time and peak Python memory (tracemalloc) for several concurrency, part size and
+buffer settings, so S3_RESTORE_CONCURRENCY / S3_RESTORE_PART_SIZE_MB / S3_RESTORE_BUFFER_MB can be
+chosen for an instance's memory.
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import threading
+import tracemalloc
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from s3_storage import BACKUP_INDEX_KEY, BACKUP_PREFIX, S3Storage
+
+BUCKET = 'restore-benchmark'
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    """HEAD and (ranged) GET of in-memory objects; enough of S3 for download_backup"""
+    protocol_version = 'HTTP/1.1'
+    objects = {}  # key -> (body, metadata)
+    latency = 0.03
+    bytes_per_second = 25e6
+
+    def log_message(self, *args):
+        pass
+
+    def _object(self):
+        key = self.path.split('?')[0].lstrip('/').split('/', 1)[-1]
+        if key not in self.objects:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None, None
+        return self.objects[key]
+
+    def _send_headers(self, status, length, metadata, extra=()):
+        self.send_response(status)
+        self.send_header('Content-Length', str(length))
+        self.send_header('ETag', '"benchmark"')
+        self.send_header('Last-Modified', 'Thu, 01 Jan 2026 00:00:00 GMT')
+        self.send_header('Accept-Ranges', 'bytes')
+        for name, value in list(metadata.items()) + list(extra):
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_HEAD(self):
+        time.sleep(self.latency)
+        body, metadata = self._object()
+        if body is not None:
+            self._send_headers(200, len(body), {f'x-amz-meta-{k}': v for k, v in metadata.items()})
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        body, metadata = self._object()
+        if body is None:
+            return
+        start, end, status, extra = 0, len(body) - 1, 200, []
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+            status, extra = 206, [('Content-Range', f'bytes {start}-{end}/{len(body)}')]
+        self._send_headers(status, end - start + 1, {f'x-amz-meta-{k}': v for k, v in metadata.items()}, extra)
+
+        # Stream at the per-connection bandwidth
+        started = time.perf_counter()
+        sent = 0
+        view = memoryview(body)[start:end + 1]
+        while sent < len(view):
+            piece = view[sent:sent + 256 * 1024]
+            self.wfile.write(piece)
+            sent += len(piece)
+            ahead = sent / self.bytes_per_second - (time.perf_counter() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+def build_database(path, size_mb):
+    """Create an SQLite database of roughly size_mb (10^6 bytes) of incompressible rows, one per 4 KiB page"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE blobs (id INTEGER PRIMARY KEY, data BLOB)")
+    conn.executemany("INSERT INTO blobs (data) VALUES (?)", ((os.urandom(4000),) for _ in range(int(size_mb * 1e6 / 4096))))
+    conn.commit()
+    conn.close()
+
+def restore(endpoint, target, concurrency, part_mb, buffer_mb):
+    """Restore the benchmark object once; returns (seconds, peak traced MB)"""
+    os.environ.update(S3_RESTORE_CONCURRENCY=str(concurrency), S3_RESTORE_PART_SIZE_MB=str(part_mb),
+                      S3_RESTORE_BUFFER_MB=str(buffer_mb), S3_BACKUP_MODE='full')
+    storage = S3Storage(endpoint_url=endpoint, aws_access_key_id='benchmark',
+                        aws_secret_access_key='benchmark', bucket_name=BUCKET)
+    tracemalloc.start()
+    started = time.perf_counter()
+    if not storage.restore_latest_database(target):
+        raise RuntimeError("Restore failed")
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 384
+    FakeS3Handler.latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 30) / 1000
+    FakeS3Handler.bytes_per_second = (float(sys.argv[3]) if len(sys.argv) > 3 else 200) * 1e6 / 8
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, 'source.db')
+        build_database(database, size_mb)
+        with open(database, 'rb') as f:
+            body = f.read()
+        name = f"{BACKUP_PREFIX}20260101_000000.db"
+        FakeS3Handler.objects = {
+            name: (body, {'sha256': hashlib.sha256(body).hexdigest(), 'compression': 'none'}),
+            BACKUP_INDEX_KEY: (json.dumps({'version': 1, 'backups': [{'name': name}]}).encode(), {}),
+        }
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeS3Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+        print(f"{len(body) / 1e6:.0f} MB object, {FakeS3Handler.latency * 1000:.0f} ms latency, "
+              f"{FakeS3Handler.bytes_per_second * 8 / 1e6:.0f} Mbit/s per connection\n")
+
+        print(f"{'concurrency':>11} {'part MB':>7} {'buffer MB':>9} {'seconds':>8} {'MB/s':>6} {'peak MB':>8}")
+        # (8, 8, 128) was the default before the buffer cap (2 x concurrency parts of 8 MB)
+        for concurrency, part_mb, buffer_mb in ((1, 8, 16), (8, 8, 128), (8, 8, 32), (8, 4, 32), (8, 4, 16),
+                                                (8, 2, 16)):
+            elapsed, peak = restore(endpoint, os.path.join(directory, 'restored.db'), concurrency, part_mb, buffer_mb)
+            print(f"{concurrency:>11} {part_mb:>7} {buffer_mb:>9} {elapsed:>8.2f} "
+                  f"{len(body) / 1e6 / elapsed:>6.0f} {peak:>8.1f}")
+        server.shutdown()
@@ -0,0 +1,186 @@
+import os
+import re
+import copy
+import threading
+from collections import OrderedDict
+from datetime import date
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+
+from intent_classifier import INTENT_TOOLS
+
+ROUTING_CACHE_SIZE = int(os.environ.get("ROUTING_CACHE_SIZE", 256))
+ROUTING_CACHE_TTL_SECONDS = int(os.environ.get("ROUTING_CACHE_TTL_SECONDS", 86400))
+
+# Only read-only tools are replayed from the cache; adds and edits always go through the LLM
+CACHEABLE_TOOLS = INTENT_TOOLS['query']
+
+# Arguments that depend on the calendar; they are cached only when they can be rebuilt from the
+# message's own values or from today's date, otherwise "last month" would be frozen at the first answer
+DATE_ARGUMENTS = {'year', 'month', 'start_date', 'end_date'}
+
+MONTHS = {
+    name: number
+    for number, names in enumerate((
+        ('january', 'jan'), ('february', 'feb'), ('march', 'mar'), ('april', 'apr'), ('may',),
+        ('june', 'jun'), ('july', 'jul'), ('august', 'aug'), ('september', 'sep', 'sept'),
+        ('october', 'oct'), ('november', 'nov'), ('december', 'dec')
+    ), start=1)
+    for name in names
+}
+
+_TOKENS = re.compile(r"@\w+|\d{4}-\d{2}-\d{2}|\d+(?:\.\d+)?|[a-z]+")
+
+def _today_values(today: date) -> dict:
+    return {
+        'year': today.year,
+        'month': today.month,
+        'today': today.isoformat(),
+        'month_start': today.replace(day=1).isoformat(),
+        'year_start': today.replace(month=1, day=1).isoformat(),
+    }
+
+def mask_message(message: str) -> Tuple[str, dict]:
+    """Normalise a message into a template with dates, numbers, month names and @usernames masked.
+
+    Returns the template and the masked values by slot name, e.g.
+    "Top 5 expenses in August" -> ("top <n0> expenses in <m0>", {'<n0>': 5, '<m0>': 8})
+    """
+    slots = {}
+    counts = {}
+    words = []
+    for token in _TOKENS.findall(message.lower().replace("'", '')):
+        if token.startswith('@'):
+            kind, value = 'u', token
+        elif '-' in token:
+            kind, value = 'd', token
+        elif token[0].isdigit():
+            kind, value = 'n', float(token) if '.' in token else int(token)
+        elif token in MONTHS:
+            kind, value = 'm', MONTHS[token]
+        else:
+            words.append(token)
+            continue
+        slot = f"<{kind}{counts.get(kind, 0)}>"
+        counts[kind] = counts.get(kind, 0) + 1
+        slots[slot] = value
+        words.append(slot)
+    return ' '.join(words), slots
+
+def _template_arguments(arguments: dict, slots: dict, today: date) -> Optional[dict]:
+    """Replace argument values taken from the message or today's date with placeholders.
+
+    Returns None when an argument cannot be rebuilt unambiguously for a future message.
+    """
+    today_values = _today_values(today)
+    template = {}
+    for key, value in arguments.items():
+        matching_slots = [slot for slot, slot_value in slots.items() if slot_value == value]
+        if len(matching_slots) > 1:
+            # "top 8 expenses in august": 8 could be either slot
+            return None
+        if matching_slots:
+            template[key] = ('slot', matching_slots[0])
+            continue
+        if key in DATE_ARGUMENTS:
+            matching_today = [name for name, today_value in today_values.items() if today_value == value]
+            if len(matching_today) != 1:
+                # In January "this year" and "this month" start on the same day; either could be meant
+                return None
+            template[key] = ('today', matching_today[0])
+            continue
+        template[key] = ('value', value)
+    return template
+
+def _fill_arguments(template: dict, slots: dict, today: date) -> Optional[dict]:
+    today_values = _today_values(today)
+    arguments = {}
+    for key, (kind, value) in template.items():
+        if kind == 'slot':
+            if value not in slots:
+                return None
+            arguments[key] = slots[value]
+        elif kind == 'today':
+            arguments[key] = today_values[value]
+        else:
+            arguments[key] = copy.deepcopy(value)
+    return arguments
+
+class RoutingCache:
+    """Thread-safe LRU cache of LLM tool-routing decisions keyed on masked message templates.
+
+    Only the chosen tools and argument templates are cached, never results, so replayed
+    tool calls still run against current data.
+    """
+
+    def __init__(self, max_size: int = ROUTING_CACHE_SIZE, ttl_seconds: int = ROUTING_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.uncacheable = 0
+        self.evictions = 0
+
+    def lookup(self, message: str, today: date) -> Optional[List[Tuple[str, dict]]]:
+        """Return the (tool_name, arguments) calls for a message whose template was routed before"""
+        template, slots = mask_message(message)
+        with self._lock:
+            entry = self._entries.get(template)
+            if entry is not None:
+                expires_at, calls = entry
+                if expires_at > monotonic():
+                    filled = [(name, _fill_arguments(arguments, slots, today)) for name, arguments in calls]
+                    if all(arguments is not None for _, arguments in filled):
+                        self._entries.move_to_end(template)
+                        self.hits += 1
+                        return filled
+                del self._entries[template]
+            self.misses += 1
+            return None
+
+    def store(self, message: str, calls: List[Tuple[str, dict]], today: date) -> bool:
+        """Cache the LLM's tool calls for a message if they are read-only and can be templated"""
+        if self.max_size <= 0 or not calls:
+            return False
+        template, slots = mask_message(message)
+        templated = []
+        for name, arguments in calls:
+            arguments_template = _template_arguments(arguments, slots, today) if name in CACHEABLE_TOOLS else None
+            if arguments_template is None:
+                with self._lock:
+                    self.uncacheable += 1
+                return False
+            templated.append((name, arguments_template))
+
+        with self._lock:
+            self._entries[template] = (monotonic() + self.ttl_seconds, templated)
+            self._entries.move_to_end(template)
+            self.stores += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        """Drop every cached routing decision"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Get cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups * 100) if lookups else 0.0,
+                'stores': self.stores,
+                'uncacheable': self.uncacheable,
+                'evictions': self.evictions
+            }
@@ -1,8 +1,22 @@
 import os
+import json
+import uuid
+import socket
+import lzma
+import zlib
+import struct
+import hashlib
 import logging
+import sqlite3
+import threading
 import boto3
 from botocore.exceptions import ClientError
 import tempfile
+from collections import deque
+from contextlib import ExitStack, closing, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from email.utils import parsedate_to_datetime
 from datetime import datetime, timedelta, timezone,time
 # import time
 
@@ -11,6 +25,100 @@ logger = logging.getLogger(__name__)
 # Define IST timezone (GMT+5:30)
 IST = timezone(timedelta(hours=5, minutes=30))
 
+# Full backup objects: expenses_backup_YYYYMMDD_HHMMSS.db[.gz|.xz]
+BACKUP_PREFIX = 'expenses_backup_'
+
+# One small JSON object listing every full backup and manifest, read instead of listing the bucket
+BACKUP_INDEX_KEY = 'index/expenses_backups.json'
+
+# Backup leader lease: only the instance holding it uploads backups and runs retention
+LEASE_KEY = 'locks/backup.lease'
+LEASE_SAFETY_SECONDS = 5  # Stop acting as leader this long before the lease could expire
+
+# delete_objects accepts at most this many keys per call
+DELETE_BATCH_SIZE = 1000
+
+# Incremental backup layout: content-addressed chunks plus one small manifest per backup
+CHUNK_PREFIX = 'chunks/'
+MANIFEST_PREFIX = 'manifests/expenses_backup_'
+
+# Full backups are streamed through a compressor; the codec's suffix follows .db in the object name
+BACKUP_COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'lzma': '.xz'}
+COMPRESSION_READ_SIZE = 1024 * 1024
+
+# WAL shipping layout: wal/<generation>/base.db plus wal/<generation>/<seq>_<timestamp>.seg
+WAL_PREFIX = 'wal/'
+WAL_HEADER_SIZE = 32
+WAL_FRAME_HEADER_SIZE = 24
+WAL_GENERATION_RETRY_MAX_SECONDS = 300  # Failed generation starts back off exponentially up to this
+
+def _backup_timestamp(name):
+    """Extract YYYYMMDD_HHMMSS from a backup or manifest object name"""
+    for prefix in (BACKUP_PREFIX, MANIFEST_PREFIX):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+            break
+    return name.split('.', 1)[0]
+
+def _parse_retention_tiers(spec):
+    """Parse "15m:1d,1h:7d,1d:30d" into [(interval, horizon), ...] timedeltas ordered by horizon"""
+    units = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+    tiers = []
+    for tier in spec.split(','):
+        interval, horizon = (part.strip() for part in tier.split(':'))
+        tiers.append((
+            timedelta(**{units[interval[-1]]: int(interval[:-1])}),
+            timedelta(**{units[horizon[-1]]: int(horizon[:-1])}),
+        ))
+    return sorted(tiers, key=lambda tier: tier[1])
+
+def _new_compressor(compression):
+    """Create a streaming compressor for a backup compression codec"""
+    if compression == 'gzip':
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if compression == 'lzma':
+        # Preset 1: most of lzma's gain over gzip at a tenth of the default preset's CPU time
+        return lzma.LZMACompressor(preset=1)
+    return None
+
+def _new_decompressor(object_name):
+    """Create a streaming decompressor matching a backup object's suffix"""
+    if object_name.endswith(BACKUP_COMPRESSION_SUFFIXES['gzip']):
+        return zlib.decompressobj(31)
+    if object_name.endswith(BACKUP_COMPRESSION_SUFFIXES['lzma']):
+        return lzma.LZMADecompressor()
+    return None
+
+class LeaseLostError(RuntimeError):
+    """Raised when an instance acts on a backup lease it no longer holds"""
+
+class CompressingReader:
+    """Readable file object that compresses another file object on the fly"""
+    
+    def __init__(self, source, compression):
+        self.source = source
+        self.compressor = _new_compressor(compression)
+        self.buffer = bytearray()
+        self.eof = False
+        self.size = 0  # Compressed bytes handed out so far
+    
+    def read(self, size=-1):
+        while not self.eof and (size is None or size < 0 or len(self.buffer) < size):
+            data = self.source.read(COMPRESSION_READ_SIZE)
+            if data:
+                self.buffer += self.compressor.compress(data) if self.compressor else data
+            else:
+                if self.compressor:
+                    self.buffer += self.compressor.flush()
+                self.eof = True
+        
+        if size is None or size < 0:
+            size = len(self.buffer)
+        chunk = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.size += len(chunk)
+        return chunk
+
 class S3Storage:
     def __init__(self, 
                  endpoint_url=None, 
@@ -33,6 +141,47 @@ class S3Storage:
         self.max_backups = int(os.environ.get('S3_MAX_BACKUPS', max_backups))
         self.max_age_days = int(os.environ.get('S3_MAX_AGE_DAYS', max_age_days))
         self.cleanup_frequency_minutes = int(os.environ.get('S3_CLEANUP_FREQUENCY_MINUTES', 60))  # Run cleanup every hour
+        self.delete_concurrency = int(os.environ.get('S3_DELETE_CONCURRENCY', 4))  # Parallel delete_objects batches
+        
+        # Tiered retention, e.g. "15m:1d,1h:7d,1d:30d" keeps one backup per 15 minutes for a day,
+        # one per hour for a week and one per day for a month; replaces max_backups/max_age_days when set
+        self.retention_tiers = None
+        if os.environ.get('S3_RETENTION_TIERS'):
+            try:
+                self.retention_tiers = _parse_retention_tiers(os.environ['S3_RETENTION_TIERS'])
+            except (ValueError, KeyError, IndexError):
+                logger.warning("⚠️⚠️⚠️ Invalid S3_RETENTION_TIERS %s, using max backups/age retention", 
+                              os.environ['S3_RETENTION_TIERS'])
+        
+        # Backup mode: 'full' uploads the whole database, 'incremental' uploads only changed chunks
+        self.backup_mode = os.environ.get('S3_BACKUP_MODE', 'full').lower()
+        self.chunk_size = int(os.environ.get('S3_CHUNK_SIZE_KB', 256)) * 1024
+        self.chunk_grace_minutes = int(os.environ.get('S3_CHUNK_GRACE_MINUTES', 60))  # Never sweep chunks younger than this
+        self._known_chunks = None  # Chunk hashes known to exist in the bucket, loaded lazily
+        self._bucket_ready = False  # Bucket existence is checked once per instance
+        
+        # Backup leader lease (conditional puts); expiry is judged on S3's clock or on local monotonic
+        # time spent watching an unrenewed lease, never by comparing wall clocks across instances
+        self.lease_enabled = os.environ.get('S3_BACKUP_LEASE', 'true').lower() == 'true'
+        self.lease_seconds = int(os.environ.get('S3_BACKUP_LEASE_SECONDS', 300))
+        self.instance_id = os.environ.get('RENDER_INSTANCE_ID') or \
+            f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lease_token = None  # Fencing token of the lease this instance holds (or last held)
+        self._lease_etag = None
+        self._lease_deadline = 0.0  # monotonic() time after which we no longer trust our lease
+        self._observed_lease = None  # (etag, monotonic() first seen) of another holder's lease
+        self._lease_lock = threading.Lock()  # The backup scheduler and the WAL shipper both renew
+        
+        # Restores fetch objects as parallel ranged GETs, buffering at most restore_buffer_bytes of parts
+        self.restore_concurrency = int(os.environ.get('S3_RESTORE_CONCURRENCY', 8))
+        self.restore_part_size = int(os.environ.get('S3_RESTORE_PART_SIZE_MB', 4)) * 1024 * 1024
+        self.restore_buffer_bytes = int(os.environ.get('S3_RESTORE_BUFFER_MB', 32)) * 1024 * 1024
+        
+        # Compression for full backups: 'gzip' (default), 'lzma' or 'none'
+        self.compression = os.environ.get('S3_BACKUP_COMPRESSION', 'gzip').lower()
+        if self.compression not in BACKUP_COMPRESSION_SUFFIXES:
+            logger.warning("⚠️⚠️⚠️ Unknown S3_BACKUP_COMPRESSION %s, uploading uncompressed", self.compression)
+            self.compression = 'none'
         
         # Create S3 client
         self.s3 = boto3.client(
@@ -48,9 +197,13 @@ class S3Storage:
                    self.endpoint_url or 'AWS Default', self.bucket_name)
         logger.info("🔷🔷🔷 Backup retention: max %d backups, max %d days, cleanup every %d minutes", 
                    self.max_backups, self.max_age_days, self.cleanup_frequency_minutes)
+        logger.info("🔷🔷🔷 Backup mode: %s (chunk size %d KB, compression %s)", 
+                   self.backup_mode, self.chunk_size // 1024, self.compression)
     
     def _ensure_bucket_exists(self):
         """Make sure the bucket exists, create it if needed"""
+        if self._bucket_ready:
+            return
         try:
             self.s3.head_bucket(Bucket=self.bucket_name)
             logger.info("🔷🔷🔷 Bucket exists: %s", self.bucket_name)
@@ -73,6 +226,7 @@ class S3Storage:
             else:
                 logger.error("❌❌❌ Error checking bucket: %s", str(e))
                 raise
+        self._bucket_ready = True
     
     def upload_file(self, file_path, object_name=None):
         """Upload a file to S3 bucket"""
@@ -92,6 +246,132 @@ class S3Storage:
             logger.error("❌❌❌ Failed to upload file to S3: %s", str(e))
             return False
     
+    def upload_fileobj(self, fileobj, object_name, metadata=None):
+        """Upload a readable binary file object to S3 bucket"""
+        if not self.bucket_name:
+            raise ValueError("S3 bucket name not specified")
+        
+        try:
+            self._ensure_bucket_exists()
+            extra_args = {'Metadata': metadata} if metadata else None
+            self.s3.upload_fileobj(fileobj, self.bucket_name, object_name, ExtraArgs=extra_args)
+            logger.info("🔷🔷🔷 Uploaded stream to S3 as %s", object_name)
+            return True
+        except Exception as e:
+            logger.error("❌❌❌ Failed to upload stream to S3: %s", str(e))
+            return False
+    
+    def upload_backup(self, fileobj, object_name):
+        """Upload a database file object compressed with self.compression and its SHA-256 in metadata.
+        
+        Returns the final object name (with the compression suffix) or None on failure.
+        """
+        # Checksum the uncompressed content first (a cheap local pass), then stream it through the compressor
+        checksum = hashlib.sha256()
+        original_size = 0
+        for data in iter(lambda: fileobj.read(COMPRESSION_READ_SIZE), b''):
+            checksum.update(data)
+            original_size += len(data)
+        fileobj.seek(0)
+        
+        object_name += BACKUP_COMPRESSION_SUFFIXES[self.compression]
+        metadata = {
+            'sha256': checksum.hexdigest(),
+            'compression': self.compression,
+            'original-size': str(original_size),
+        }
+        reader = CompressingReader(fileobj, self.compression)
+        if not self.upload_fileobj(reader, object_name, metadata):
+            return None
+        self._record_backup(object_name, reader.size, metadata['sha256'], original_size)
+        
+        logger.info("🔷🔷🔷 Backup %s: %d bytes before %s compression", object_name, original_size, self.compression)
+        return object_name
+    
+    def _fetch_in_order(self, fetches, part_size):
+        """Run fetch callables on a thread pool and yield their results in order, a bounded window at a time.
+        
+        The window (parts fetching or waiting to be consumed) is capped by restore_buffer_bytes.
+        """
+        window = max(1, min(self.restore_concurrency * 2, self.restore_buffer_bytes // part_size))
+        with ThreadPoolExecutor(max_workers=min(self.restore_concurrency, window)) as executor:
+            pending = deque()
+            for fetch in fetches:
+                pending.append(executor.submit(fetch))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
+    def _get_range(self, object_name, start, end):
+        """Fetch bytes start..end (inclusive) of an object"""
+        response = self.s3.get_object(Bucket=self.bucket_name, Key=object_name, Range=f"bytes={start}-{end}")
+        return response['Body'].read()
+    
+    def download_backup(self, object_name, file_path=None):
+        """Download a backup object with parallel ranged GETs, decompressing and verifying its SHA-256 in order"""
+        if file_path is None:
+            fd, file_path = tempfile.mkstemp()
+            os.close(fd)
+        
+        try:
+            started = monotonic()
+            head = self.s3.head_object(Bucket=self.bucket_name, Key=object_name)
+            size = head['ContentLength']
+            expected = head.get('Metadata', {}).get('sha256')
+            decompressor = _new_decompressor(object_name)
+            checksum = hashlib.sha256()
+            
+            part_size = self.restore_part_size
+            fetches = [
+                (lambda start=start: self._get_range(object_name, start, min(start + part_size, size) - 1))
+                for start in range(0, size, part_size)
+            ]
+            with open(file_path, 'wb') as f:
+                for data in self._fetch_in_order(fetches, part_size):
+                    if decompressor:
+                        data = decompressor.decompress(data)
+                    checksum.update(data)
+                    f.write(data)
+                if decompressor and hasattr(decompressor, 'flush'):
+                    data = decompressor.flush()
+                    checksum.update(data)
+                    f.write(data)
+            
+            if expected and checksum.hexdigest() != expected:
+                raise ValueError(f"checksum mismatch for {object_name}")
+            if not expected:
+                logger.info("🔷🔷🔷 Backup %s has no checksum (legacy upload), skipping verification", object_name)
+            
+            logger.info("🔷🔷🔷 Downloaded and verified %s (%d bytes in %d parts) to %s in %.2fs", 
+                       object_name, size, len(fetches), file_path, monotonic() - started)
+            return file_path
+        except Exception as e:
+            logger.error("❌❌❌ Failed to download backup from S3: %s", str(e))
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            return None
+    
+    def _install_restored_file(self, temp_path, target_path):
+        """Run PRAGMA quick_check on a restored file, then atomically rename it over target_path"""
+        started = monotonic()
+        check = sqlite3.connect(temp_path)
+        try:
+            result = check.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            check.close()
+        if result != 'ok':
+            raise sqlite3.DatabaseError(f"Restored database failed quick_check: {result}")
+        checked = monotonic()
+        
+        # Drop WAL/shared-memory files left by a previous database at the target path
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(target_path + suffix):
+                os.remove(target_path + suffix)
+        os.replace(temp_path, target_path)
+        logger.info("🔷🔷🔷 Installed restored database at %s (quick_check %.2fs, swap %.3fs)", 
+                   target_path, checked - started, monotonic() - checked)
+    
     def download_file(self, object_name, file_path=None):
         """Download a file from S3 bucket"""
         if not self.bucket_name:
@@ -118,17 +398,224 @@ class S3Storage:
             raise ValueError("S3 bucket name not specified")
         
         try:
-            response = self.s3.list_objects_v2(Bucket=self.bucket_name, Prefix=prefix)
-            if 'Contents' in response:
-                return [obj['Key'] for obj in response['Contents']]
-            return []
+            return [obj['Key'] for obj in self._list_objects(prefix=prefix)]
         except Exception as e:
             logger.error("❌❌❌ Failed to list files in S3: %s", str(e))
             return []
     
+    def _list_objects(self, prefix=''):
+        """List all objects (with metadata) under a prefix, following pagination"""
+        paginator = self.s3.get_paginator('list_objects_v2')
+        objects = []
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            objects.extend(page.get('Contents', []))
+        return objects
+    
+    # Backup leader lease
+    def _read_lease(self):
+        """Return (lease, etag, expired) for the lease object without comparing wall clocks across instances"""
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=LEASE_KEY)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'NoSuchKey':
+                return None, None, True
+            raise
+        
+        lease = json.loads(response['Body'].read())
+        etag = response['ETag']
+        lease_seconds = lease.get('lease_seconds', self.lease_seconds)
+        
+        # Age on S3's own clock (LastModified vs the response Date header) when the store sends one
+        server_date = response['ResponseMetadata'].get('HTTPHeaders', {}).get('date')
+        server_age = (parsedate_to_datetime(server_date) - response['LastModified']).total_seconds() if server_date else 0
+        
+        # Otherwise (and as a backstop) how long we have watched this exact version sit unrenewed
+        if self._observed_lease is None or self._observed_lease[0] != etag:
+            self._observed_lease = (etag, monotonic())
+        observed_age = monotonic() - self._observed_lease[1]
+        
+        expired = bool(lease.get('released')) or max(server_age, observed_age) > lease_seconds
+        return lease, etag, expired
+    
+    def acquire_backup_lease(self) -> bool:
+        """Acquire or renew the backup leader lease; returns True if this instance may back up"""
+        if not self.lease_enabled:
+            return True
+        with self._lease_lock:
+            return self._acquire_backup_lease()
+    
+    def _acquire_backup_lease(self) -> bool:
+        try:
+            self._ensure_bucket_exists()
+            requested = monotonic()
+            lease, etag, expired = self._read_lease()
+            if lease and lease['holder'] != self.instance_id and not expired:
+                logger.info("🔷🔷🔷 Backup lease held by %s (token %d)", lease['holder'], lease['token'])
+                return False
+            
+            # Renewing keeps our token; taking over a missing or expired lease bumps it for fencing
+            ours = lease is not None and lease['holder'] == self.instance_id and not lease.get('released')
+            token = lease['token'] if ours else (lease['token'] + 1 if lease else 1)
+            # renewed_at is informational, but it also gives every renewal a new ETag that watchers can see
+            body = {'holder': self.instance_id, 'token': token, 'lease_seconds': self.lease_seconds,
+                    'renewed_at': datetime.now(timezone.utc).isoformat()}
+            condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+            response = self.s3.put_object(
+                Bucket=self.bucket_name, Key=LEASE_KEY,
+                Body=json.dumps(body).encode('utf-8'), ContentType='application/json', **condition
+            )
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if code in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                logger.info("🔷🔷🔷 Lost backup lease race to another instance")
+                return False
+            if code == 'NotImplemented':
+                # S3-compatible store without conditional writes: behave as a single instance
+                logger.warning("⚠️⚠️⚠️ Conditional writes unsupported, disabling backup lease")
+                self.lease_enabled = False
+                return True
+            logger.error("❌❌❌ Failed to acquire backup lease: %s", str(e))
+            return False
+        except Exception as e:
+            logger.error("❌❌❌ Failed to acquire backup lease: %s", str(e))
+            return False
+        
+        if not ours:
+            logger.info("🔷🔷🔷 Acquired backup lease as %s (token %d)", self.instance_id, token)
+        self.lease_token = token
+        self._lease_etag = response['ETag']
+        # Another leader may have swept chunks while we did not hold the lease; re-list before trusting the cache
+        self._known_chunks = None
+        # Measured from before the request, so our view expires no later than S3's
+        self._lease_deadline = requested + self.lease_seconds - LEASE_SAFETY_SECONDS
+        return True
+    
+    def holds_backup_lease(self) -> bool:
+        """Check whether this instance still holds an unexpired backup lease"""
+        return not self.lease_enabled or (self.lease_token is not None and monotonic() < self._lease_deadline)
+    
+    def _check_lease(self):
+        """Raise LeaseLostError if this instance took a lease and it has since run out"""
+        if self.lease_enabled and self.lease_token is not None and not self.holds_backup_lease():
+            raise LeaseLostError(f"Backup lease (token {self.lease_token}) expired")
+    
+    def release_backup_lease(self):
+        """Give up the backup lease so another instance can take over without waiting for expiry"""
+        if not self.lease_enabled or not self.holds_backup_lease():
+            return
+        try:
+            body = {'holder': self.instance_id, 'token': self.lease_token, 
+                    'lease_seconds': self.lease_seconds, 'released': True}
+            self.s3.put_object(
+                Bucket=self.bucket_name, Key=LEASE_KEY, Body=json.dumps(body).encode('utf-8'),
+                ContentType='application/json', IfMatch=self._lease_etag
+            )
+            logger.info("🔷🔷🔷 Released backup lease (token %d)", self.lease_token)
+        except Exception as e:
+            logger.warning("⚠️⚠️⚠️ Could not release backup lease: %s", str(e))
+        self._lease_deadline = 0.0
+    
+    # Backup index
+    def _save_backup_index(self, entries):
+        """Write the backup index object (fenced by the lease token when this instance holds a lease)"""
+        entries = sorted(entries, key=lambda entry: entry['name'])
+        put_args = {}
+        if self.lease_token is not None:
+            self._check_lease()
+            # Fencing: never overwrite an index written under a newer lease, and only replace what we read
+            try:
+                current = self.s3.get_object(Bucket=self.bucket_name, Key=BACKUP_INDEX_KEY)
+                stored_token = json.loads(current['Body'].read()).get('lease_token') or 0
+                if stored_token > self.lease_token:
+                    raise LeaseLostError(f"Backup index was written under newer lease token {stored_token}")
+                put_args['IfMatch'] = current['ETag']
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'NoSuchKey':
+                    raise
+                put_args['IfNoneMatch'] = '*'
+        
+        body = {'version': 1, 'lease_token': self.lease_token, 'backups': entries}
+        self.s3.put_object(
+            Bucket=self.bucket_name, Key=BACKUP_INDEX_KEY,
+            Body=json.dumps(body).encode('utf-8'), ContentType='application/json', **put_args
+        )
+    
+    def reconcile_backup_index(self):
+        """Rebuild the backup index from a paginated listing of every backup object"""
+        entries = []
+        for prefix in (BACKUP_PREFIX, MANIFEST_PREFIX):
+            for obj in self._list_objects(prefix=prefix):
+                entries.append({
+                    'name': obj['Key'],
+                    'timestamp': _backup_timestamp(obj['Key']),
+                    'size': obj['Size'],
+                    'sha256': None,
+                })
+        logger.info("🔷🔷🔷 Reconciled backup index from bucket listing: %d backups", len(entries))
+        
+        # Only the lease holder writes the index; everyone else just uses the listing
+        if not self.holds_backup_lease():
+            return entries
+        try:
+            self._save_backup_index(entries)
+        except LeaseLostError as e:
+            logger.warning("⚠️⚠️⚠️ Not saving reconciled backup index: %s", str(e))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                raise
+            logger.warning("⚠️⚠️⚠️ Backup index changed while reconciling, not overwriting it")
+        return entries
+    
+    def load_backup_index(self):
+        """Load the backup index entries, reconciling from a bucket listing only if it is missing or corrupt.
+        
+        Any other error (throttling, network, permissions) is raised rather than taken as a missing index.
+        """
+        try:
+            body = self.s3.get_object(Bucket=self.bucket_name, Key=BACKUP_INDEX_KEY)['Body'].read()
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'NoSuchKey':
+                raise
+            logger.warning("⚠️⚠️⚠️ Backup index missing, reconciling")
+            return self.reconcile_backup_index()
+        try:
+            return json.loads(body)['backups']
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("⚠️⚠️⚠️ Backup index corrupt (%s), reconciling", str(e))
+            return self.reconcile_backup_index()
+    
+    def _record_backup(self, name, size, sha256, original_size=None):
+        """Add a newly uploaded backup to the index"""
+        try:
+            entries = [entry for entry in self.load_backup_index() if entry['name'] != name]
+            entries.append({
+                'name': name,
+                'timestamp': _backup_timestamp(name),
+                'size': size,
+                'original_size': original_size,
+                'sha256': sha256,
+            })
+            self._save_backup_index(entries)
+        except LeaseLostError as e:
+            # Another instance leads now; its index is authoritative, leave it alone
+            logger.error("❌❌❌ Not updating backup index: %s", str(e))
+        except Exception as e:
+            # The next lookup cannot trust the index, so drop it and let it be reconciled
+            logger.error("❌❌❌ Failed to update backup index: %s", str(e))
+            try:
+                self.s3.delete_object(Bucket=self.bucket_name, Key=BACKUP_INDEX_KEY)
+            except Exception:
+                pass
+    
+    def _list_backups(self, prefix):
+        """List backup names under prefix from the index (other prefixes fall back to a listing)"""
+        if prefix not in (BACKUP_PREFIX, MANIFEST_PREFIX):
+            return self.list_files(prefix=prefix)
+        return [entry['name'] for entry in self.load_backup_index() if entry['name'].startswith(prefix)]
+    
     def get_latest_backup(self, prefix='expenses_backup_'):
         """Get the most recent database backup from S3"""
-        backups = self.list_files(prefix=prefix)
+        backups = self._list_backups(prefix)
         if not backups:
             logger.warning("⚠️⚠️⚠️ No backups found in S3 with prefix: %s", prefix)
             return None
@@ -153,14 +640,60 @@ class S3Storage:
         except ValueError:
             raise ValueError(f"Could not parse timestamp: {timestamp_str}")
     
-    def cleanup_old_backups(self, prefix='expenses_backup_'):
-        """Clean up old backup files based on retention policy using IST"""
+    def delete_keys(self, keys, dry_run=False):
+        """Delete keys with batched delete_objects calls (in parallel); returns the keys actually deleted"""
+        keys = list(keys)
+        if dry_run or not keys:
+            return set(keys) if dry_run else set()
+        
+        def delete_batch(batch):
+            response = self.s3.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+            failed = {error['Key'] for error in response.get('Errors', [])}
+            for error in response.get('Errors', []):
+                logger.error("❌❌❌ Failed to delete %s: %s", error['Key'], error.get('Message'))
+            return set(batch) - failed
+        
+        batches = [keys[i:i + DELETE_BATCH_SIZE] for i in range(0, len(keys), DELETE_BATCH_SIZE)]
+        deleted = set()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.delete_concurrency, len(batches)))) as executor:
+            for batch_deleted in executor.map(delete_batch, batches):
+                deleted |= batch_deleted
+        return deleted
+    
+    def _retained_backups(self, backup_info, current_time_ist):
+        """Pick the backups to keep from backup_info (sorted newest first) in one pass"""
+        keep = set()
+        seen_slots = set()
+        for backup in backup_info:
+            age = current_time_ist - backup['timestamp']
+            if self.retention_tiers:
+                # First tier whose horizon covers this age; one backup (the newest) per interval slot
+                tier = next((tier for tier in self.retention_tiers if age <= tier[1]), None)
+                if tier is None:
+                    continue
+                slot = (tier, int(backup['timestamp'].timestamp() // tier[0].total_seconds()))
+                if slot in seen_slots:
+                    continue
+                seen_slots.add(slot)
+            elif len(keep) >= self.max_backups or age.days > self.max_age_days:
+                continue
+            keep.add(backup['name'])
+        
+        # Never delete the newest backup, however old it is
+        keep.add(backup_info[0]['name'])
+        return keep
+    
+    def cleanup_old_backups(self, prefix='expenses_backup_', dry_run=False):
+        """Clean up old backup files based on retention policy using IST; returns the names (to be) deleted"""
         try:
             # Get all backup files
-            backups = self.list_files(prefix=prefix)
+            backups = self._list_backups(prefix)
             if not backups:
                 logger.info("🔷🔷🔷 No backups found for cleanup")
-                return
+                return []
             
             # Parse backup files with timestamps
             backup_info = []
@@ -168,15 +701,11 @@ class S3Storage:
             
             for backup in backups:
                 try:
-                    # Extract timestamp from filename: expenses_backup_YYYYMMDD_HHMMSS.db
-                    timestamp_str = backup.replace(prefix, '').replace('.db', '')
-                    backup_time = self._parse_backup_timestamp(timestamp_str)
-                    age_timedelta = current_time_ist - backup_time
-                    
+                    # Extract timestamp from filename: expenses_backup_YYYYMMDD_HHMMSS.db[.gz|.xz] (or .json manifest)
+                    timestamp_str = backup[len(prefix):].split('.', 1)[0]
                     backup_info.append({
                         'name': backup,
-                        'timestamp': backup_time,
-                        'age_days': age_timedelta.days
+                        'timestamp': self._parse_backup_timestamp(timestamp_str)
                     })
                 except ValueError:
                     logger.warning("⚠️⚠️⚠️ Could not parse timestamp from backup: %s", backup)
@@ -184,42 +713,34 @@ class S3Storage:
             
             if not backup_info:
                 logger.info("🔷🔷🔷 No valid backup files found for cleanup")
-                return
+                return []
             
-            # Sort by timestamp (newest first)
+            # Sort by timestamp (newest first) and split into keep/delete sets in one pass
             backup_info.sort(key=lambda x: x['timestamp'], reverse=True)
+            keep = self._retained_backups(backup_info, current_time_ist)
+            backups_to_delete = [backup['name'] for backup in backup_info if backup['name'] not in keep]
+            if not dry_run:
+                self._check_lease()
             
-            # Determine which backups to delete
-            backups_to_delete = []
-            
-            # Keep only max_backups most recent
-            if len(backup_info) > self.max_backups:
-                backups_to_delete.extend(backup_info[self.max_backups:])
+            deleted = self.delete_keys(backups_to_delete, dry_run=dry_run)
+            if deleted and not dry_run and prefix in (BACKUP_PREFIX, MANIFEST_PREFIX):
+                self._save_backup_index(
+                    [entry for entry in self.load_backup_index() if entry['name'] not in deleted]
+                )
             
-            # Delete backups older than max_age_days
-            for backup in backup_info:
-                if backup['age_days'] > self.max_age_days and backup not in backups_to_delete:
-                    backups_to_delete.append(backup)
-            
-            # Delete the identified backups
-            deleted_count = 0
-            for backup in backups_to_delete:
-                try:
-                    self.s3.delete_object(Bucket=self.bucket_name, Key=backup['name'])
-                    logger.info("🗑️🗑️🗑️ Deleted old backup: %s (age: %d days)", 
-                              backup['name'], backup['age_days'])
-                    deleted_count += 1
-                except Exception as e:
-                    logger.error("❌❌❌ Failed to delete backup %s: %s", backup['name'], str(e))
-            
-            if deleted_count > 0:
+            if dry_run:
+                logger.info("🔷🔷🔷 Cleanup dry run: would delete %d old backups, keeping %d", 
+                          len(deleted), len(keep))
+            elif deleted:
                 logger.info("✅✅✅ Cleanup completed: deleted %d old backups, keeping %d", 
-                          deleted_count, len(backup_info) - deleted_count)
+                          len(deleted), len(backup_info) - len(deleted))
             else:
                 logger.info("🔷🔷🔷 No backups needed cleanup")
+            return sorted(deleted)
                 
         except Exception as e:
             logger.error("❌❌❌ Error during backup cleanup: %s", str(e))
+            return []
     
     def should_run_cleanup(self, db) -> bool:
         """Check if it's time to run cleanup based on time interval using IST"""
@@ -240,67 +761,579 @@ class S3Storage:
         except:
             return True
     
-    def backup_database(self, db_path, db_instance=None):
-        """Backup the database file to S3 with automatic cleanup using IST"""
+    # Incremental (content-addressed) backups
+    def _chunk_key(self, digest):
+        """Object key of a content-addressed chunk"""
+        return f"{CHUNK_PREFIX}{digest}"
+    
+    def _load_known_chunks(self):
+        """Get the set of chunk hashes already stored in the bucket"""
+        if self._known_chunks is None:
+            self._known_chunks = {
+                obj['Key'][len(CHUNK_PREFIX):] for obj in self._list_objects(prefix=CHUNK_PREFIX)
+            }
+        return self._known_chunks
+    
+    def backup_database_incremental(self, snapshot, timestamp):
+        """Upload only new chunks of a database snapshot and write its manifest; returns the manifest"""
+        self._ensure_bucket_exists()
+        known_chunks = self._load_known_chunks()
+        
+        chunks = []
+        file_hash = hashlib.sha256()
+        total_bytes = uploaded_bytes = new_chunks = 0
+        while True:
+            data = snapshot.read(self.chunk_size)
+            if not data:
+                break
+            digest = hashlib.sha256(data).hexdigest()
+            file_hash.update(data)
+            total_bytes += len(data)
+            chunks.append(digest)
+            
+            if digest not in known_chunks:
+                self.s3.put_object(Bucket=self.bucket_name, Key=self._chunk_key(digest), Body=data)
+                known_chunks.add(digest)
+                uploaded_bytes += len(data)
+                new_chunks += 1
+        
+        manifest = {
+            'version': 1,
+            'timestamp': timestamp,
+            'size': total_bytes,
+            'chunk_size': self.chunk_size,
+            'sha256': file_hash.hexdigest(),
+            'chunks': chunks
+        }
+        manifest_name = f"{MANIFEST_PREFIX}{timestamp}.json"
+        # Manifest goes last so it never references a chunk that is not uploaded yet
+        self.s3.put_object(
+            Bucket=self.bucket_name, Key=manifest_name,
+            Body=json.dumps(manifest).encode('utf-8'), ContentType='application/json'
+        )
+        self._record_backup(manifest_name, total_bytes, manifest['sha256'])
+        logger.info("🔷🔷🔷 Incremental backup %s: uploaded %d of %d bytes (%d chunks, %d new)", 
+                   manifest_name, uploaded_bytes, total_bytes, len(chunks), new_chunks)
+        return manifest
+    
+    def restore_from_manifest(self, manifest_name, target_path):
+        """Rebuild a database file from a backup manifest and its chunks"""
+        try:
+            body = self.s3.get_object(Bucket=self.bucket_name, Key=manifest_name)['Body'].read()
+            manifest = json.loads(body)
+            
+            # Assemble next to the target and swap in atomically once everything verified
+            temp_path = f"{target_path}.restore"
+            file_hash = hashlib.sha256()
+            fetches = [
+                (lambda key=self._chunk_key(digest): self.s3.get_object(Bucket=self.bucket_name, Key=key)['Body'].read())
+                for digest in manifest['chunks']
+            ]
+            with open(temp_path, 'wb') as f:
+                for digest, data in zip(manifest['chunks'], self._fetch_in_order(fetches, manifest['chunk_size'])):
+                    if hashlib.sha256(data).hexdigest() != digest:
+                        raise ValueError(f"Chunk {digest} failed checksum verification")
+                    file_hash.update(data)
+                    f.write(data)
+            
+            if file_hash.hexdigest() != manifest['sha256']:
+                os.remove(temp_path)
+                raise ValueError(f"Restored database from {manifest_name} failed checksum verification")
+            
+            self._install_restored_file(temp_path, target_path)
+            logger.info("🔷🔷🔷 Restored %s (%d bytes, %d chunks) to %s", 
+                       manifest_name, manifest['size'], len(manifest['chunks']), target_path)
+            return True
+        except Exception as e:
+            logger.error("❌❌❌ Failed to restore from manifest %s: %s", manifest_name, str(e))
+            if os.path.exists(f"{target_path}.restore"):
+                os.remove(f"{target_path}.restore")
+            return False
+    
+    def cleanup_unreferenced_chunks(self):
+        """Delete chunks that no remaining manifest references"""
+        try:
+            referenced = set()
+            for manifest_name in self.list_files(prefix=MANIFEST_PREFIX):
+                body = self.s3.get_object(Bucket=self.bucket_name, Key=manifest_name)['Body'].read()
+                referenced.update(json.loads(body)['chunks'])
+            
+            # Chunks uploaded by an in-progress backup have no manifest yet; leave recent ones alone
+            cutoff = datetime.now(timezone.utc) - timedelta(minutes=self.chunk_grace_minutes)
+            unreferenced = [
+                obj['Key'] for obj in self._list_objects(prefix=CHUNK_PREFIX)
+                if obj['Key'][len(CHUNK_PREFIX):] not in referenced and obj['LastModified'] <= cutoff
+            ]
+            self._check_lease()
+            deleted = self.delete_keys(unreferenced)
+            if self._known_chunks is not None:
+                self._known_chunks.difference_update(key[len(CHUNK_PREFIX):] for key in deleted)
+            
+            logger.info("🔷🔷🔷 Chunk cleanup: deleted %d unreferenced chunks, %d referenced", 
+                       len(deleted), len(referenced))
+        except Exception as e:
+            logger.error("❌❌❌ Error during chunk cleanup: %s", str(e))
+    
+    # WAL shipping (point-in-time restore)
+    def list_wal_generations(self):
+        """List WAL shipping generations (base snapshot timestamps), oldest first"""
+        generations = set()
+        for obj in self._list_objects(prefix=WAL_PREFIX):
+            generations.add(obj['Key'][len(WAL_PREFIX):].split('/', 1)[0])
+        return sorted(generations)
+    
+    def restore_point_in_time(self, target_path, point_in_time=None):
+        """Restore a WAL generation's base snapshot and replay its segments up to point_in_time (IST)"""
+        if isinstance(point_in_time, str):
+            point_in_time = datetime.fromisoformat(point_in_time)
+        if point_in_time is not None and point_in_time.tzinfo is None:
+            point_in_time = point_in_time.replace(tzinfo=IST)
+        
+        # Latest generation whose base was taken at or before the requested time
+        generation = None
+        for candidate in self.list_wal_generations():
+            try:
+                base_time = self._parse_backup_timestamp(candidate)
+            except ValueError:
+                continue
+            if point_in_time is None or base_time <= point_in_time:
+                generation = candidate
+        if not generation:
+            logger.warning("⚠️⚠️⚠️ No WAL generation found for point in time: %s", point_in_time)
+            return False
+        
+        temp_path = f"{target_path}.restore"
+        try:
+            self.s3.download_file(self.bucket_name, f"{WAL_PREFIX}{generation}/base.db", temp_path)
+            
+            segments = sorted(
+                obj['Key'] for obj in self._list_objects(prefix=f"{WAL_PREFIX}{generation}/")
+                if obj['Key'].endswith('.seg')
+            )
+            applied = 0
+            with open(temp_path, 'r+b') as f:
+                db_pages = None
+                page_size = None
+                for key in segments:
+                    # Segment name: <seq>_<YYYYMMDD_HHMMSS>.seg, stamped with the time it was shipped
+                    segment_name = os.path.splitext(key.rsplit('/', 1)[-1])[0]
+                    segment_time = self._parse_backup_timestamp(segment_name.split('_', 1)[1])
+                    if point_in_time is not None and segment_time > point_in_time:
+                        break
+                    
+                    response = self.s3.get_object(Bucket=self.bucket_name, Key=key)
+                    page_size = int(response['Metadata']['page-size'])
+                    data = response['Body'].read()
+                    frame_size = WAL_FRAME_HEADER_SIZE + page_size
+                    # Replay page images in commit order; the last commit frame carries the database size
+                    for offset in range(0, len(data) - frame_size + 1, frame_size):
+                        page_number, commit_pages = struct.unpack('>II', data[offset:offset + 8])
+                        f.seek((page_number - 1) * page_size)
+                        f.write(data[offset + WAL_FRAME_HEADER_SIZE:offset + frame_size])
+                        if commit_pages:
+                            db_pages = commit_pages
+                    applied += 1
+                
+                if db_pages:
+                    f.truncate(db_pages * page_size)
+            
+            self._install_restored_file(temp_path, target_path)
+            logger.info("🔷🔷🔷 Restored WAL generation %s with %d of %d segments (point in time: %s)", 
+                       generation, applied, len(segments), point_in_time or 'latest')
+            return True
+        except Exception as e:
+            logger.error("❌❌❌ Point-in-time restore failed: %s", str(e))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+    
+    def cleanup_old_wal_generations(self):
+        """Delete WAL generations older than max_age_days, always keeping the newest one"""
+        try:
+            generations = self.list_wal_generations()
+            current_time_ist = self._get_current_time_ist()
+            expired_keys = []
+            deleted_count = 0
+            for generation in generations[:-1]:
+                try:
+                    age = current_time_ist - self._parse_backup_timestamp(generation)
+                except ValueError:
+                    continue
+                if age.days <= self.max_age_days:
+                    continue
+                expired_keys.extend(obj['Key'] for obj in self._list_objects(prefix=f"{WAL_PREFIX}{generation}/"))
+                deleted_count += 1
+            self.delete_keys(expired_keys)
+            logger.info("🔷🔷🔷 WAL cleanup: deleted %d old generations", deleted_count)
+        except Exception as e:
+            logger.error("❌❌❌ Error during WAL generation cleanup: %s", str(e))
+    
+    def backup_database(self, db_path=None, db_instance=None):
+        """Backup the database to S3 with automatic cleanup using IST.
+        
+        With db_path the file is read as-is; otherwise a consistent snapshot of
+        db_instance is taken through the SQLite backup API. Either is streamed to S3
+        through the S3_BACKUP_COMPRESSION codec with a SHA-256 checksum in metadata.
+        """
         ist_time = self._get_current_time_ist()
         timestamp = ist_time.strftime('%Y%m%d_%H%M%S')
         object_name = f"expenses_backup_{timestamp}.db"
         
-        success = self.upload_file(db_path, object_name)
+        previous_fingerprint = None
+        if db_instance:
+            # Record the fingerprint before the snapshot so a restored copy knows it matches this backup
+            previous_fingerprint = db_instance.get_last_backup_fingerprint()
+            db_instance.set_last_backup_fingerprint(db_instance.get_data_fingerprint())
+        
+        if db_instance and self.backup_mode == 'incremental':
+            try:
+                with db_instance.open_snapshot() as snapshot:
+                    self.backup_database_incremental(snapshot, timestamp)
+                success = True
+            except Exception as e:
+                logger.error("❌❌❌ Incremental backup failed: %s", str(e))
+                success = False
+        elif db_path:
+            with open(db_path, 'rb') as f:
+                success = self.upload_backup(f, object_name) is not None
+        elif db_instance:
+            try:
+                with db_instance.open_snapshot() as snapshot:
+                    success = self.upload_backup(snapshot, object_name) is not None
+            except Exception as e:
+                logger.error("❌❌❌ Failed to snapshot database for backup: %s", str(e))
+                success = False
+        else:
+            raise ValueError("Either db_path or db_instance is required")
         
         if success and db_instance:
             # Update last backup time in database with IST
             db_instance.set_last_backup_time(ist_time)
             
-            # Check if cleanup should run based on time interval
-            if self.should_run_cleanup(db_instance):
+            # Check if cleanup should run based on time interval (and we still lead)
+            if self.should_run_cleanup(db_instance) and (self.lease_token is None or self.holds_backup_lease()):
                 logger.info("🔷🔷🔷 Running backup cleanup (time-based trigger)")
                 self.cleanup_old_backups()
+                if self.backup_mode == 'incremental':
+                    self.cleanup_old_backups(prefix=MANIFEST_PREFIX)
+                    self.cleanup_unreferenced_chunks()
                 db_instance.set_setting('last_cleanup_time', ist_time.isoformat())
+        elif db_instance:
+            db_instance.set_last_backup_fingerprint(previous_fingerprint)
         
         return success
     
-    def restore_latest_database(self, target_path):
-        """Restore the latest database backup from S3"""
-        latest_backup = self.get_latest_backup()
-        if not latest_backup:
-            return False
-        
-        download_path = self.download_file(latest_backup)
+    def _restore_full_backup(self, object_name, target_path):
+        """Download, verify and install one full backup; returns True on success"""
+        # Download next to the target so the final swap is an atomic rename on the same filesystem
+        download_path = self.download_backup(object_name, f"{target_path}.restore")
         if not download_path:
             return False
-        
         try:
-            # Copy the downloaded file to the target path
-            import shutil
-            shutil.copy2(download_path, target_path)
-            os.remove(download_path)  # Clean up temp file
+            self._install_restored_file(download_path, target_path)
             return True
         except Exception as e:
-            logger.error("❌❌❌ Failed to copy database to target path: %s", str(e))
+            logger.error("❌❌❌ Failed to install restored database: %s", str(e))
+            if os.path.exists(download_path):
+                os.remove(download_path)
             return False
+    
+    def restore_latest_database(self, target_path):
+        """Restore the newest usable backup from S3, falling back to older manifests and then full backups"""
+        started = monotonic()
+        if self.backup_mode == 'incremental':
+            manifests = sorted(self._list_backups(MANIFEST_PREFIX), reverse=True)
+            for manifest_name in manifests:
+                if self.restore_from_manifest(manifest_name, target_path):
+                    return True
+                logger.warning("⚠️⚠️⚠️ Could not restore %s, trying an older backup", manifest_name)
+            if manifests:
+                logger.warning("⚠️⚠️⚠️ No incremental manifest could be restored, falling back to full backups")
+            else:
+                logger.info("🔷🔷🔷 No incremental manifest found, falling back to full backups")
+        
+        tried = set()
+        backups = self._list_backups(BACKUP_PREFIX)
+        while True:
+            candidates = sorted((name for name in backups if name not in tried), reverse=True)
+            if not candidates:
+                logger.warning("⚠️⚠️⚠️ No restorable full backup found in S3")
+                return False
+            backup = candidates[0]
+            tried.add(backup)
+            if self._restore_full_backup(backup, target_path):
+                logger.info("✅✅✅ Restored %s to %s in %.2fs", backup, target_path, monotonic() - started)
+                return True
+            logger.warning("⚠️⚠️⚠️ Could not restore %s, trying an older backup", backup)
+            if len(tried) == 1:
+                # The index may be stale (backup removed elsewhere): reconcile, which may also surface newer ones
+                backups = [entry['name'] for entry in self.reconcile_backup_index()
+                           if entry['name'].startswith(BACKUP_PREFIX)]
 
-def backup_db_to_s3(db_path=None):
-    """Utility function to backup the database to S3 with cleanup"""
-    from expenses_sqlite import ExpensesSQLite
+class WalShipper:
+    """Continuously ship committed WAL frames of an ExpensesSQLite database to S3 for point-in-time restore.
     
-    # Create a temporary backup file
-    db = ExpensesSQLite(db_path)
-    backup_path = db.backup_to_file()
+    Each generation starts with a base snapshot under wal/<generation>/base.db; every ship interval the
+    frames committed since the last shipment are uploaded as one segment. The shipper owns checkpointing
+    (automatic checkpoints are disabled) so no frame is checkpointed away before it has been read.
+    """
     
-    # Upload to S3 with cleanup (pass db instance for persistent tracking)
-    s3 = S3Storage()
-    success = s3.backup_database(backup_path, db)
+    def __init__(self, db, s3=None, interval_seconds=None, generation_minutes=None, checkpoint_kb=None):
+        self.db = db
+        self.s3 = s3 or get_s3_storage()
+        self.interval_seconds = float(interval_seconds or os.environ.get('S3_WAL_SHIP_INTERVAL_SECONDS', '2'))
+        self.generation_minutes = int(generation_minutes or os.environ.get('S3_WAL_GENERATION_MINUTES', '360'))
+        self.checkpoint_bytes = int(checkpoint_kb or os.environ.get('S3_WAL_CHECKPOINT_KB', '4096')) * 1024
+        self.wal_path = db.db_path + '-wal'
+        # Only the backup lease holder ships; renew well before the lease can run out
+        self.lease_renew_seconds = self.s3.lease_seconds / 3
+        self._lease_renew_at = 0.0
+        
+        self.generation = None
+        self.generation_started = None
+        self.sequence = 0
+        self.salts = None
+        self.offset = WAL_HEADER_SIZE
+        self._reset_expected = False
+        self._generation_failures = 0
+        self._generation_retry_at = 0.0
+        self._previous_autocheckpoint = None
+        self._lock_conn = None
+        self._checkpoint_conn = None
+        self._ship_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
     
-    # Clean up temp file
-    os.remove(backup_path)
+    def start(self):
+        """Take over checkpointing, start a generation and ship in a background thread"""
+        self._previous_autocheckpoint = self.db.wal_autocheckpoint
+        self.db.set_wal_autocheckpoint(0)
+        self._lock_conn = self.db._open_connection()
+        self._lock_conn.isolation_level = None
+        self._checkpoint_conn = self.db._open_connection()
+        
+        self.ship()
+        self._thread = threading.Thread(target=self._run, name='wal-shipper', daemon=True)
+        self._thread.start()
+        logger.info("🔷🔷🔷 WAL shipping started (interval: %ss, generation: %d min, checkpoint at %d KB)", 
+                   self.interval_seconds, self.generation_minutes, self.checkpoint_bytes // 1024)
+    
+    def stop(self):
+        """Ship the remaining frames and hand checkpointing back to SQLite"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.ship()
+        
+        for conn in (self._lock_conn, self._checkpoint_conn):
+            if conn:
+                conn.close()
+        self._lock_conn = self._checkpoint_conn = None
+        if self._previous_autocheckpoint is not None:
+            self.db.set_wal_autocheckpoint(self._previous_autocheckpoint)
+        logger.info("🔷🔷🔷 WAL shipping stopped (generation %s, %d segments)", self.generation, self.sequence)
+    
+    def _run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            self.ship()
+    
+    @contextmanager
+    def _write_locked(self):
+        """Hold the database write lock so no frame is appended or checkpointed while reading the WAL"""
+        self._lock_conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        finally:
+            self._lock_conn.execute("ROLLBACK")
+    
+    def _read_wal(self, offset):
+        """Return (salts, page_size, frames, end_offset) for the frames committed after offset"""
+        try:
+            with open(self.wal_path, 'rb') as wal:
+                header = wal.read(WAL_HEADER_SIZE)
+                if len(header) < WAL_HEADER_SIZE:
+                    return None, None, b'', WAL_HEADER_SIZE
+                _, _, page_size, _, salt1, salt2, _, _ = struct.unpack('>8I', header)
+                wal.seek(offset)
+                data = wal.read()
+        except FileNotFoundError:
+            return None, None, b'', WAL_HEADER_SIZE
+        
+        # Keep whole frames of this WAL incarnation (matching salts) up to the last commit frame
+        frame_size = WAL_FRAME_HEADER_SIZE + page_size
+        committed = 0
+        for start in range(0, len(data) - frame_size + 1, frame_size):
+            _, commit_pages, frame_salt1, frame_salt2 = struct.unpack('>4I', data[start:start + 16])
+            if (frame_salt1, frame_salt2) != (salt1, salt2):
+                break
+            if commit_pages:
+                committed = start + frame_size
+        return (salt1, salt2), page_size, data[:committed], offset + committed
     
-    return success
+    def _read_pending(self):
+        """Read frames not yet shipped in this generation; returns None if WAL continuity was lost"""
+        salts, page_size, frames, end_offset = self._read_wal(self.offset)
+        if salts is None or salts == self.salts:
+            return page_size, frames, end_offset
+        if self.salts is not None and not self._reset_expected:
+            return None
+        
+        # A fresh WAL, or one restarted after our checkpoint: everything before it was already shipped
+        self.salts = salts
+        self._reset_expected = False
+        return self._read_wal(WAL_HEADER_SIZE)[1:]
+    
+    def _holds_lease(self):
+        """Renew the backup lease when due and check that this instance still holds it"""
+        if not self.s3.lease_enabled:
+            return True
+        if monotonic() >= self._lease_renew_at:
+            self.s3.acquire_backup_lease()
+            self._lease_renew_at = monotonic() + self.lease_renew_seconds
+        return self.s3.holds_backup_lease()
+    
+    def _checkpoint_unshipped(self):
+        """Checkpoint while nothing is shipped (standby or no generation) so the WAL cannot grow unbounded"""
+        if os.path.exists(self.wal_path) and os.path.getsize(self.wal_path) >= self.checkpoint_bytes:
+            self._checkpoint_conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    
+    def _upload_segment(self, page_size, frames):
+        """Upload frames as the next numbered segment of the current generation"""
+        timestamp = self.s3._get_current_time_ist().strftime('%Y%m%d_%H%M%S')
+        key = f"{WAL_PREFIX}{self.generation}/{self.sequence:08d}_{timestamp}.seg"
+        self.s3.s3.put_object(Bucket=self.s3.bucket_name, Key=key, Body=frames,
+                              Metadata={'page-size': str(page_size)})
+        self.sequence += 1
+    
+    def ship(self):
+        """Ship newly committed frames, starting a new generation or checkpointing when due"""
+        with self._ship_lock:
+            try:
+                if not self._holds_lease():
+                    if self.generation is not None:
+                        # The new holder ships its own generation; ours resumes with a fresh base if we lead again
+                        logger.warning("⚠️⚠️⚠️ Backup lease lost, stopped shipping WAL generation %s", self.generation)
+                        self.generation = None
+                    self._checkpoint_unshipped()
+                    return
+                
+                generation_due = (
+                    self.generation is None
+                    or monotonic() - self.generation_started >= self.generation_minutes * 60
+                )
+                if generation_due and monotonic() >= self._generation_retry_at:
+                    self._retry_start_generation()
+                    return
+                if self.generation is None:
+                    # Backing off after a failed start; automatic checkpoints are off, so run our own
+                    self._checkpoint_unshipped()
+                    return
+                
+                wal_size = os.path.getsize(self.wal_path) if os.path.exists(self.wal_path) else 0
+                checkpoint = wal_size >= self.checkpoint_bytes
+                with self._write_locked():
+                    pending = self._read_pending()
+                    if pending is None:
+                        logger.warning("⚠️⚠️⚠️ WAL was reset outside the shipper, starting a new generation")
+                    elif checkpoint:
+                        # Frames are in memory; checkpointing from another connection lets the WAL restart
+                        self._checkpoint_conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+                        self._reset_expected = True
+                
+                if pending is None:
+                    self.generation = None
+                    self._retry_start_generation()
+                    return
+                
+                page_size, frames, end_offset = pending
+                if frames:
+                    try:
+                        self._upload_segment(page_size, frames)
+                    except Exception:
+                        if checkpoint:
+                            # These frames may already be gone from the WAL, so the chain is broken
+                            self.generation = None
+                        raise
+                self.offset = end_offset
+            except Exception as e:
+                logger.error("❌❌❌ WAL shipping failed: %s", str(e))
+    
+    def _retry_start_generation(self):
+        """Start a generation, backing off exponentially after failures instead of retrying every tick"""
+        try:
+            self._start_generation()
+        except Exception:
+            self._generation_failures += 1
+            delay = min(self.interval_seconds * 2 ** self._generation_failures, WAL_GENERATION_RETRY_MAX_SECONDS)
+            self._generation_retry_at = monotonic() + delay
+            logger.warning("⚠️⚠️⚠️ Could not start WAL generation (%d failures), retrying in %.0fs", 
+                          self._generation_failures, delay)
+            raise
+        self._generation_failures = 0
+    
+    def _start_generation(self):
+        """Close the current generation and upload a new base snapshot taken at a known WAL offset"""
+        with ExitStack() as stack:
+            snapshot_conn = stack.enter_context(closing(self.db._open_connection()))
+            snapshot_conn.isolation_level = None
+            with self._write_locked():
+                previous = self._read_pending() if self.generation else None
+                salts, page_size, _, end_offset = self._read_wal(WAL_HEADER_SIZE)
+                # Pin a read transaction at end_offset; writers only wait for this, not for the copy
+                snapshot_conn.execute("BEGIN")
+                snapshot_conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            snapshot = stack.enter_context(self.db.open_snapshot(source=snapshot_conn))
+            snapshot_conn.execute("ROLLBACK")
+            
+            if previous and previous[1]:
+                try:
+                    self._upload_segment(previous[0], previous[1])
+                except Exception as e:
+                    logger.error("❌❌❌ Failed to ship final segment of generation %s: %s", self.generation, str(e))
+            
+            generation = self.s3._get_current_time_ist().strftime('%Y%m%d_%H%M%S')
+            if not self.s3.upload_fileobj(snapshot, f"{WAL_PREFIX}{generation}/base.db"):
+                raise RuntimeError(f"Could not upload base snapshot for WAL generation {generation}")
+        
+        self.generation = generation
+        self.generation_started = monotonic()
+        self.sequence = 0
+        self.salts = salts
+        self.offset = end_offset
+        self._reset_expected = False
+        logger.info("🔷🔷🔷 Started WAL generation %s", generation)
 
-def restore_db_from_s3(db_path=None):
+_default_storage = None
+_default_storage_lock = threading.Lock()
+
+def get_s3_storage():
+    """Get the process-wide S3Storage configured from the environment (bucket checked once)"""
+    global _default_storage
+    with _default_storage_lock:
+        if _default_storage is None:
+            _default_storage = S3Storage()
+        return _default_storage
+
+def backup_db_to_s3(db_path=None, db=None):
+    """Utility function to backup the database to S3 with cleanup"""
+    if db is None:
+        from expenses_sqlite import ExpensesSQLite
+        db = ExpensesSQLite(db_path)
+    
+    # Stream a consistent snapshot to S3 with cleanup (db instance also used for persistent tracking)
+    s3 = get_s3_storage()
+    return s3.backup_database(db_instance=db)
+
+def restore_db_from_s3(db_path=None, point_in_time=None):
     """Utility function to restore the database from S3"""
     db_path = db_path or 'expenses.db'
-    s3 = S3Storage()
+    s3 = get_s3_storage()
+    # Prefer WAL generations when shipping is enabled or a specific point in time is requested
+    if point_in_time or os.environ.get('S3_WAL_SHIPPING', 'false').lower() == 'true':
+        if s3.restore_point_in_time(db_path, point_in_time):
+            return True
+        logger.warning("⚠️⚠️⚠️ Point-in-time restore unavailable, falling back to latest backup")
     return s3.restore_latest_database(db_path)
 
 if __name__ == "__main__":
@@ -40,8 +40,7 @@ client = AsyncGroq(
 # Initialize the expenses database
 db = ExpensesSQLite()
 
-# Normalize existing data on startup
-db.normalize_existing_data()
+# Legacy category normalization runs once as schema migration 3 when the database is opened
 
 # Define tools for OpenAI API
 tools = [
@@ -206,23 +205,23 @@ async def execute_tool(tool_name: str, arguments: dict, user_id: str = None) ->
             return f"✅ Expense added: ₹{result['amount']} for {result['category']} ({result['kakeibo_category']}) - {result['description']}"
         
         elif tool_name == "get_monthly_expenses":
-            df = db.get_monthly_expenses(
+            summary = db.get_monthly_category_summary(
                 year=arguments.get("year"),
                 month=arguments.get("month"),
                 user_id=user_id
             )
-            if df.empty:
+            if not summary:
                 return "No expenses found for the specified month."
             
-            total = df['amount'].sum()
-            count = len(df)
+            total = sum(data['total'] for data in summary.values())
+            count = sum(data['count'] for data in summary.values())
             result = f"📊 Monthly Expenses:\nTotal: ₹{total:.2f}\nTransactions: {count}\n\n"
             
             # Top categories
-            category_totals = df.groupby('category')['amount'].sum().sort_values(ascending=False).head(5)
+            category_totals = sorted(summary.items(), key=lambda x: x[1]['total'], reverse=True)[:5]
             result += "Top Categories:\n"
-            for cat, amount in category_totals.items():
-                result += f"• {cat}: ₹{amount:.2f}\n"
+            for cat, data in category_totals:
+                result += f"• {cat}: ₹{data['total']:.2f}\n"
             return result
         
         elif tool_name == "get_category_summary":
@@ -12,13 +12,17 @@ from telegram.constants import ParseMode
 
 # New imports for webhook
 import logging
-from expenses_sqlite import ExpensesSQLite
-import pandas as pd
-from s3_storage import S3Storage, backup_db_to_s3, restore_db_from_s3
+from expenses_sqlite import ExpensesSQLite, AsyncExpensesSQLite
+from s3_storage import WalShipper, backup_db_to_s3, get_s3_storage, restore_db_from_s3
+from update_journal import UpdateJournal
+from expense_parser import parse_expenses
+from intent_classifier import INTENT_TOOLS, classify_intents, select_tools
+from routing_cache import RoutingCache
 import time
 import atexit
 import threading
 import asyncio
+import contextvars
 import prompts
 # Configure logging
 logging.basicConfig(
@@ -46,10 +50,14 @@ PORT = int(os.environ.get("PORT", 8443))
 WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "https://my-financier.onrender.com")
 
 from groq import Groq, AsyncGroq
+from llm_client import LLMBusyError, LLMClient
+# Retries are handled by LLMClient; GROQ_BASE_URL points the client at a local fake server for testing
 client = AsyncGroq(
     api_key=os.environ.get("GROQ_API_KEY"),
-    http_client=httpx.AsyncClient(verify=False)
+    http_client=httpx.AsyncClient(verify=False),
+    max_retries=0
 )
+llm = LLMClient(client)
 # from openai import AsyncOpenAI
 
 # client = AsyncOpenAI(
@@ -61,19 +69,53 @@ client = AsyncGroq(
 db_path = os.environ.get("DATABASE_PATH", "expenses.db")
 logger.info("🔷🔷🔷 Using database path: %s", db_path)
 
-# Check if we should restore from S3 first (on startup)
-if os.environ.get("S3_ENABLED", "false").lower() == "true":
-    logger.info("🔷🔷🔷 S3 storage is enabled")
-    
-    # Try to restore from S3 first (if available)
-    logger.info("🔷🔷🔷 Attempting to restore database from S3...")
-    restored = restore_db_from_s3(db_path)
-    if restored:
-        logger.info("✅✅✅ Successfully restored database from S3")
-    else:
-        logger.warning("⚠️⚠️⚠️ Could not restore from S3, using local database")
+# With S3_LAZY_RESTORE the webhook binds its port right away and the S3 restore runs in the
+# background; messages that arrive meanwhile are journaled to disk and replayed once the database is open
+LAZY_RESTORE = os.environ.get("S3_ENABLED", "false").lower() == "true" and \
+    os.environ.get("S3_LAZY_RESTORE", "false").lower() == "true"
+db_ready = threading.Event()
+update_journal = UpdateJournal(f"{db_path}.journal")
+journal_drained = False  # Set once journaled updates are replayed; new messages queue behind them until then
+# update_id of the journaled update being replayed; its expense writes record it so a crash before
+# pop_first() cannot apply them twice
+replaying_update_id = contextvars.ContextVar('replaying_update_id', default=None)
+
+# Opened by start_database()
+db = None
+async_db = None
+wal_shipper = None
+
+def restore_database():
+    """Restore the database from S3 if enabled"""
+    if os.environ.get("S3_ENABLED", "false").lower() == "true":
+        logger.info("🔷🔷🔷 S3 storage is enabled")
+        
+        # Try to restore from S3 first (if available)
+        logger.info("🔷🔷🔷 Attempting to restore database from S3...")
+        # RESTORE_POINT_IN_TIME (IST, e.g. 2025-07-02T18:30:00) replays shipped WAL up to that moment
+        try:
+            restored = restore_db_from_s3(db_path, os.environ.get("RESTORE_POINT_IN_TIME"))
+        except Exception as e:
+            logger.error("❌❌❌ Restore from S3 failed: %s", str(e))
+            restored = False
+        if restored:
+            logger.info("✅✅✅ Successfully restored database from S3")
+        else:
+            logger.warning("⚠️⚠️⚠️ Could not restore from S3, using local database")
 
-db = ExpensesSQLite(db_path)
+def open_database():
+    """Open the database and start WAL shipping"""
+    global db, async_db, wal_shipper
+    
+    db = ExpensesSQLite(db_path)
+    # Awaitable access for the asyncio handlers (reads on a thread pool, writes on one writer thread)
+    async_db = AsyncExpensesSQLite(db)
+    
+    # Continuously ship WAL frames to S3 for point-in-time restore
+    if os.environ.get("S3_ENABLED", "false").lower() == "true" and \
+            os.environ.get("S3_WAL_SHIPPING", "false").lower() == "true":
+        wal_shipper = WalShipper(db)
+        wal_shipper.start()
 
 # Set up scheduled backups with 15-minute interval
 BACKUP_INTERVAL = int(os.environ.get("BACKUP_INTERVAL_SECONDS", 900))  # Default: 15 minutes (900 seconds)
@@ -82,6 +124,18 @@ BACKUP_INTERVAL = int(os.environ.get("BACKUP_INTERVAL_SECONDS", 900))  # Default
 backup_scheduler = None
 backup_lock = threading.Lock()
 pending_backup = False
+# Backup outcomes since startup; unchanged data is skipped instead of re-uploaded
+backup_stats = {'performed': 0, 'skipped': 0, 'failed': 0, 'standby': 0}
+last_skipped_backup = None
+
+# Simple "spent 500 on groceries" messages are parsed locally and skip the LLM round trip
+FAST_PATH_ENABLED = os.environ.get("FAST_PATH_ENABLED", "true").lower() == "true"
+fast_path_stats = {'hits': 0, 'misses': 0, 'fast_seconds': 0.0, 'llm_calls': 0, 'llm_seconds': 0.0}
+
+# Only the tool schemas matching the message's intent (add/query/edit) are sent; see intent_classifier.py
+INTENT_TOOL_SUBSETTING = os.environ.get("INTENT_TOOL_SUBSETTING", "true").lower() == "true"
+# Repeated phrasings of read-only queries reuse the LLM's earlier tool choice (ROUTING_CACHE_SIZE=0 disables)
+routing_cache = RoutingCache()
 
 # Define IST timezone (GMT+5:30)
 IST = timezone(timedelta(hours=5, minutes=30))
@@ -93,6 +147,9 @@ def get_current_time_ist() -> datetime:
 def should_backup() -> bool:
     """Check if it's time to backup based on database-stored timestamp in IST"""
     last_backup = db.get_last_backup_time()
+    # A skipped (unchanged) backup counts as a check, so unchanged data is not re-examined every minute
+    if last_skipped_backup and (not last_backup or last_skipped_backup > last_backup):
+        last_backup = last_skipped_backup
     if not last_backup:
         return True
     
@@ -102,20 +159,36 @@ def should_backup() -> bool:
 
 def perform_backup_sync():
     """Synchronous backup function for background thread"""
-    global pending_backup
+    global pending_backup, last_skipped_backup
     
     with backup_lock:
         if not pending_backup and not should_backup():
             return
         
         pending_backup = False
-        logger.info("🔷🔷🔷 Running scheduled database backup to S3...")
         
         if os.environ.get("S3_ENABLED", "false").lower() == "true":
-            success = backup_db_to_s3(db_path)
+            # Only the instance holding the S3 lease backs up and runs retention (deploy overlaps run two)
+            if not get_s3_storage().acquire_backup_lease():
+                backup_stats['standby'] += 1
+                pending_backup = True  # Keep it pending so we back up if we become leader
+                logger.info("🔷🔷🔷 Another instance holds the backup lease, skipping backup")
+                return
+            
+            if not db.has_changes_since_backup():
+                backup_stats['skipped'] += 1
+                last_skipped_backup = get_current_time_ist()
+                logger.info("🔷🔷🔷 Data unchanged since last backup (fingerprint %s), skipping upload", 
+                           db.get_data_fingerprint())
+                return
+            
+            logger.info("🔷🔷🔷 Running scheduled database backup to S3...")
+            success = backup_db_to_s3(db_path, db)
             if success:
+                backup_stats['performed'] += 1
                 logger.info("✅✅✅ S3 backup successful")
             else:
+                backup_stats['failed'] += 1
                 logger.error("❌❌❌ S3 backup failed")
         else:
             logger.info("🔷🔷🔷 S3 is not enabled, skipping backup")
@@ -162,210 +235,129 @@ def stop_backup_scheduler():
 def exit_handler():
     """Clean shutdown without backup"""
     stop_backup_scheduler()
+    if wal_shipper:
+        # Ship the last committed frames before the process goes away (while we still hold the lease)
+        wal_shipper.stop()
+    if os.environ.get("S3_ENABLED", "false").lower() == "true":
+        # Let a newer instance take over backups without waiting for the lease to expire
+        get_s3_storage().release_backup_lease()
+    if async_db:
+        async_db.close()
     logger.info("🔷🔷🔷 Clean shutdown completed")
 
-# Log process restart detection and start backup scheduler
+atexit.register(exit_handler)
+
 startup_time = get_current_time_ist()
-last_backup = db.get_last_backup_time()
-if last_backup:
-    time_since_last_backup = startup_time - last_backup
-    logger.info("🔷🔷🔷 Process restarted. Last backup was %d minutes ago", 
-               time_since_last_backup.total_seconds() // 60)
+
+def open_local_database():
+    """Fall back to the local database file (created if missing) without WAL shipping; exit if even that fails"""
+    global db, async_db, wal_shipper
     
-    # If it's been too long since last backup, trigger one immediately
-    if time_since_last_backup.total_seconds() > BACKUP_INTERVAL:
-        logger.info("🔷🔷🔷 Triggering immediate backup due to process restart")
+    try:
+        if wal_shipper:
+            # A half-started shipper has switched automatic checkpoints off; hand them back to SQLite
+            wal_shipper.stop()
+            wal_shipper = None
+        if db is None:
+            db = ExpensesSQLite(db_path)
+        if async_db is None:
+            async_db = AsyncExpensesSQLite(db)
+    except Exception as e:
+        # Journaled updates stay on disk, so a restart (and a fresh restore) loses nothing
+        logger.error("❌❌❌ Could not open the local database either, exiting: %s", str(e), exc_info=True)
+        logging.shutdown()
+        os._exit(1)
+    logger.warning("⚠️⚠️⚠️ Running on the local database at %s", db_path)
+
+def start_backups():
+    """Trigger a backup if the last one is too old, then start the backup scheduler"""
+    # Log process restart detection and start backup scheduler
+    last_backup = db.get_last_backup_time()
+    if last_backup:
+        time_since_last_backup = startup_time - last_backup
+        logger.info("🔷🔷🔷 Process restarted. Last backup was %d minutes ago", 
+                   time_since_last_backup.total_seconds() // 60)
+        
+        # If it's been too long since last backup, trigger one immediately
+        if time_since_last_backup.total_seconds() > BACKUP_INTERVAL:
+            logger.info("🔷🔷🔷 Triggering immediate backup due to process restart")
+            trigger_backup()
+    else:
+        logger.info("🔷🔷🔷 No previous backup found, will backup on first activity")
         trigger_backup()
+    
+    # Start the background backup scheduler
+    start_backup_scheduler()
+
+def start_database():
+    """Restore from S3, open the database, then start the backup scheduler"""
+    started = time.monotonic()
+    try:
+        restore_database()
+        open_database()
+    except Exception as e:
+        # With lazy restore this runs on its own thread; dying here would leave db_ready unset forever
+        logger.error("❌❌❌ Database startup failed: %s", str(e), exc_info=True)
+        open_local_database()
+    
+    try:
+        start_backups()
+    except Exception as e:
+        logger.error("❌❌❌ Could not start the backup scheduler: %s", str(e), exc_info=True)
+    db_ready.set()
+    logger.info("✅✅✅ Database ready after %.2fs", time.monotonic() - started)
+
+if LAZY_RESTORE:
+    logger.info("🔷🔷🔷 Lazy restore enabled, restoring database in the background")
+    threading.Thread(target=start_database, name='lazy-restore', daemon=True).start()
 else:
-    logger.info("🔷🔷🔷 No previous backup found, will backup on first activity")
-    trigger_backup()
-
-# Start the background backup scheduler
-start_backup_scheduler()
-
-# Normalize existing data on startup
-db.normalize_existing_data()
-
-# Define tools for OpenAI API
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "add_expense",
-            "description": "Add a new expense to the database",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "amount": {"type": "number", "description": "The amount of the expense"},
-                    "category": {"type": "string", "description": "Category: Food, Transportation, Utilities, Entertainment, Healthcare, Education, Shopping, Travel, Dining, Groceries, Rent, Gifts, Donations, Subscriptions, Personal Care, Miscellaneous"},
-                    "kakeibo_category": {"type": "string", "description": "Kakeibo category: survival (needs), optional (wants), culture (self-improvement), extra (unexpected)"},
-                    "description": {"type": "string", "description": "Description of the expense"},
-                    "user_id": {"type": "string", "description": "User ID (optional)"}
-                },
-                "required": ["amount", "category", "description"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_monthly_expenses",
-            "description": "Get all expenses for a specific month",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "year": {"type": "integer", "description": "Year (optional, defaults to current)"},
-                    "month": {"type": "integer", "description": "Month (optional, defaults to current)"}
-                }
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_category_summary",
-            "description": "Get spending summary by category",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "start_date": {"type": "string", "description": "Start date (YYYY-MM-DD, optional)"},
-                    "end_date": {"type": "string", "description": "End date (YYYY-MM-DD, optional)"}
-                }
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_recent_expenses",
-            "description": "Get recent expenses",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "days": {"type": "integer", "description": "Number of days to look back (default: 7)"}
-                }
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_expense_by_category",
-            "description": "Get expenses filtered by category",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "category": {"type": "string", "description": "Category name"},
-                    "start_date": {"type": "string", "description": "Start date (YYYY-MM-DD, optional)"},
-                    "end_date": {"type": "string", "description": "End date (YYYY-MM-DD, optional)"}
-                }
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_kakeibo_summary",
-            "description": "Get spending summary by kakeibo categories",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "start_date": {"type": "string", "description": "Start date (YYYY-MM-DD, optional)"},
-                    "end_date": {"type": "string", "description": "End date (YYYY-MM-DD, optional)"}
-                }
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_kakeibo_balance_analysis",
-            "description": "Analyze kakeibo balance and provide recommendations",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "start_date": {"type": "string", "description": "Start date (YYYY-MM-DD, optional)"},
-                    "end_date": {"type": "string", "description": "End date (YYYY-MM-DD, optional)"}
-                }
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_top_expenses",
-            "description": "Get top expenses by amount",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "limit": {"type": "integer", "description": "Number of top expenses to return (default: 10)"},
-                    "start_date": {"type": "string", "description": "Start date (YYYY-MM-DD, optional)"},
-                    "end_date": {"type": "string", "description": "End date (YYYY-MM-DD, optional)"}
-                }
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_spending_trends",
-            "description": "Get monthly spending trends",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "months": {"type": "integer", "description": "Number of months to analyze (default: 6)"}
-                }
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "normalize_categories",
-            "description": "Normalize all existing categories to handle case sensitivity",
-            "parameters": {
-                "type": "object",
-                "properties": {}
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "edit_expense",
-            "description": "Find and edit an existing expense. Can search by description, amount, category, or date to find the exact expense to modify.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "search_description": {"type": "string", "description": "Part of the description to search for the expense to edit"},
-                    "search_amount": {"type": "number", "description": "Amount to search for the expense to edit"},
-                    "search_category": {"type": "string", "description": "Category to search for the expense to edit"},
-                    "search_date": {"type": "string", "description": "Date (YYYY-MM-DD) to search for the expense to edit"},
-                    "new_amount": {"type": "number", "description": "New amount for the expense (optional)"},
-                    "new_category": {"type": "string", "description": "New category for the expense (optional)"},
-                    "new_kakeibo_category": {"type": "string", "description": "New kakeibo category (optional): survival, optional, culture, extra"},
-                    "new_description": {"type": "string", "description": "New description for the expense (optional)"},
-                    "new_date": {"type": "string", "description": "New date (YYYY-MM-DD) for the expense (optional)"},
-                    "expense_index": {"type": "integer", "description": "If multiple expenses found, specify which one to edit (1-based index)"}
-                },
-                "required": []
+    start_database()
+
+# Legacy category normalization runs once as schema migration 3 when the database is opened
+
+# Tool schemas for the OpenAI API live in prompts.py so they can be inspected offline
+tools = prompts.get_tools()
+
+def format_expense_added(result: dict) -> str:
+    """Format the reply line for an added expense"""
+    return f"✅ Expense added: ₹{result['amount']} for {result['category']} ({result['kakeibo_category']}) - {result['description']}"
+
+async def execute_add_expenses(arguments_list: list, user_id: str = None) -> list:
+    """Add all expenses from one LLM turn in a single transaction, returning one reply line per expense"""
+    try:
+        # Ensure user exists in database
+        if user_id and not await async_db.get_user(user_id):
+            await async_db.create_user(user_id)
+        
+        results = await async_db.add_expenses_bulk([
+            {
+                'amount': arguments.get("amount"),
+                'category': arguments.get("category"),
+                'kakeibo_category': arguments.get("kakeibo_category", "survival"),
+                'description': arguments.get("description"),
+                'user_id': user_id or "telegram_user"
             }
-        }
-    }
-]
+            for arguments in arguments_list
+        ], update_id=replaying_update_id.get())
+        trigger_backup()
+        return [format_expense_added(result) for result in results]
+    except Exception as e:
+        # Fall back to one insert per expense so each gets its own result
+        logger.warning("⚠️⚠️⚠️ Bulk expense insert failed (%s), adding individually", str(e))
+        return [await execute_tool("add_expense", arguments, user_id) for arguments in arguments_list]
 
 async def execute_tool(tool_name: str, arguments: dict, user_id: str = None) -> str:
     """Execute the requested tool function"""
     try:
         # Ensure user exists in database
-        if user_id and not db.get_user(user_id):
-            db.create_user(user_id)
+        if user_id and not await async_db.get_user(user_id):
+            await async_db.create_user(user_id)
         
         # Track if this is a data modification operation
         is_modification = False
         
         if tool_name == "add_expense":
-            result = db.add_expense(
+            result = await async_db.add_expense(
                 amount=arguments.get("amount"),
                 category=arguments.get("category"),
                 kakeibo_category=arguments.get("kakeibo_category", "survival"),
@@ -373,35 +365,35 @@ async def execute_tool(tool_name: str, arguments: dict, user_id: str = None) ->
                 user_id=user_id or "telegram_user"
             )
             is_modification = True
-            response = f"✅ Expense added: ₹{result['amount']} for {result['category']} ({result['kakeibo_category']}) - {result['description']}"
+            response = format_expense_added(result)
         
         elif tool_name == "normalize_categories":
-            db.normalize_existing_data()
+            await async_db.normalize_existing_data()
             is_modification = True
             response = "✅ All categories have been normalized to handle case sensitivity"
         
         elif tool_name == "get_monthly_expenses":
-            df = db.get_monthly_expenses(
+            summary = await async_db.get_monthly_category_summary(
                 year=arguments.get("year"),
                 month=arguments.get("month"),
                 user_id=user_id
             )
-            if df.empty:
+            if not summary:
                 return "No expenses found for the specified month."
             
-            total = df['amount'].sum()
-            count = len(df)
+            total = sum(data['total'] for data in summary.values())
+            count = sum(data['count'] for data in summary.values())
             result = f"📊 Monthly Expenses:\nTotal: ₹{total:.2f}\nTransactions: {count}\n\n"
             
             # Top categories
-            category_totals = df.groupby('category')['amount'].sum().sort_values(ascending=False).head(5)
+            category_totals = sorted(summary.items(), key=lambda x: x[1]['total'], reverse=True)[:5]
             result += "Top Categories:\n"
-            for cat, amount in category_totals.items():
-                result += f"• {cat}: ₹{amount:.2f}\n"
+            for cat, data in category_totals:
+                result += f"• {cat}: ₹{data['total']:.2f}\n"
             response = result
         
         elif tool_name == "get_category_summary":
-            summary = db.get_category_summary(
+            summary = await async_db.get_category_summary(
                 start_date=arguments.get("start_date"),
                 end_date=arguments.get("end_date"),
                 user_id=user_id
@@ -424,51 +416,47 @@ async def execute_tool(tool_name: str, arguments: dict, user_id: str = None) ->
             end_date = current_time_ist
             start_date = end_date - timedelta(days=days)
             
-            df = db.get_expenses(
+            expenses = await async_db.iter_expenses(
                 start_date.strftime('%Y-%m-%d'),
                 end_date.strftime('%Y-%m-%d'),
                 user_id=user_id
             )
             
-            if df.empty:
+            if not expenses:
                 return f"No expenses found in the last {days} days."
             
-            total = df['amount'].sum()
+            total = sum(expense.amount for expense in expenses)
             result = f"📊 Recent Expenses ({days} days):\nTotal: ₹{total:.2f}\n\n"
             
-            # Latest transactions
-            # latest = df.sort_values('date', ascending=False).head(5)
-            latest = df.sort_values('date', ascending=False)
-            for _, row in latest.iterrows():
-                date_str = pd.to_datetime(row['date']).strftime('%m-%d')
-                result += f"• {date_str}: ₹{row['amount']:.2f} - {row['description']} - Category: {row['category']}\n"
+            # Latest transactions (already newest first)
+            for expense in expenses:
+                date_str = expense.date.strftime('%m-%d')
+                result += f"• {date_str}: ₹{expense.amount:.2f} - {expense.description} - Category: {expense.category}\n"
             response = result
         
         elif tool_name == "get_expense_by_category":
-            df = db.get_expenses(
+            expenses = await async_db.iter_expenses(
                 start_date=arguments.get("start_date"),
                 end_date=arguments.get("end_date"),
                 category=arguments.get("category"),
                 user_id=user_id
             )
             
-            if df.empty:
+            if not expenses:
                 return f"No expenses found for category '{arguments.get('category')}'."
             
-            total = df['amount'].sum()
-            count = len(df)
+            total = sum(expense.amount for expense in expenses)
+            count = len(expenses)
             result = f"📊 {arguments.get('category')} Expenses:\nTotal: ₹{total:.2f}\nTransactions: {count}\n\n"
             
-            # Recent transactions
-            recent = df.sort_values('date', ascending=False).head(5)
-            recent = df.sort_values('date', ascending=False)
-            for _, row in recent.iterrows():
-                date_str = pd.to_datetime(row['date']).strftime('%m-%d')
-                result += f"• {date_str}: ₹{row['amount']:.2f} - {row['description']}\n"
+            # Recent transactions (already newest first)
+            for expense in expenses:
+                date_str = expense.date.strftime('%m-%d')
+                result += f"• {date_str}: ₹{expense.amount:.2f} - {expense.description}\n"
             response = result
         
         elif tool_name == "get_kakeibo_summary":
-            summary = db.get_kakeibo_summary(
+            summary = await async_db.get_kakeibo_summary(
                 start_date=arguments.get("start_date"),
                 end_date=arguments.get("end_date"),
                 user_id=user_id
@@ -491,7 +479,7 @@ async def execute_tool(tool_name: str, arguments: dict, user_id: str = None) ->
             response = result
         
         elif tool_name == "get_kakeibo_balance_analysis":
-            analysis = db.get_kakeibo_balance_analysis(
+            analysis = await async_db.get_kakeibo_balance_analysis(
                 start_date=arguments.get("start_date"),
                 end_date=arguments.get("end_date"),
                 user_id=user_id
@@ -513,25 +501,25 @@ async def execute_tool(tool_name: str, arguments: dict, user_id: str = None) ->
             response = result
         
         elif tool_name == "get_top_expenses":
-            df = db.get_top_expenses(
+            expenses = await async_db.iter_top_expenses(
                 limit=arguments.get("limit", 10),
                 start_date=arguments.get("start_date"),
                 end_date=arguments.get("end_date"),
                 user_id=user_id
             )
             
-            if df.empty:
+            if not expenses:
                 return "No expenses found."
             
-            result = f"💸 Top {len(df)} Expenses:\n\n"
-            for _, row in df.iterrows():
-                date_str = pd.to_datetime(row['date']).strftime('%m-%d')
-                result += f"• {date_str}: ₹{row['amount']:.2f} - {row['category']} ({row['description']})\n"
+            result = f"💸 Top {len(expenses)} Expenses:\n\n"
+            for expense in expenses:
+                date_str = expense.date.strftime('%m-%d')
+                result += f"• {date_str}: ₹{expense.amount:.2f} - {expense.category} ({expense.description})\n"
             
             response = result
         
         elif tool_name == "get_spending_trends":
-            trends = db.get_spending_trends(
+            trends = await async_db.get_spending_trends(
                 months=arguments.get("months", 6),
                 user_id=user_id
             )
@@ -569,9 +557,9 @@ async def execute_tool(tool_name: str, arguments: dict, user_id: str = None) ->
             search_criteria["user_id"] = user_id
             
             # Find matching expenses
-            matching_expenses = db.find_expenses_by_criteria(**search_criteria, limit=5)
+            matching_expenses = await async_db.iter_expenses_by_criteria(**search_criteria, limit=5)
             
-            if matching_expenses.empty:
+            if not matching_expenses:
                 return "❌ No expenses found matching your search criteria. Please provide more specific details like description, amount, category, or date."
             
             # If multiple expenses found, let user choose or use index
@@ -579,9 +567,9 @@ async def execute_tool(tool_name: str, arguments: dict, user_id: str = None) ->
             
             if len(matching_expenses) > 1 and expense_index >= len(matching_expenses):
                 response = f"🔍 Found {len(matching_expenses)} matching expenses:\n\n"
-                for i, (_, expense) in enumerate(matching_expenses.iterrows(), 1):
-                    date_str = expense['date'].strftime('%Y-%m-%d')
-                    response += f"{i}. {date_str}: ₹{expense['amount']:.2f} - {expense['category']} - {expense['description']}\n"
+                for i, expense in enumerate(matching_expenses, 1):
+                    date_str = expense.date.strftime('%Y-%m-%d')
+                    response += f"{i}. {date_str}: ₹{expense.amount:.2f} - {expense.category} - {expense.description}\n"
                 response += f"\nPlease specify which expense to edit by saying 'edit expense number X' where X is the number (1-{len(matching_expenses)})."
                 return response
             
@@ -589,8 +577,8 @@ async def execute_tool(tool_name: str, arguments: dict, user_id: str = None) ->
                 expense_index = 0  # Default to first match
             
             # Get the expense to edit
-            expense_to_edit = matching_expenses.iloc[expense_index]
-            expense_id = int(expense_to_edit['id'])
+            expense_to_edit = matching_expenses[expense_index]
+            expense_id = expense_to_edit.id
             
             
             # Prepare update parameters
@@ -610,27 +598,27 @@ async def execute_tool(tool_name: str, arguments: dict, user_id: str = None) ->
                 return "❌ No new values provided for updating. Please specify what you want to change (amount, category, description, etc.)."
             
             # Update the expense
-            success = db.update_expense(expense_id, **update_params)
+            success = await async_db.update_expense(expense_id, **update_params)
             
             if success:
                 is_modification = True
                 
                 # Show before and after
                 response = "✅ Expense updated successfully!\n\n"
-                response += f"📅 Original: {expense_to_edit['date'].strftime('%Y-%m-%d')}: ₹{expense_to_edit['amount']:.2f} - {expense_to_edit['category']} - {expense_to_edit['description']}\n\n"
+                response += f"📅 Original: {expense_to_edit.date.strftime('%Y-%m-%d')}: ₹{expense_to_edit.amount:.2f} - {expense_to_edit.category} - {expense_to_edit.description}\n\n"
                 
                 # Show what was changed
                 changes = []
                 if "amount" in update_params:
-                    changes.append(f"Amount: ₹{expense_to_edit['amount']:.2f} → ₹{update_params['amount']:.2f}")
+                    changes.append(f"Amount: ₹{expense_to_edit.amount:.2f} → ₹{update_params['amount']:.2f}")
                 if "category" in update_params:
-                    changes.append(f"Category: {expense_to_edit['category']} → {update_params['category']}")
+                    changes.append(f"Category: {expense_to_edit.category} → {update_params['category']}")
                 if "kakeibo_category" in update_params:
-                    changes.append(f"Kakeibo: {expense_to_edit['kakeibo_category']} → {update_params['kakeibo_category']}")
+                    changes.append(f"Kakeibo: {expense_to_edit.kakeibo_category} → {update_params['kakeibo_category']}")
                 if "description" in update_params:
-                    changes.append(f"Description: {expense_to_edit['description']} → {update_params['description']}")
+                    changes.append(f"Description: {expense_to_edit.description} → {update_params['description']}")
                 if "date" in update_params:
-                    changes.append(f"Date: {expense_to_edit['date'].strftime('%Y-%m-%d')} → {update_params['date']}")
+                    changes.append(f"Date: {expense_to_edit.date.strftime('%Y-%m-%d')} → {update_params['date']}")
                 
                 response += "🔄 Changes made:\n" + "\n".join(f"   • {change}" for change in changes)
                 return response
@@ -649,21 +637,91 @@ async def execute_tool(tool_name: str, arguments: dict, user_id: str = None) ->
     except Exception as e:
         return f"Error executing {tool_name}: {str(e)}"
 
-async def call_openai_api(prompt: str, user_id: str = None, model: str = "llama3.2") -> str:
-    """Call OpenAI API with tools and return the response"""
+# Read-only tools can run side by side on the reader pool; every other tool is a write and runs in order
+READ_TOOLS = INTENT_TOOLS['query']
+
+async def execute_timed_tool(tool_name: str, arguments: dict, user_id: str = None) -> str:
+    """Execute a tool and log how long it took"""
+    started = time.perf_counter()
+    result = await execute_tool(tool_name, arguments, user_id)
+    logger.info("⏱️⏱️⏱️ Tool %s took %.1f ms", tool_name, (time.perf_counter() - started) * 1000)
+    return result
+
+async def execute_tool_calls(calls: list, user_id: str = None) -> list:
+    """Execute (tool_name, arguments) calls from one LLM turn, returning one or more reply lines per call in call order.
+
+    Consecutive reads run concurrently; a write waits for the reads before it, and reads after a
+    write wait for it, so every call sees the same data it would have seen run sequentially.
+    """
+    started = time.perf_counter()
+    results = []
+    pending_reads = []
+    # Consecutive add_expense calls are committed together in one transaction
+    pending_expenses = []
+    
+    async def flush_reads():
+        if pending_reads:
+            results.extend(await asyncio.gather(*(
+                execute_timed_tool(tool_name, arguments, user_id) for tool_name, arguments in pending_reads
+            )))
+            pending_reads.clear()
+    
+    async def flush_expenses():
+        if pending_expenses:
+            expenses_started = time.perf_counter()
+            results.extend(await execute_add_expenses(pending_expenses, user_id))
+            logger.info("⏱️⏱️⏱️ Tool add_expense x%d took %.1f ms", len(pending_expenses),
+                        (time.perf_counter() - expenses_started) * 1000)
+            pending_expenses.clear()
+    
+    for tool_name, arguments in calls:
+        if tool_name in READ_TOOLS:
+            await flush_expenses()
+            pending_reads.append((tool_name, arguments))
+        elif tool_name == "add_expense":
+            await flush_reads()
+            pending_expenses.append(arguments)
+        else:
+            await flush_reads()
+            await flush_expenses()
+            results.append(await execute_timed_tool(tool_name, arguments, user_id))
+    await flush_reads()
+    await flush_expenses()
+    
+    if len(calls) > 1:
+        logger.info("⏱️⏱️⏱️ %d tool calls took %.1f ms", len(calls), (time.perf_counter() - started) * 1000)
+    return results
+
+async def call_openai_api(prompt: str, user_id: str = None, model: str = "llama3.2", message: str = None) -> str:
+    """Call OpenAI API with tools and return the response; message is the raw user text used to pick tools"""
     try:
         system = prompts.get_system_prompt()
 
         logger.info("🔷🔷🔷 INSTRUCTION: %s 🔷🔷🔷", prompt)
         
-        response = await client.chat.completions.create(
+        today = get_current_time_ist().date()
+        cached_calls = routing_cache.lookup(message, today) if message else None
+        if cached_calls:
+            logger.info("⚡⚡⚡ Routing cache hit, skipping LLM: %s", cached_calls)
+            return "\n".join(await execute_tool_calls(cached_calls, user_id))
+        
+        offered_tools = tools
+        if INTENT_TOOL_SUBSETTING and message:
+            offered_tools = select_tools(tools, message)
+            logger.info("🔷🔷🔷 Offering %d of %d tools: %s", len(offered_tools), len(tools),
+                        [tool['function']['name'] for tool in offered_tools])
+        
+        # Messages that add expenses jump the queue when the LLM is rate limited
+        priority = bool(message) and 'add' in classify_intents(message)
+        response = await llm.create(
+            priority=priority,
             # model="qwen3",
             model=model,
             messages=[
                 {"role": "system", "content": system},
                 {"role": "user", "content": prompt}
             ],
-            tools=tools,
+            tools=offered_tools,
             tool_choice="auto",
             max_tokens=1000,
             temperature=0.7
@@ -671,21 +729,23 @@ async def call_openai_api(prompt: str, user_id: str = None, model: str = "llama3
         
         # Check if the model wants to call a function
         if response.choices[0].message.tool_calls:
-            tool_results = []
             generate_report = True
+            routed_calls = []
             for tool_call in response.choices[0].message.tool_calls:
                 function_name = tool_call.function.name
                 function_args = json.loads(tool_call.function.arguments)
-                tool_args = function_args.copy()
-                # Execute the tool
+                routed_calls.append((function_name, function_args))
+                logger.info("🛠️🛠️🛠️ Executing tool: %s with args: %s", function_name, function_args)
                 if function_name == "add_expense":
                     generate_report = False
-                
-                logger.info("🛠️🛠️🛠️ Executing tool: %s with args: %s", function_name, function_args)
-                tool_result = await execute_tool(function_name, tool_args, user_id)
-                tool_results.append(tool_result)
+            
+            # Execute the tools
+            tool_results = await execute_tool_calls(
+                [(function_name, function_args.copy()) for function_name, function_args in routed_calls], user_id
+            )
             if generate_report:
-                
+                if message and routing_cache.store(message, routed_calls, today):
+                    logger.info("🔷🔷🔷 Cached tool routing for: %s", message)
                 return "\n".join(tool_results)
                 system_msg_reports = """You are a helpful assistant that summarizes the results of the executed tools. Generate a concise report based on the tool outputs.
 
@@ -723,7 +783,7 @@ async def call_openai_api(prompt: str, user_id: str = None, model: str = "llama3
 
                 
                 /no_think"""
-                followup_response = await client.chat.completions.create(
+                followup_response = await llm.create(
                     model=model,
                     messages=[
                         {"role": "system", "content": system_msg_reports},
@@ -739,6 +799,9 @@ async def call_openai_api(prompt: str, user_id: str = None, model: str = "llama3
         else:
             return response.choices[0].message.content
         
+    except LLMBusyError as e:
+        logger.warning("⚠️⚠️⚠️ LLM busy: %s", e)
+        return "⏳ I'm getting a lot of messages right now. Please try again in a minute."
     except Exception as e:
         logger.error("❌❌❌ Error calling OpenAI API: %s", e)
         return f"Error calling OpenAI API: {e}"
@@ -779,8 +842,9 @@ Kakeibo Categories:
 
 Admin Commands (for authorized users):
 🔧 /backup - Manual backup
-🧹 /cleanup - Clean old backups
+🧹 /cleanup [dry] - Clean old backups (dry: preview only)
 📊 /status - System status
+🧮 /rebuild_rollups - Recompute monthly rollups
 
 Just tell me what you need!
 """
@@ -795,6 +859,9 @@ async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ You are not authorized to use this command.")
         return
     
+    if await reply_if_restoring(update):
+        return
+    
     if os.environ.get("S3_ENABLED", "false").lower() == "true":
         await update.message.reply_text("🔄 Starting manual database backup...")
         trigger_backup()  # Trigger immediate backup
@@ -803,7 +870,7 @@ async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await asyncio.sleep(3)
         
         # Show backup status with timestamp
-        last_backup = db.get_last_backup_time()
+        last_backup = await async_db.get_last_backup_time()
         status_msg = "✅ Manual backup triggered"
         if last_backup:
             status_msg += f"\n📅 Last backup: {last_backup.strftime('%Y-%m-%d %H:%M:%S')}"
@@ -811,6 +878,13 @@ async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text("❌ S3 backup is not enabled")
 
+def run_backup_cleanup(dry_run: bool):
+    """Run backup retention on S3 (blocking); returns the deleted names, or None if another instance leads"""
+    s3 = get_s3_storage()
+    if not dry_run and not s3.acquire_backup_lease():
+        return None
+    return s3.cleanup_old_backups(dry_run=dry_run)
+
 async def cleanup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /cleanup command for admin users"""
     username = update.message.from_user.username or f"user_{update.message.from_user.id}"
@@ -820,13 +894,26 @@ async def cleanup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ You are not authorized to use this command.")
         return
     
+    if await reply_if_restoring(update):
+        return
+    
     if os.environ.get("S3_ENABLED", "false").lower() == "true":
-        await update.message.reply_text("🧹 Starting backup cleanup...")
+        # "/cleanup dry" lists what retention would delete without deleting anything
+        dry_run = bool(context.args) and context.args[0].lower() in ("dry", "dry-run", "dryrun")
+        await update.message.reply_text("🧹 Starting backup cleanup..." + (" (dry run)" if dry_run else ""))
         try:
-            s3 = S3Storage()
-            s3.cleanup_old_backups()
-            db.set_setting('last_cleanup_time', datetime.now().isoformat())
-            await update.message.reply_text("✅ Cleanup completed successfully")
+            # Listing and batch deletes are blocking S3 calls; keep them off the event loop
+            deleted = await asyncio.to_thread(run_backup_cleanup, dry_run)
+            if deleted is None:
+                await update.message.reply_text("⚠️ Another instance holds the backup lease; cleanup runs there")
+                return
+            if dry_run:
+                preview = "\n".join(f"   • {name}" for name in deleted[:20])
+                more = f"\n   … and {len(deleted) - 20} more" if len(deleted) > 20 else ""
+                await update.message.reply_text(f"🔍 Dry run: {len(deleted)} backups would be deleted\n{preview}{more}")
+                return
+            await async_db.set_setting('last_cleanup_time', datetime.now().isoformat())
+            await update.message.reply_text(f"✅ Cleanup completed successfully ({len(deleted)} backups deleted)")
         except Exception as e:
             logger.error("❌❌❌ Cleanup failed: %s", str(e))
             await update.message.reply_text(f"❌ Cleanup failed: {str(e)}")
@@ -842,8 +929,11 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ You are not authorized to use this command.")
         return
     
-    last_backup = db.get_last_backup_time()
-    last_cleanup = db.get_setting('last_cleanup_time')
+    if await reply_if_restoring(update):
+        return
+    
+    last_backup = await async_db.get_last_backup_time()
+    last_cleanup = await async_db.get_setting('last_cleanup_time')
     current_time_ist = get_current_time_ist()
     
     status_msg = f"🤖 **System Status Report** (IST)\n\n"
@@ -859,6 +949,9 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         status_msg += f"   • Time ago: {int(minutes_ago)} minutes\n"
     else:
         status_msg += "   • Last backup: Never\n"
+    data_changed = await async_db.has_changes_since_backup()
+    status_msg += f"   • Data changed since last backup: {'Yes' if data_changed else 'No'}\n"
+    status_msg += f"   • Since startup: {backup_stats['performed']} performed, {backup_stats['skipped']} skipped (unchanged), {backup_stats['failed']} failed, {backup_stats['standby']} on standby (not lease holder)\n"
     
     status_msg += f"🧹 **Cleanup Status:**\n"
     if last_cleanup:
@@ -878,6 +971,42 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     status_msg += f"   • Backup scheduler: {scheduler_status}\n"
     status_msg += f"   • Backup interval: {BACKUP_INTERVAL // 60} minutes\n"
     
+    # Show query cache statistics
+    cache_stats = await async_db.get_query_cache_stats()
+    status_msg += f"\n🗃️ **Query Cache:**\n"
+    status_msg += f"   • Entries: {cache_stats['size']}/{cache_stats['max_size']} (TTL {cache_stats['ttl_seconds']}s)\n"
+    status_msg += f"   • Hits: {cache_stats['hits']}, Misses: {cache_stats['misses']} ({cache_stats['hit_rate']:.1f}% hit rate)\n"
+    status_msg += f"   • Evictions: {cache_stats['evictions']}, Invalidations: {cache_stats['invalidations']}\n"
+    
+    # Show LLM rate limiter statistics
+    llm_stats = llm.get_stats()
+    status_msg += f"\n🚦 **LLM Rate Limiter:**\n"
+    status_msg += f"   • Concurrency limit: {llm_stats['limit']} ({llm_stats['in_flight']} in flight, {llm_stats['queued']} queued)\n"
+    status_msg += f"   • Requests: {llm_stats['requests']} ({llm_stats['priority']} priority), Retries: {llm_stats['retries']}\n"
+    status_msg += f"   • 429s: {llm_stats['rate_limited']}, Throttled by headers: {llm_stats['throttled']}, Gave up: {llm_stats['busy']}\n"
+    status_msg += f"   • Budget left: {llm_stats['requests_available']:.0f} requests, {llm_stats['tokens_available']:.0f} tokens\n"
+    
+    # Show routing cache statistics
+    routing_stats = routing_cache.stats()
+    status_msg += f"\n🧭 **Routing Cache:**\n"
+    status_msg += f"   • Entries: {routing_stats['size']}/{routing_stats['max_size']} (TTL {routing_stats['ttl_seconds']}s)\n"
+    status_msg += f"   • Hits: {routing_stats['hits']}, Misses: {routing_stats['misses']} ({routing_stats['hit_rate']:.1f}% hit rate)\n"
+    status_msg += f"   • Stored: {routing_stats['stores']}, Not cacheable: {routing_stats['uncacheable']}, Evictions: {routing_stats['evictions']}\n"
+    
+    # Show fast-path parser statistics; time saved assumes each hit would have cost an average LLM call
+    status_msg += f"\n⚡ **Expense Fast Path:** {'🟢 Enabled' if FAST_PATH_ENABLED else '🔴 Disabled'}\n"
+    parsed = fast_path_stats['hits'] + fast_path_stats['misses']
+    if parsed:
+        hit_rate = fast_path_stats['hits'] / parsed * 100
+        status_msg += f"   • Hits: {fast_path_stats['hits']}, Fell through to LLM: {fast_path_stats['misses']} ({hit_rate:.1f}% hit rate)\n"
+    if fast_path_stats['hits']:
+        avg_fast = fast_path_stats['fast_seconds'] / fast_path_stats['hits']
+        status_msg += f"   • Avg fast-path latency: {avg_fast * 1000:.0f} ms\n"
+        if fast_path_stats['llm_calls']:
+            avg_llm = fast_path_stats['llm_seconds'] / fast_path_stats['llm_calls']
+            saved = fast_path_stats['hits'] * avg_llm - fast_path_stats['fast_seconds']
+            status_msg += f"   • Avg LLM latency: {avg_llm * 1000:.0f} ms, est. time saved: {saved:.1f}s\n"
+    
     # Show S3 configuration
     if os.environ.get("S3_ENABLED", "false").lower() == "true":
         status_msg += f"\n☁️ **S3 Configuration:**\n"
@@ -898,33 +1027,36 @@ async def logs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ You are not authorized to use this command.")
         return
     
+    if await reply_if_restoring(update):
+        return
+    
     try:
         # Get recent expenses count and last activity (last 24h in IST)
         current_time_ist = get_current_time_ist()
         start_time_ist = current_time_ist - timedelta(hours=24)
         
-        recent_df = db.get_expenses(
+        recent_summary = await async_db.get_category_summary(
             start_date=start_time_ist.strftime('%Y-%m-%d'),
             end_date=current_time_ist.strftime('%Y-%m-%d')
         )
         
         # Get user count
-        users = db.list_users()
+        users = await async_db.list_users()
         
+        transactions = sum(data['count'] for data in recent_summary.values())
         logs_msg = f"📊 **Activity Report (Last 24h IST)**\n\n"
         logs_msg += f"👥 **Users:** {len(users)} total\n"
-        logs_msg += f"💰 **Transactions:** {len(recent_df)} in last 24h\n"
+        logs_msg += f"💰 **Transactions:** {transactions} in last 24h\n"
         
-        if not recent_df.empty:
-            total_amount = recent_df['amount'].sum()
+        if recent_summary:
+            total_amount = sum(data['total'] for data in recent_summary.values())
             logs_msg += f"💵 **Total amount:** ₹{total_amount:.2f}\n"
             
             # Top categories in last 24h
-            if len(recent_df) > 0:
-                top_categories = recent_df.groupby('category')['amount'].sum().sort_values(ascending=False).head(3)
-                logs_msg += f"\n🏷️ **Top Categories:**\n"
-                for cat, amount in top_categories.items():
-                    logs_msg += f"   • {cat}: ₹{amount:.2f}\n"
+            top_categories = sorted(recent_summary.items(), key=lambda x: x[1]['total'], reverse=True)[:3]
+            logs_msg += f"\n🏷️ **Top Categories:**\n"
+            for cat, data in top_categories:
+                logs_msg += f"   • {cat}: ₹{data['total']:.2f}\n"
         
         logs_msg += f"\n🕒 **Current Time:** {current_time_ist.strftime('%Y-%m-%d %H:%M:%S IST')}"
         
@@ -934,27 +1066,59 @@ async def logs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error("❌❌❌ Error generating logs: %s", str(e))
         await update.message.reply_text(f"❌ Error generating logs: {str(e)}")
 
-async def handle_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    instruction = update.message.text
+async def rebuild_rollups_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /rebuild_rollups command for admin users to recompute monthly rollups"""
+    username = update.message.from_user.username or f"user_{update.message.from_user.id}"
+    
+    # Check if user is admin
+    if username != os.environ.get("ADMIN_USERNAME"):
+        await update.message.reply_text("❌ You are not authorized to use this command.")
+        return
+    
+    if await reply_if_restoring(update):
+        return
+    
+    await update.message.reply_text("🔄 Rebuilding monthly rollups...")
+    try:
+        result = await async_db.rebuild_monthly_rollups()
+        status_msg = "✅ Monthly rollups rebuilt\n"
+        status_msg += f"   • Buckets: {result['buckets']}\n"
+        status_msg += f"   • Mismatches fixed: {result['mismatches_fixed']}\n"
+        status_msg += f"   • Mismatches remaining: {result['mismatches_remaining']}"
+        await update.message.reply_text(status_msg)
+    except Exception as e:
+        logger.error("❌❌❌ Rollup rebuild failed: %s", str(e))
+        await update.message.reply_text(f"❌ Rollup rebuild failed: {str(e)}")
+
+async def process_message(text: str, message_time_utc: datetime, username: str, user_id: str, reply_func):
+    """Run a user's message through the LLM tools and send the response with reply_func"""
     # Convert message date to IST
-    message_time_utc = update.message.date
     message_time_ist = message_time_utc.astimezone(IST)
     date = message_time_ist.strftime("%Y-%m-%d")
     
-    username = update.message.from_user.username or f"user_{update.message.from_user.id}"
-    user_id = str(update.message.from_user.id)
-    
     # Ensure user exists in database
-    if not db.get_user(user_id):
-        db.create_user(user_id, f"{username}@telegram.com" if username else None)
+    if not await async_db.get_user(user_id):
+        await async_db.create_user(user_id, f"{username}@telegram.com" if username else None)
     
-    instruction = f"{instruction}. Today's date is {date} (IST). User: {username}"
+    instruction = f"{text}. Today's date is {date} (IST). User: {username}"
     try:
-        # Call OpenAI API with the user's message and user_id
-        response = await call_openai_api(instruction, user_id, model=MODEL)
+        expenses = parse_expenses(text) if FAST_PATH_ENABLED else None
+        if expenses:
+            started = time.perf_counter()
+            logger.info("⚡⚡⚡ Fast path: %d expense(s) parsed without the LLM: %s", len(expenses), expenses)
+            response = "\n".join(await execute_add_expenses(expenses, user_id))
+            fast_path_stats['hits'] += 1
+            fast_path_stats['fast_seconds'] += time.perf_counter() - started
+            await reply_func(response)
+            return
         
-        # Apply logging decorator to reply_text
-        reply_func = log_response_decorator(update.message.reply_text)
+        # Call OpenAI API with the user's message and user_id
+        started = time.perf_counter()
+        response = await call_openai_api(instruction, user_id, model=MODEL, message=text)
+        fast_path_stats['llm_calls'] += 1
+        fast_path_stats['llm_seconds'] += time.perf_counter() - started
+        if FAST_PATH_ENABLED:
+            fast_path_stats['misses'] += 1
         
         if "<" in response and ">" in response:
             print(response)
@@ -969,9 +1133,86 @@ async def handle_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             await reply_func(response)
     except Exception as e:
-        reply_func = log_response_decorator(update.message.reply_text)
         await reply_func(f"Error: {e}")
 
+async def handle_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    username = update.message.from_user.username or f"user_{update.message.from_user.id}"
+    user_id = str(update.message.from_user.id)
+    
+    if not db_ready.is_set() or not journal_drained:
+        # Database still restoring (or older messages still replaying): queue durably and answer later
+        update_journal.append({
+            'update_id': update.update_id,
+            'chat_id': update.message.chat_id,
+            'text': update.message.text,
+            'date': update.message.date.isoformat(),
+            'username': username,
+            'user_id': user_id,
+        })
+        logger.info("🔷🔷🔷 Journaled update %s while the database is not ready", update.update_id)
+        if not db_ready.is_set():
+            await update.message.reply_text("⏳ I'm just starting up - your message is saved and I'll process it in a moment.")
+        return
+    
+    # Apply logging decorator to reply_text
+    reply_func = log_response_decorator(update.message.reply_text)
+    await process_message(update.message.text, update.message.date, username, user_id, reply_func)
+
+async def replay_update_journal(app: Application):
+    """Once the database is open, process journaled updates in arrival order, then accept new ones directly"""
+    global journal_drained
+    
+    await asyncio.to_thread(db_ready.wait)
+    replayed = 0
+    # Updates at or below this id were applied before a crash that left them in the journal
+    last_applied = await async_db.get_last_applied_update_id()
+    while True:
+        entries = update_journal.entries()
+        if not entries:
+            # No await between the empty check and the flag, so no new message can slip in between
+            journal_drained = True
+            break
+        
+        entry = entries[0]
+        update_id = entry.get('update_id')
+        if last_applied is not None and update_id is not None and update_id <= last_applied:
+            logger.info("🔷🔷🔷 Skipping journaled update %s, already applied", update_id)
+            update_journal.pop_first()
+            continue
+        
+        reply_func = log_response_decorator(functools.partial(app.bot.send_message, entry['chat_id']))
+        token = replaying_update_id.set(update_id)
+        try:
+            await process_message(entry['text'], datetime.fromisoformat(entry['date']), 
+                                  entry['username'], entry['user_id'], reply_func)
+        except Exception as e:
+            logger.error("❌❌❌ Failed to replay journaled update %s: %s", update_id, str(e))
+        finally:
+            replaying_update_id.reset(token)
+        if update_id is not None:
+            # Covers updates that wrote nothing or wrote outside add_expenses_bulk
+            await async_db.set_last_applied_update_id(update_id)
+            last_applied = update_id
+        update_journal.pop_first()
+        replayed += 1
+    
+    if last_applied is not None:
+        # Nothing left to de-duplicate; Telegram may restart update_ids after a quiet week
+        await async_db.set_last_applied_update_id(None)
+    if replayed:
+        logger.info("✅✅✅ Replayed %d journaled updates", replayed)
+
+async def start_journal_replay(app: Application):
+    """post_init hook: replay the update journal in the background once the database is ready"""
+    app.create_task(replay_update_journal(app))
+
+async def reply_if_restoring(update: Update) -> bool:
+    """Tell the user the database is still being restored; returns True if so"""
+    if db_ready.is_set():
+        return False
+    await update.message.reply_text("⏳ The database is still being restored, please try again in a moment.")
+    return True
+
 # Override the reply_text method to log responses
 import functools
 
@@ -1048,7 +1289,7 @@ async def log_webhook_payload(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 def main():
     # Create the Application
-    app = Application.builder().token(BOT_TOKEN).build()
+    app = Application.builder().token(BOT_TOKEN).post_init(start_journal_replay).build()
     
     # Add command handlers
     app.add_handler(CommandHandler("start", start))
@@ -1058,6 +1299,7 @@ def main():
     app.add_handler(CommandHandler("cleanup", cleanup_command))
     app.add_handler(CommandHandler("status", status_command))
     app.add_handler(CommandHandler("logs", logs_command))
+    app.add_handler(CommandHandler("rebuild_rollups", rebuild_rollups_command))
     
     # Add message handler for general messages (must be last)
     app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_command))
@@ -1092,13 +1334,13 @@ def main():
         logger.info("🔷🔷🔷 Cleanup frequency: %s minutes", 
                    os.environ.get('S3_CLEANUP_FREQUENCY_MINUTES', '60'))
         logger.info("🔷🔷🔷 Background backup scheduler: Enabled")
-        logger.info("🔷🔷🔷 Admin commands: /backup, /cleanup, /status, /logs")
+        logger.info("🔷🔷🔷 Admin commands: /backup, /cleanup, /status, /logs, /rebuild_rollups")
     else:
         logger.warning("⚠️⚠️⚠️ S3 storage is disabled")
 
 async def call_llm(messages: list):
 
-    response = await client.chat.completions.create(
+    response = await llm.create(
         model=MODEL,
         messages=messages,
         tools=tools,
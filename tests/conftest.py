@@ -0,0 +1,58 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+from moto import mock_aws
+
+# Tests import the flat top-level modules directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import s3_storage  # noqa: E402
+from s3_storage import S3Storage  # noqa: E402
+
+
+class FakeClock:
+    """Stands in for time.monotonic so lease ages and backoffs can be advanced without sleeping"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(s3_storage, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def s3_clock_skew():
+    """Seconds S3's clock runs ahead of ours; moto sends no Date header, so the tests stamp one"""
+    return {'seconds': 0}
+
+
+@pytest.fixture
+def make_storage(monkeypatch, clock, s3_clock_skew):
+    """Build S3Storage instances (one per simulated instance id) against moto's in-process S3"""
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+
+    def add_date_header(parsed, **kwargs):
+        server_now = datetime.now(timezone.utc) + timedelta(seconds=s3_clock_skew['seconds'])
+        parsed['ResponseMetadata']['HTTPHeaders']['date'] = format_datetime(server_now, usegmt=True)
+
+    with mock_aws():
+        def make_storage(instance_id):
+            monkeypatch.setenv('RENDER_INSTANCE_ID', instance_id)
+            storage = S3Storage(bucket_name='backups-test', region_name='us-east-1')
+            storage.s3.meta.events.register('after-call.s3.GetObject', add_date_header)
+            return storage
+        yield make_storage
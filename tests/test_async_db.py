@@ -0,0 +1,88 @@
+import asyncio
+import sqlite3
+import threading
+from time import monotonic, sleep
+
+import pytest
+
+from expenses_sqlite import AsyncExpensesSQLite, ExpensesSQLite
+
+HANDLERS = 20
+LOCK_SECONDS = 0.3
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ExpensesSQLite(str(tmp_path / "expenses.db"))
+    conn = db._get_connection()
+    conn.executemany(
+        "INSERT INTO expenses (date, amount, category, kakeibo_category, description, user_id) VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"2026-{day % 12 + 1:02d}-01 10:00:00", day, 'Groceries', 'survival', 'item', 'alice') for day in range(10000)]
+    )
+    conn.commit()
+    yield db
+    db.close()
+
+
+def hold_write_lock(db_path, held):
+    """Keep the write lock from another connection for LOCK_SECONDS, like the backup thread can"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    held.set()
+    sleep(LOCK_SECONDS)
+    conn.execute("ROLLBACK")
+    conn.close()
+
+
+async def worst_loop_stall(handler):
+    """Run HANDLERS copies of handler while a ticker measures the longest event-loop stall"""
+    stalls = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            started = monotonic()
+            await asyncio.sleep(0.001)
+            stalls.append(monotonic() - started)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    await asyncio.gather(*(handler(index) for index in range(HANDLERS)))
+    done.set()
+    await tick
+    return max(stalls)
+
+
+def run_with_write_lock(db, handler):
+    held = threading.Event()
+    locker = threading.Thread(target=hold_write_lock, args=(db.db_path, held))
+    locker.start()
+    held.wait()
+    try:
+        return asyncio.run(worst_loop_stall(handler))
+    finally:
+        locker.join()
+
+
+def test_direct_calls_block_the_event_loop_behind_a_write_lock(db):
+    async def handler(index):
+        db.get_user('alice')
+        db.set_setting(f'key_{index}', 'value')
+        db.get_expenses(user_id='alice')
+
+    assert run_with_write_lock(db, handler) >= LOCK_SECONDS * 0.8
+
+
+def test_facade_keeps_the_event_loop_responsive_behind_a_write_lock(db):
+    async_db = AsyncExpensesSQLite(db)
+
+    async def handler(index):
+        await async_db.get_user('alice')
+        await async_db.set_setting(f'key_{index}', 'value')
+        await async_db.get_expenses(user_id='alice')
+
+    try:
+        assert run_with_write_lock(db, handler) < LOCK_SECONDS / 3
+    finally:
+        async_db.close()
+    assert db.get_setting(f'key_{HANDLERS - 1}') == 'value'
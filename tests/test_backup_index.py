@@ -0,0 +1,63 @@
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+from s3_storage import BACKUP_INDEX_KEY, BACKUP_PREFIX
+
+BACKUPS = [f"{BACKUP_PREFIX}20261016_{hour:02d}0000.db.gz" for hour in (9, 10)]
+
+
+@pytest.fixture
+def bucket(make_storage, monkeypatch):
+    """A bucket holding two full backups and no index, plus a writer that stays the only instance"""
+    monkeypatch.setenv('S3_BACKUP_LEASE', 'false')
+    writer = make_storage('writer')
+    writer._ensure_bucket_exists()
+    for name in BACKUPS:
+        writer.s3.put_object(Bucket=writer.bucket_name, Key=name, Body=b'backup')
+    return writer
+
+
+def stored_index(storage):
+    body = storage.s3.get_object(Bucket=storage.bucket_name, Key=BACKUP_INDEX_KEY)['Body'].read()
+    return sorted(entry['name'] for entry in json.loads(body)['backups'])
+
+
+def test_missing_index_is_reconciled_and_saved(bucket):
+    assert sorted(entry['name'] for entry in bucket.load_backup_index()) == BACKUPS
+    assert stored_index(bucket) == BACKUPS
+
+
+def test_corrupt_index_is_reconciled(bucket):
+    bucket.s3.put_object(Bucket=bucket.bucket_name, Key=BACKUP_INDEX_KEY, Body=b'{"backups": [')
+    assert sorted(entry['name'] for entry in bucket.load_backup_index()) == BACKUPS
+    assert stored_index(bucket) == BACKUPS
+
+
+def test_transient_errors_are_raised_without_touching_the_index(bucket, monkeypatch):
+    bucket._save_backup_index([{'name': BACKUPS[0]}])
+    get_object = bucket.s3.get_object
+
+    def throttled(**kwargs):
+        if kwargs['Key'] == BACKUP_INDEX_KEY:
+            raise ClientError({'Error': {'Code': 'SlowDown', 'Message': 'Please reduce your request rate'}}, 'GetObject')
+        return get_object(**kwargs)
+
+    monkeypatch.setattr(bucket.s3, 'get_object', throttled)
+    with pytest.raises(ClientError):
+        bucket.load_backup_index()
+    monkeypatch.setattr(bucket.s3, 'get_object', get_object)
+    assert stored_index(bucket) == [BACKUPS[0]]
+
+
+def test_instances_without_the_lease_do_not_write_a_reconciled_index(bucket, make_storage, monkeypatch):
+    monkeypatch.setenv('S3_BACKUP_LEASE', 'true')
+    standby = make_storage('standby')
+    assert sorted(entry['name'] for entry in standby.load_backup_index()) == BACKUPS
+    with pytest.raises(ClientError):
+        stored_index(standby)
+
+    assert standby.acquire_backup_lease()
+    standby.load_backup_index()
+    assert stored_index(standby) == BACKUPS
@@ -0,0 +1,46 @@
+import pytest
+
+from expense_parser import parse_expenses
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Spent 500 on groceries", [(500, 'Groceries', 'survival')]),
+    ("milk 40rs, eggs 60", [(40, 'Groceries', 'survival'), (60, 'Non-veg', 'survival')]),
+    ("200 rs on petrol and 150 for auto", [(200, 'Transportation', 'survival'), (150, 'Transportation', 'survival')]),
+    ("1,200/- for petrol", [(1200, 'Transportation', 'survival')]),
+    ("netflix 649", [(649, 'Entertainment', 'culture')]),
+    ("plumber 400", [(400, 'Home-utilities', 'extra')]),
+    ("auto rs 2025", [(2025, 'Transportation', 'survival')]),
+    ("2025rs for auto", [(2025, 'Transportation', 'survival')]),
+    ("₹1999 on shoes", [(1999, 'Shopping', 'optional')]),
+    ("bought books for 450", [(450, 'Education', 'culture')]),
+    ("spent 450 on books", [(450, 'Education', 'culture')]),
+    ("₹60 eggs", [(60, 'Non-veg', 'survival')]),
+    ("60rs eggs", [(60, 'Non-veg', 'survival')]),
+    ("40 milk", [(40, 'Groceries', 'survival')]),
+])
+def test_confident_messages_are_parsed(text, expected):
+    expenses = parse_expenses(text)
+    assert [(e['amount'], e['category'], e['kakeibo_category']) for e in expenses] == expected
+
+
+@pytest.mark.parametrize("text", [
+    "auto 2025",              # a year, not an amount
+    "2025 for taxi",
+    "oil 200",                # cooking or engine oil
+    "watch 1500",
+    "prime 1499",
+    "game 300",
+    "how much did I spend on groceries?",
+    "bread and butter 80",    # "bread" alone has no amount
+    "500 on chicken and fish",
+    "spent 300 on dinner with friends",
+    "500 for stuff",
+    "bought 2 books",         # quantities, not prices
+    "add 3 eggs",
+    "bought 6 bananas",
+    "2 movies",
+    "500 groceries",
+])
+def test_ambiguous_messages_fall_through(text):
+    assert parse_expenses(text) is None
@@ -0,0 +1,128 @@
+import pytest
+
+from expenses_sqlite import SCHEMA_MIGRATIONS, ExpensesSQLite
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ExpensesSQLite(str(tmp_path / "expenses.db"))
+    conn = db._get_connection()
+    conn.executemany(
+        "INSERT INTO expenses (date, amount, category, kakeibo_category, description, user_id) VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (f"2026-{month:02d}-{day:02d} 10:00:00", day * 10, category, 'survival', 'item', user)
+            for user in ('alice', 'bob')
+            for month in range(1, 13)
+            for day in range(1, 28)
+            for category in ('Groceries', 'Dining')
+        ]
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    yield db
+    db.close()
+
+
+def query_plans(db, run):
+    """Run a query method and return the EXPLAIN QUERY PLAN details of every SELECT it issued"""
+    conn = db._get_connection()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        result = run()
+        if hasattr(result, '__next__'):
+            list(result)
+    finally:
+        conn.set_trace_callback(None)
+
+    plans = []
+    for statement in statements:
+        if statement.lstrip().upper().startswith('SELECT') and 'FROM expenses' in statement:
+            plans.append(' | '.join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + statement)))
+    assert plans, "no expenses query was issued"
+    return plans
+
+
+@pytest.mark.parametrize("run, index", [
+    (lambda db: db.iter_expenses(user_id='alice'), 'idx_expenses_user_date'),
+    (lambda db: db.iter_expenses('2026-03-01', '2026-03-31', user_id='alice'), 'idx_expenses_user_date'),
+    (lambda db: db.iter_expenses(category='Dining', user_id='alice'), 'idx_expenses_user_category_date'),
+    (lambda db: db.iter_expenses('2026-03-01', '2026-03-31', category='Dining', user_id='alice'),
+     'idx_expenses_user_category_date'),
+    (lambda db: db.get_expenses('2026-03-01', '2026-03-31', user_id='alice'), 'idx_expenses_user_'),
+    (lambda db: db.iter_top_expenses(limit=5, start_date='2026-03-01', user_id='alice'), 'idx_expenses_user_'),
+])
+def test_per_user_queries_use_user_indexes(db, run, index):
+    for plan in query_plans(db, lambda: run(db)):
+        assert index in plan, plan
+        assert 'SCAN expenses' not in plan, plan
+
+
+def test_migrations_are_applied_once(db):
+    assert db.get_schema_version() == max(version for version, _, _ in SCHEMA_MIGRATIONS)
+    indexes = {row[0] for row in db._get_connection().execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'idx_expenses_user_date', 'idx_expenses_user_category_date'} <= indexes
+
+
+def test_update_expense_normalizes_dates(db):
+    expense_id = db._get_connection().execute("SELECT MIN(id) FROM expenses").fetchone()[0]
+    assert db.update_expense(expense_id, date='2026-10-5')
+    assert db._get_connection().execute("SELECT date FROM expenses WHERE id = ?", (expense_id,)).fetchone()[0] == '2026-10-05'
+    with pytest.raises(ValueError, match="expected YYYY-MM-DD"):
+        db.update_expense(expense_id, date='garbage')
+    assert db.verify_monthly_rollups() == []
+
+
+def test_non_iso_legacy_dates_do_not_break_rollups(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, date TIMESTAMP NOT NULL, amount REAL NOT NULL,
+            category TEXT NOT NULL, kakeibo_category TEXT DEFAULT 'survival', description TEXT,
+            user_id TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        INSERT INTO expenses (date, amount, category, description, user_id) VALUES ('05/10/2025', 10, 'food', 'x', 'u');
+    ''')
+    conn.commit()
+    conn.close()
+
+    db = ExpensesSQLite(path)
+    try:
+        db._get_connection().execute(
+            "INSERT INTO expenses (date, amount, category, user_id) VALUES ('not a date', 5, 'Food', 'u')"
+        )
+        assert db.verify_monthly_rollups() == []
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("start_date, end_date", [
+    ('2026-03-01', '2026-03-31'),  # whole month: answered from monthly_rollups
+    ('2026-03-02', '2026-03-20'),  # partial month: answered from raw expenses
+])
+def test_kakeibo_summary_skips_null_kakeibo_rows(db, start_date, end_date):
+    db._get_connection().execute(
+        "INSERT INTO expenses (date, amount, category, kakeibo_category, user_id) "
+        "VALUES ('2026-03-10 10:00:00', 5000, 'Groceries', NULL, 'alice')"
+    )
+    summary = db.get_kakeibo_summary(start_date, end_date, user_id='alice')
+    assert set(summary) == {'survival'}
+    analysis = db.get_kakeibo_balance_analysis(start_date, end_date, user_id='alice')
+    assert analysis['survival']['actual_percentage'] == pytest.approx(100)
+
+
+def test_bulk_insert_records_the_applied_update_id_in_the_same_transaction(db):
+    expense = {'amount': 120, 'category': 'groceries', 'description': 'milk', 'user_id': 'alice'}
+    db.add_expenses_bulk([expense], update_id=41)
+    assert db.get_last_applied_update_id() == 41
+
+    # A failed insert rolls the marker back with it, so the update is replayed rather than skipped
+    with pytest.raises(Exception):
+        db.add_expenses_bulk([expense, {**expense, 'amount': None}], update_id=42)
+    assert db.get_last_applied_update_id() == 41
+
+    db.set_last_applied_update_id(None)
+    assert db.get_last_applied_update_id() is None
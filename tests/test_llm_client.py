@@ -0,0 +1,175 @@
+import asyncio
+import json
+from time import monotonic
+
+import groq
+import httpx
+import pytest
+from groq import AsyncGroq
+
+import llm_client
+from llm_client import LLMBusyError, LLMClient
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(llm_client, 'LLM_BACKOFF_BASE_SECONDS', 0.01)
+    monkeypatch.setattr(llm_client, 'LLM_BACKOFF_MAX_SECONDS', 0.05)
+    monkeypatch.setattr(llm_client, 'DECREASE_COOLDOWN_SECONDS', 0)
+
+
+class FakeGroq:
+    """Scripted stand-in for Groq's chat completions endpoint behind an httpx.MockTransport"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.received = []
+        self.gate = None  # When set, successful responses wait for it (keeps requests in flight)
+
+    async def handle(self, request):
+        content = json.loads(request.content)['messages'][-1]['content']
+        self.received.append(content)
+        status, headers = self.responses.pop(0) if self.responses else (200, {})
+        if status != 200:
+            error = {'error': {'message': f'fake {status}', 'type': 'fake', 'code': str(status)}}
+            return httpx.Response(status, headers=headers, json=error)
+        if self.gate is not None:
+            await self.gate.wait()
+        return httpx.Response(200, headers=headers, json={
+            'id': 'fake', 'object': 'chat.completion', 'created': 0, 'model': 'fake',
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15}
+        })
+
+    def client(self, **kwargs):
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+        groq_client = AsyncGroq(api_key='test', base_url='http://fake-groq', max_retries=0, http_client=http_client)
+        options = {'requests_per_minute': 6000, 'tokens_per_minute': 10 ** 6, 'deadline_seconds': 5, **kwargs}
+        return LLMClient(groq_client, **options)
+
+
+def ask(llm, content, **kwargs):
+    return llm.create(model='fake', messages=[{'role': 'user', 'content': content}], **kwargs)
+
+
+def test_retries_a_429_after_retry_after_and_halves_the_limit():
+    fake = FakeGroq((429, {'retry-after': '0.2'}))
+    llm = fake.client(initial_concurrency=4)
+
+    async def run():
+        started = monotonic()
+        response = await ask(llm, 'hello')
+        return response, monotonic() - started
+
+    response, elapsed = asyncio.run(run())
+    assert response.choices[0].message.content == 'hello'
+    assert elapsed >= 0.2
+    assert fake.received == ['hello', 'hello']
+    assert (llm.stats['rate_limited'], llm.stats['retries'], llm.limit) == (1, 1, 2)
+
+
+def test_retries_server_errors_without_shrinking():
+    fake = FakeGroq((503, {}), (500, {}))
+    llm = fake.client(initial_concurrency=4)
+
+    response = asyncio.run(ask(llm, 'hello'))
+    assert response.choices[0].message.content == 'hello'
+    assert llm.stats['retries'] == 2
+    assert llm.limit == 4
+
+
+def test_client_errors_are_not_retried():
+    fake = FakeGroq((400, {}))
+    llm = fake.client()
+
+    with pytest.raises(groq.BadRequestError):
+        asyncio.run(ask(llm, 'hello'))
+    assert len(fake.received) == 1
+
+
+def test_gives_up_when_retry_after_passes_the_deadline():
+    fake = FakeGroq(*[(429, {'retry-after': '30'})] * 3)
+    llm = fake.client()
+
+    started = monotonic()
+    with pytest.raises(LLMBusyError):
+        asyncio.run(ask(llm, 'hello', deadline_seconds=2))
+    assert monotonic() - started < 1
+    assert len(fake.received) == 1
+    assert llm.stats['busy'] == 1
+
+
+def test_gives_up_after_max_retries():
+    fake = FakeGroq(*[(429, {'retry-after': '0'})] * 5)
+    llm = fake.client(max_retries=2)
+
+    with pytest.raises(LLMBusyError):
+        asyncio.run(ask(llm, 'hello'))
+    assert len(fake.received) == 3
+
+
+def test_limit_grows_additively_and_halves_on_low_headers():
+    low_tokens = {'x-ratelimit-limit-tokens': '1000', 'x-ratelimit-remaining-tokens': '50',
+                  'x-ratelimit-reset-tokens': '0.1s'}
+    fake = FakeGroq(*[(200, {})] * 5, (200, low_tokens))
+    llm = fake.client(initial_concurrency=2, max_concurrency=4)
+
+    async def run():
+        limits = []
+        for index in range(6):
+            await ask(llm, f'message {index}')
+            limits.append(llm.limit)
+        return limits
+
+    # One step per limit's worth of successes (2, then 3), capped at max_concurrency, halved when headers run low
+    assert asyncio.run(run()) == [2, 3, 3, 3, 4, 2]
+    assert llm.stats['throttled'] == 1
+
+
+def test_priority_requests_are_admitted_before_queued_normal_ones():
+    fake = FakeGroq()
+    llm = fake.client(initial_concurrency=1, max_concurrency=1)
+
+    async def run():
+        fake.gate = asyncio.Event()
+        blocker = asyncio.create_task(ask(llm, 'blocker'))
+        while not fake.received:
+            await asyncio.sleep(0.01)
+        queued = [asyncio.create_task(ask(llm, f'normal {index}')) for index in range(3)]
+        await asyncio.sleep(0.05)
+        queued.append(asyncio.create_task(ask(llm, 'priority', priority=True)))
+        await asyncio.sleep(0.05)
+        assert llm.get_stats()['queued'] == 4
+        fake.gate.set()
+        await asyncio.gather(blocker, *queued)
+
+    asyncio.run(run())
+    assert fake.received == ['blocker', 'priority', 'normal 0', 'normal 1', 'normal 2']
+    assert llm.stats['priority'] == 1
+
+
+def test_adopts_the_token_limit_groq_reports():
+    headers = {'x-ratelimit-limit-tokens': '300000', 'x-ratelimit-remaining-tokens': '299000',
+               'x-ratelimit-reset-tokens': '0.2s'}
+    fake = FakeGroq((200, headers))
+    llm = fake.client(tokens_per_minute=100)
+
+    asyncio.run(ask(llm, 'hello'))
+    assert (llm.tokens.capacity, llm.tokens.rate) == (300000, 5000)
+    assert llm.get_stats()['tokens_available'] >= 299000
+
+
+def test_request_limit_header_is_a_daily_budget():
+    headers = {'x-ratelimit-limit-requests': '1000', 'x-ratelimit-remaining-requests': '1',
+               'x-ratelimit-reset-requests': '2m0s'}
+    fake = FakeGroq((200, headers))
+    llm = fake.client()
+
+    asyncio.run(ask(llm, 'first'))
+    assert llm.requests.capacity == 6000
+    assert (llm.daily_requests.capacity, llm.daily_requests.window_seconds) == (1000, 86400)
+
+    asyncio.run(ask(llm, 'second'))
+    with pytest.raises(LLMBusyError):
+        asyncio.run(ask(llm, 'third', deadline_seconds=0.5))
+    assert fake.received == ['first', 'second']
@@ -0,0 +1,50 @@
+from datetime import date
+
+from routing_cache import RoutingCache, mask_message
+
+
+def test_mask_message():
+    assert mask_message("Top 5 expenses in August 2025!") == (
+        'top <n0> expenses in <m0> <n1>', {'<n0>': 5, '<m0>': 8, '<n1>': 2025}
+    )
+
+
+def test_replays_with_new_values_and_todays_date():
+    cache = RoutingCache()
+    assert cache.store("show expenses from the last 3 days", [("get_recent_expenses", {"days": 3})], date(2026, 10, 16))
+    assert cache.lookup("Show expenses from the last 10 days", date(2026, 10, 16)) == [("get_recent_expenses", {"days": 10})]
+
+    assert cache.store("this month's expenses", [("get_monthly_expenses", {"year": 2026, "month": 10})], date(2026, 10, 16))
+    assert cache.lookup("this months expenses", date(2026, 11, 3)) == [("get_monthly_expenses", {"year": 2026, "month": 11})]
+
+
+def test_rejects_arguments_it_cannot_rebuild():
+    cache = RoutingCache()
+    today = date(2026, 10, 16)
+    assert not cache.store("expenses last month", [("get_monthly_expenses", {"year": 2026, "month": 9})], today)
+    assert not cache.store("top 8 expenses in august", [("get_top_expenses", {"limit": 8, "month": 8})], today)
+    assert not cache.store("spent 500 on groceries", [("add_expense", {"amount": 500})], today)
+
+
+def test_rejects_dates_matching_several_of_todays_values():
+    cache = RoutingCache()
+    # In January the year and the month start on the same date
+    assert not cache.store("category summary for this year",
+                           [("get_category_summary", {"start_date": "2026-01-01"})], date(2026, 1, 15))
+    # On the 1st of a month, today and the month start coincide
+    assert not cache.store("kakeibo summary this month",
+                           [("get_kakeibo_summary", {"start_date": "2026-03-01"})], date(2026, 3, 1))
+    assert cache.lookup("category summary for this year", date(2026, 3, 20)) is None
+
+
+def test_ttl_and_size_bounds():
+    cache = RoutingCache(max_size=1)
+    today = date(2026, 10, 16)
+    cache.store("recent expenses", [("get_recent_expenses", {})], today)
+    cache.store("category summary", [("get_category_summary", {})], today)
+    assert cache.lookup("recent expenses", today) is None
+    assert cache.stats()['evictions'] == 1
+
+    expired = RoutingCache(ttl_seconds=0)
+    expired.store("recent expenses", [("get_recent_expenses", {})], today)
+    assert expired.lookup("recent expenses", today) is None
@@ -0,0 +1,142 @@
+import json
+from datetime import timedelta
+
+import pytest
+
+import s3_storage
+from expenses_sqlite import ExpensesSQLite
+from s3_storage import BACKUP_INDEX_KEY, LEASE_KEY, WAL_PREFIX, LeaseLostError, WalShipper
+
+LEASE_SECONDS = 60
+
+
+@pytest.fixture(autouse=True)
+def short_lease(monkeypatch):
+    monkeypatch.setenv('S3_BACKUP_LEASE_SECONDS', str(LEASE_SECONDS))
+
+
+def read_lease(storage):
+    return json.loads(storage.s3.get_object(Bucket=storage.bucket_name, Key=LEASE_KEY)['Body'].read())
+
+
+def test_second_instance_waits_for_an_active_lease(make_storage):
+    old, new = make_storage('old'), make_storage('new')
+    assert old.acquire_backup_lease()
+    assert not new.acquire_backup_lease()
+    lease = read_lease(old)
+    assert (lease['holder'], lease['token']) == ('old', 1)
+
+
+def test_lease_expires_on_server_age_without_local_observation(make_storage, clock, s3_clock_skew):
+    old, new = make_storage('old'), make_storage('new')
+    assert old.acquire_backup_lease()
+
+    # The new instance has never watched the lease, but S3's clock says it is older than the lease period
+    s3_clock_skew['seconds'] = LEASE_SECONDS + 1
+    assert new.acquire_backup_lease()
+    assert read_lease(new)['holder'] == 'new'
+    assert new.lease_token == 2
+
+
+def test_lease_expires_on_observed_age_when_server_age_is_behind(make_storage, clock, s3_clock_skew):
+    old, new = make_storage('old'), make_storage('new')
+    assert old.acquire_backup_lease()
+    # S3's Date lags LastModified (skewed behind), so its age alone would never expire the lease
+    s3_clock_skew['seconds'] = -3600
+
+    assert not new.acquire_backup_lease()
+    clock.advance(LEASE_SECONDS - 1)
+    assert not new.acquire_backup_lease()
+    clock.advance(2)
+    assert new.acquire_backup_lease()
+    assert new.lease_token == 2
+
+
+def test_renewal_restarts_the_observed_age(make_storage, clock):
+    old, new = make_storage('old'), make_storage('new')
+    assert old.acquire_backup_lease()
+    assert not new.acquire_backup_lease()
+
+    clock.advance(LEASE_SECONDS - 10)
+    assert old.acquire_backup_lease()
+    assert old.lease_token == 1
+    clock.advance(20)
+    # Watched for longer than the lease in total, but not since the last renewal
+    assert not new.acquire_backup_lease()
+
+
+def test_local_wall_clock_skew_does_not_expire_a_lease(make_storage, monkeypatch):
+    old, new = make_storage('old'), make_storage('new')
+    assert old.acquire_backup_lease()
+
+    class FastDatetime(s3_storage.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return super().now(tz) + timedelta(days=1)
+
+    monkeypatch.setattr(s3_storage, 'datetime', FastDatetime)
+    assert not new.acquire_backup_lease()
+
+
+def test_released_lease_is_taken_over_immediately(make_storage):
+    old, new = make_storage('old'), make_storage('new')
+    assert old.acquire_backup_lease()
+    old.release_backup_lease()
+    assert not old.holds_backup_lease()
+    assert new.acquire_backup_lease()
+    assert new.lease_token == 2
+
+
+def test_stale_holder_is_fenced_from_the_backup_index(make_storage, clock, s3_clock_skew):
+    old, new = make_storage('old'), make_storage('new')
+    assert old.acquire_backup_lease()
+    old._save_backup_index([{'name': 'expenses_backup_20260101_000000.db'}])
+
+    s3_clock_skew['seconds'] = LEASE_SECONDS + 1
+    assert new.acquire_backup_lease()
+    new._save_backup_index([{'name': 'expenses_backup_20260102_000000.db'}])
+
+    # The old holder's monotonic clock stalled (e.g. a paused VM), so it still believes it leads
+    old._lease_deadline = clock() + LEASE_SECONDS
+    assert old.holds_backup_lease()
+    with pytest.raises(LeaseLostError):
+        old._save_backup_index([{'name': 'expenses_backup_20260103_000000.db'}])
+
+    index = json.loads(new.s3.get_object(Bucket=new.bucket_name, Key=BACKUP_INDEX_KEY)['Body'].read())
+    assert index['lease_token'] == 2
+    assert [entry['name'] for entry in index['backups']] == ['expenses_backup_20260102_000000.db']
+
+
+def test_expired_holder_cannot_write_the_backup_index(make_storage, clock):
+    old = make_storage('old')
+    assert old.acquire_backup_lease()
+    clock.advance(LEASE_SECONDS)
+    with pytest.raises(LeaseLostError):
+        old._save_backup_index([])
+
+
+def wal_keys(storage):
+    return [item['Key'] for item in storage._list_objects(WAL_PREFIX)]
+
+
+def test_wal_is_shipped_only_by_the_lease_holder(make_storage, clock, tmp_path):
+    leader, standby = make_storage('leader'), make_storage('standby')
+    assert leader.acquire_backup_lease()
+
+    db = ExpensesSQLite(str(tmp_path / "expenses.db"))
+    shipper = WalShipper(db, s3=standby, interval_seconds=3600)
+    shipper.start()
+    try:
+        assert shipper.generation is None
+        assert wal_keys(standby) == []
+
+        # Once the leader stops renewing, the standby takes over and starts its own generation
+        clock.advance(LEASE_SECONDS + 1)
+        shipper._lease_renew_at = 0.0
+        shipper.ship()
+        assert standby.lease_token == 2
+        assert shipper.generation is not None
+        assert wal_keys(standby) == [f"{WAL_PREFIX}{shipper.generation}/base.db"]
+    finally:
+        shipper.stop()
+        db.close()
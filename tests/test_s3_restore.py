@@ -0,0 +1,107 @@
+import sqlite3
+
+import pytest
+
+from expenses_sqlite import ExpensesSQLite
+from s3_storage import BACKUP_PREFIX, CHUNK_PREFIX, MANIFEST_PREFIX
+
+
+@pytest.fixture
+def storage(make_storage, monkeypatch):
+    monkeypatch.setenv('S3_BACKUP_LEASE', 'false')
+    monkeypatch.setenv('S3_BACKUP_MODE', 'incremental')
+    return make_storage('primary')
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ExpensesSQLite(str(tmp_path / "expenses.db"))
+    yield db
+    db.close()
+
+
+def back_up(storage, db, description, timestamp, full=False):
+    """Add an expense, then upload an incremental (or full) backup stamped with timestamp"""
+    db.add_expense(100, 'Groceries', description, 'survival', 'alice')
+    with db.open_snapshot() as snapshot:
+        if full:
+            storage.upload_backup(snapshot, f"{BACKUP_PREFIX}{timestamp}.db")
+        else:
+            storage.backup_database_incremental(snapshot, timestamp)
+
+
+def corrupt(storage, key):
+    storage.s3.put_object(Bucket=storage.bucket_name, Key=key, Body=b'not what was uploaded')
+
+
+def restored_descriptions(path):
+    with sqlite3.connect(path) as conn:
+        return [row[0] for row in conn.execute("SELECT description FROM expenses ORDER BY id")]
+
+
+def test_restores_the_latest_manifest(storage, db, tmp_path):
+    back_up(storage, db, 'first', '20261016_100000')
+    back_up(storage, db, 'second', '20261016_110000')
+
+    target = tmp_path / "restored.db"
+    assert storage.restore_latest_database(str(target))
+    assert restored_descriptions(target) == ['first', 'second']
+
+
+def test_falls_back_to_an_older_manifest_when_the_latest_is_broken(storage, db, tmp_path):
+    back_up(storage, db, 'first', '20261016_100000')
+    back_up(storage, db, 'second', '20261016_110000')
+    corrupt(storage, f"{MANIFEST_PREFIX}20261016_110000.json")
+
+    target = tmp_path / "restored.db"
+    assert storage.restore_latest_database(str(target))
+    assert restored_descriptions(target) == ['first']
+
+
+def test_falls_back_to_full_backups_when_no_manifest_restores(storage, db, tmp_path):
+    back_up(storage, db, 'full', '20261016_090000', full=True)
+    back_up(storage, db, 'incremental', '20261016_100000')
+    for item in storage._list_objects(CHUNK_PREFIX):
+        corrupt(storage, item['Key'])
+
+    target = tmp_path / "restored.db"
+    assert storage.restore_latest_database(str(target))
+    assert restored_descriptions(target) == ['full']
+    assert not (tmp_path / "restored.db.restore").exists()
+
+
+def test_falls_back_to_an_older_full_backup(storage, db, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'backup_mode', 'full')
+    back_up(storage, db, 'first', '20261016_100000', full=True)
+    back_up(storage, db, 'second', '20261016_110000', full=True)
+    corrupt(storage, f"{BACKUP_PREFIX}20261016_110000.db.gz")
+
+    target = tmp_path / "restored.db"
+    assert storage.restore_latest_database(str(target))
+    assert restored_descriptions(target) == ['first']
+
+
+def test_reports_failure_when_nothing_restores(storage, db, tmp_path):
+    back_up(storage, db, 'first', '20261016_100000')
+    corrupt(storage, f"{MANIFEST_PREFIX}20261016_100000.json")
+
+    target = tmp_path / "restored.db"
+    assert not storage.restore_latest_database(str(target))
+    assert not target.exists()
+
+
+def test_chunks_swept_by_another_leader_are_uploaded_again(make_storage, db, tmp_path, monkeypatch):
+    monkeypatch.setenv('S3_BACKUP_MODE', 'incremental')
+    storage = make_storage('primary')
+    assert storage.acquire_backup_lease()
+    back_up(storage, db, 'first', '20261016_100000')
+
+    # Another leader's cleanup_unreferenced_chunks removed every chunk while this process kept its cache
+    storage.delete_keys([item['Key'] for item in storage._list_objects(CHUNK_PREFIX)])
+    assert storage.acquire_backup_lease()
+    with db.open_snapshot() as snapshot:
+        storage.backup_database_incremental(snapshot, '20261016_110000')
+
+    target = tmp_path / "restored.db"
+    assert storage.restore_from_manifest(f"{MANIFEST_PREFIX}20261016_110000.json", str(target))
+    assert restored_descriptions(target) == ['first']
@@ -0,0 +1,90 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+
+import s3_storage
+from expenses_sqlite import ExpensesSQLite
+from s3_storage import WalShipper
+
+INSERT = "INSERT INTO expenses (date, amount, category, kakeibo_category, description, user_id) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+@pytest.fixture
+def storage(make_storage, monkeypatch):
+    monkeypatch.setenv('S3_BACKUP_LEASE', 'false')
+    return make_storage('primary')
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ExpensesSQLite(str(tmp_path / "expenses.db"))
+    yield db
+    db.close()
+
+
+def insert(conn, description, size=1):
+    conn.execute(INSERT, ('2026-10-16 10:00:00', 100, 'Groceries', 'survival', description * size, 'alice'))
+    conn.commit()
+
+
+def test_writers_are_not_blocked_while_the_base_snapshot_is_copied(storage, db, tmp_path):
+    insert(db._get_connection(), 'before')
+    # No busy timeout: a writer waiting on the shipper's write lock fails immediately
+    writer = sqlite3.connect(db.db_path, timeout=0)
+    open_snapshot = db.open_snapshot
+
+    @contextmanager
+    def open_snapshot_with_writer(*args, **kwargs):
+        with open_snapshot(*args, **kwargs) as snapshot:
+            insert(writer, 'during')
+            yield snapshot
+
+    db.open_snapshot = open_snapshot_with_writer
+    shipper = WalShipper(db, s3=storage, interval_seconds=3600)
+    shipper.start()
+    try:
+        insert(writer, 'after')
+        shipper.ship()
+    finally:
+        shipper.stop()
+        writer.close()
+
+    restored = tmp_path / "restored.db"
+    assert storage.restore_point_in_time(str(restored))
+    with sqlite3.connect(restored) as conn:
+        rows = [row[0] for row in conn.execute("SELECT description FROM expenses ORDER BY id")]
+    assert rows == ['before', 'during', 'after']
+
+
+def test_failed_generation_starts_back_off_and_keep_checkpointing(storage, db, clock, monkeypatch):
+    monkeypatch.setattr(s3_storage, 'WAL_GENERATION_RETRY_MAX_SECONDS', 10 ** 6)
+    attempts = []
+    monkeypatch.setattr(storage, 'upload_fileobj', lambda *args: attempts.append(args) and False)
+
+    shipper = WalShipper(db, s3=storage, interval_seconds=100, checkpoint_kb=1)
+    shipper.start()
+    try:
+        assert len(attempts) == 1
+        shipper.ship()
+        assert len(attempts) == 1
+
+        clock.advance(200)
+        shipper.ship()
+        assert len(attempts) == 2
+
+        # The second failure doubles the wait; meanwhile the WAL is still checkpointed into the database
+        db_size = os.path.getsize(db.db_path)
+        insert(db._get_connection(), 'x', size=64 * 1024)
+        clock.advance(200)
+        shipper.ship()
+        assert len(attempts) == 2
+        assert os.path.getsize(db.db_path) >= db_size + 64 * 1024
+
+        clock.advance(200)
+        shipper.ship()
+        assert len(attempts) == 3
+        assert shipper.generation is None
+    finally:
+        shipper.stop()
@@ -0,0 +1,64 @@
+import os
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class UpdateJournal:
+    """Durable append-only JSONL journal of updates received before the database is ready.
+
+    Entries are fsynced on append and removed one at a time once replayed, so a crash
+    during startup loses nothing. The entry in flight stays journaled; the webhook skips it
+    on the next replay when its update_id is already recorded as applied in the database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, entry: dict):
+        """Durably append an entry to the journal"""
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def entries(self) -> list:
+        """Read all journaled entries in arrival order"""
+        with self._lock:
+            return self._read()
+
+    def pop_first(self):
+        """Remove the oldest entry after it has been replayed"""
+        with self._lock:
+            remaining = self._read()[1:]
+            if not remaining:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(entry) + '\n' for entry in remaining)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+
+    def __len__(self):
+        return len(self.entries())
+
+    def _read(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+
+        entries = []
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append
+                    logger.warning("⚠️⚠️⚠️ Skipping unreadable journal line in %s", self.path)
+        return entries